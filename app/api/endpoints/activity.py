@@ -1,124 +1,138 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Query, Header, Response
 from bson import ObjectId
 from app.db.db import Activity
-from app.schemas.activity import ActivityCreate, ActivityRead
-import aiofiles
+from app.schemas.activity import ActivityCreate, ActivityRead, ActivityUpdate
+from app.schemas.page import Page
+from app.schemas.bulk import BulkResult
+from app.services.entity_cache import find_by_id, invalidate
+from app.services.expansion import EXPAND_DESCRIPTION, select_expansion
+from app.utils.versioning import stamp_new, update_by_id, version_etag
+from app.utils.fields import FIELDS_DESCRIPTION, select_fields
+from app.utils.http_cache import etag_matches, list_etag, not_modified
+from app.utils.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.bulk import (
+    DELETED, UPDATED, bulk_delete, bulk_insert, bulk_result, bulk_update, read_items, succeeded_ids,
+    validate_ids, validate_items, validate_updates,
+)
+from app.utils.image_quality import check_image_blurry
+from app.services.job_queue import enqueue_job
+from app.utils.uploads import save_upload, upload_path, temp_upload_path
+from app.utils.export import stream_export, day_range_query, DEFAULT_EXPORT_BATCH_SIZE, MAX_EXPORT_BATCH_SIZE
 import os
-from PIL import Image, ImageFilter
-import numpy as np
 from datetime import datetime
+from typing import List, Optional
 
 router = APIRouter()
 
-# Directory to store uploaded images
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 @router.post("/", response_model=ActivityRead)
 async def create_activity(activity: ActivityCreate):
     activity_data = activity.dict()
-    result = await Activity.insert_one(activity_data)
+    activity_data["is_complete"] = False
+    result = await Activity.insert_one(stamp_new(activity_data))
     activity_data["id"] = str(result.inserted_id)
     return ActivityRead(**activity_data)
 
 
-def is_image_blurry(image_path: str) -> bool:
-    """Check if the image is blurry using the Laplacian method."""
-    img = Image.open(image_path)
-    img_gray = img.convert("L")  # Convert to grayscale
-    img_laplacian = np.array(img_gray.filter(ImageFilter.FIND_EDGES))
-    variance = np.var(img_laplacian)  # Variance measures sharpness
-    return variance < 100  # If variance is low, the image is blurry
-
 @router.post("/{activity_id}/upload-image")
 async def upload_image(activity_id: str, file: UploadFile = File(...)):
     if not ObjectId.is_valid(activity_id):
         raise HTTPException(status_code=400, detail="Invalid activity ID")
     
     # Save the file temporarily to check blurriness
-    temp_file_path = os.path.join(UPLOAD_DIR, f"temp_{file.filename}")
-    async with aiofiles.open(temp_file_path, 'wb') as out_file:
-        content = await file.read()
-        await out_file.write(content)
+    temp_file_path = temp_upload_path(file.filename)
+    size, sha256 = await save_upload(file, temp_file_path)
     
     # Check if the image is blurry
-    if is_image_blurry(temp_file_path):
+    try:
+        blurry = await check_image_blurry(temp_file_path)
+    except Exception:
+        os.remove(temp_file_path)
+        raise HTTPException(status_code=400, detail="File is not a readable image")
+    if blurry:
         os.remove(temp_file_path)  # Remove the blurry image
         raise HTTPException(status_code=400, detail="Uploaded image is blurry. Please upload a clearer image.")
     
     # If not blurry, save the image with proper naming
-    file_path = os.path.join(UPLOAD_DIR, f"{activity_id}_{file.filename}")
-    os.rename(temp_file_path, file_path)  # Move the image to its final location
+    file_path = upload_path(activity_id, file.filename)
+    os.replace(temp_file_path, file_path)  # Move the image to its final location
     
-    return {"message": "Image uploaded successfully", "file_path": file_path}
-
-async def send_images_to_ai(activity_id: str, image_path: str):
-    """Send the image to AI for processing."""
-    # Here we send the image path to the AI processing function (you can replace this with actual AI processing code)
-    ai_result = {"BrandA": 5, "BrandB": 2}  # Example response from AI
-    now = datetime.utcnow()
-    current_date = now.date() 
-    current_time = now.time() 
-    await Activity.update_one(
-        {"_id": ObjectId(activity_id)},
-        {"$set": {
-            "brand_detected": ai_result,
-            "completed": True,
-            "day": current_date,  
-            "time": current_time  
-        }}  
-    )
+    return {"message": "Image uploaded successfully", "file_path": file_path, "size": size, "sha256": sha256}
 
 @router.post("/{activity_id}/process-images")
-async def process_images(activity_id: str, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def process_images(activity_id: str, file: UploadFile = File(...)):
     if not ObjectId.is_valid(activity_id):
         raise HTTPException(status_code=400, detail="Invalid activity ID")
     
     # Save the image with proper naming after blur check was done in upload-image 
-    file_path = os.path.join(UPLOAD_DIR, f"{activity_id}_{file.filename}")
-    async with aiofiles.open(file_path, 'wb') as out_file:
-        content = await file.read()
-        await out_file.write(content)
+    file_path = upload_path(activity_id, file.filename)
+    _, sha256 = await save_upload(file, file_path)
     
-    # Run AI processing in the background
-    background_tasks.add_task(send_images_to_ai, activity_id, file_path)
+    # Queue the image for the AI worker
+    job_id = await enqueue_job("activity", activity_id, file_path)
     
-    return {"message": "Images sent for AI processing", "file_path": file_path}
-
-@router.get("/", response_model=List[ActivityRead])
-async def get_all_activities():
-    activities = await Activity.find().to_list()
-    if activities:
-        for activity in activities:
-            activity["id"] = str(activity.pop("_id"))
-        return [ActivityRead(**activity) for activity in activities]
+    return {"message": "Images sent for AI processing", "file_path": file_path, "sha256": sha256, "job_id": job_id}
+
+ACTIVITY_EXPANSIONS = ("store", "consumer")
+ACTIVITY_SORT_FIELDS = ("day", "time", "name")
+
+@router.get("/", response_model=Page[ActivityRead])
+async def get_all_activities(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    next: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    sort: Optional[str] = Query(None, description="Field to sort by, prefix with '-' for descending"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
+    selected = select_fields(ActivityRead, fields)
+    expansion = select_expansion(expand, ACTIVITY_EXPANSIONS)
+    etag = None
+    if not expansion:
+        etag = await list_etag(Activity, request)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    activities, next_cursor = await paginate(Activity, {}, limit, next, sort, ACTIVITY_SORT_FIELDS, selected.projection)
+    if activities or next:
+        if expansion:
+            return await expansion.page(selected, activities, next_cursor)
+        return selected.page(activities, next_cursor, etag)
     raise HTTPException(status_code=404, detail="No activities found")
 
 @router.get("/{activity_id}", response_model=ActivityRead)
-async def get_activity(activity_id: str):
+async def get_activity(
+    activity_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
     if not ObjectId.is_valid(activity_id):
         raise HTTPException(status_code=400, detail="Invalid activity ID")
 
-    activity = await Activity.find_one({"_id": ObjectId(activity_id)})
+    selected = select_fields(ActivityRead, fields)
+    expansion = select_expansion(expand, ACTIVITY_EXPANSIONS)
+    activity = await find_by_id(Activity, activity_id)
     if activity:
-        activity["id"] = str(activity.pop("_id"))
-        return ActivityRead(**activity)
+        if expansion:
+            return await expansion.one(selected, activity)
+        return selected.one(activity, if_none_match)
     raise HTTPException(status_code=404, detail="Activity not found")
 
 @router.put("/{activity_id}", response_model=ActivityRead)
-async def update_activity(activity_id: str, activity: ActivityUpdate):
+async def update_activity(activity_id: str, activity: ActivityUpdate, response: Response, if_match: Optional[str] = Header(None)):
     if not ObjectId.is_valid(activity_id):
         raise HTTPException(status_code=400, detail="Invalid activity ID")
 
     update_data = {k: v for k, v in activity.dict().items() if v is not None}
-    result = await Activity.update_one({"_id": ObjectId(activity_id)}, {"$set": update_data})
+    updated_activity = await update_by_id(Activity, activity_id, update_data, if_match)
+    if updated_activity is None:
+        raise HTTPException(status_code=404, detail="Activity not found")
 
-    if result.modified_count == 1:
-        updated_activity = await Activity.find_one({"_id": ObjectId(activity_id)})
-        updated_activity["id"] = str(updated_activity.pop("_id"))
-        return ActivityRead(**updated_activity)
-
-    raise HTTPException(status_code=404, detail="Activity not found")
+    if update_data:
+        await invalidate(Activity, activity_id)
+    response.headers["ETag"] = version_etag(updated_activity)
+    updated_activity["id"] = str(updated_activity.pop("_id"))
+    return ActivityRead(**updated_activity)
 
 @router.delete("/{activity_id}")
 async def delete_activity(activity_id: str):
@@ -128,12 +142,18 @@ async def delete_activity(activity_id: str):
     result = await Activity.delete_one({"_id": ObjectId(activity_id)})
 
     if result.deleted_count == 1:
+        await invalidate(Activity, activity_id)
         return {"message": "Activity deleted successfully"}
 
     raise HTTPException(status_code=404, detail="Activity not found")
 
 @router.get("/1/search", response_model=List[ActivityRead])
-async def search_activity(name: str = Query(None), consumer: str = Query(None)):
+async def search_activity(
+    name: str = Query(None),
+    consumer: str = Query(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+):
     if not name and not consumer:
         raise HTTPException(status_code=400, detail="Either name or consumer must be provided")
     
@@ -143,23 +163,76 @@ async def search_activity(name: str = Query(None), consumer: str = Query(None)):
     if consumer:
         query["consumer"] = consumer
     
-    activities = await Activity.find(query).to_list()
+    selected = select_fields(ActivityRead, fields)
+    expansion = select_expansion(expand, ACTIVITY_EXPANSIONS)
+    activities = await Activity.find(query, selected.projection).to_list()
     if activities:
-        for activity in activities:
-            activity["id"] = str(activity.pop("_id"))
-        return [ActivityRead(**activity) for activity in activities]
+        if expansion:
+            return await expansion.many(selected, activities)
+        return selected.many(activities)
 
     raise HTTPException(status_code=404, detail="No matching activities found")
 
 @router.get("/1/not_completed", response_model=List[ActivityRead])
-async def get_not_completed_activities():
+async def get_not_completed_activities(
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+):
+    selected = select_fields(ActivityRead, fields)
+    expansion = select_expansion(expand, ACTIVITY_EXPANSIONS)
     activities = await Activity.find({
         "is_complete": False,
-    }).to_list()
+    }, selected.projection).to_list()
 
     if activities:
-        for activity in activities:
-            activity["id"] = str(activity.pop("_id")) 
-        return [ActivityRead(**activity) for activity in activities]
+        if expansion:
+            return await expansion.many(selected, activities)
+        return selected.many(activities)
 
     raise HTTPException(status_code=404, detail="No avalaible activities found")
+
+ACTIVITY_EXPORT_COLUMNS = ("id", "name", "time", "day", "is_complete", "total_pics", "consumer", "store", "brand_detected", "gained_points")
+
+@router.get("/1/export")
+async def export_activities(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    start: Optional[datetime] = Query(None, description="Include activities whose day is on or after this date"),
+    end: Optional[datetime] = Query(None, description="Include activities whose day is before this date"),
+    store: Optional[str] = Query(None),
+    consumer: Optional[str] = Query(None),
+    batch_size: int = Query(DEFAULT_EXPORT_BATCH_SIZE, ge=1, le=MAX_EXPORT_BATCH_SIZE),
+):
+    query = day_range_query(start, end)
+    if store:
+        query["store"] = store
+    if consumer:
+        query["consumer"] = consumer
+    return stream_export(Activity, query, format, ACTIVITY_EXPORT_COLUMNS, "activities", batch_size)
+
+@router.post("/1/bulk", response_model=BulkResult)
+async def bulk_create_activities(request: Request):
+    """Create activities from a JSON array or NDJSON body; results are reported per item."""
+    valid, errors = validate_items(await read_items(request), ActivityCreate)
+    docs = []
+    for index, activity in valid:
+        data = activity.dict()
+        data["is_complete"] = False
+        docs.append((index, data))
+    created = await bulk_insert(Activity, docs)
+    return bulk_result(errors, created)
+
+@router.put("/1/bulk", response_model=BulkResult)
+async def bulk_update_activities(request: Request):
+    """Update activities given as objects with an "id" and the fields to change."""
+    valid, errors = validate_updates(await read_items(request), ActivityUpdate)
+    updated = await bulk_update(Activity, valid)
+    await invalidate(Activity, *succeeded_ids(updated, UPDATED))
+    return bulk_result(errors, updated)
+
+@router.delete("/1/bulk", response_model=BulkResult)
+async def bulk_delete_activities(request: Request):
+    """Delete activities by id."""
+    valid, errors = validate_ids(await read_items(request))
+    deleted = await bulk_delete(Activity, valid)
+    await invalidate(Activity, *succeeded_ids(deleted, DELETED))
+    return bulk_result(errors, deleted)
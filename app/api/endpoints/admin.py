@@ -1,61 +1,103 @@
-from fastapi import APIRouter, HTTPException ,Query
+from fastapi import APIRouter, HTTPException, Request, Query, Header, Response
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from app.core.config import BULK_MAX_PROFILES
 from app.db.db import Admin
 from app.schemas.admin import AdminCreate, AdminRead, AdminUpdate
-from passlib.context import CryptContext
-from typing import List
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+from app.schemas.page import Page
+from app.schemas.bulk import BulkResult
+from app.services.auth_service import revoke_subject
+from app.services.identity_service import (
+    bulk_create_profiles, bulk_delete_profiles, bulk_update_profiles, register_identity, remove_identity, update_profile,
+)
+from app.services.password_service import hash_password, hash_passwords
+from app.services.entity_cache import find_by_id, invalidate
+from app.utils.versioning import stamp_new, version_etag
+from app.utils.fields import FIELDS_DESCRIPTION, select_fields
+from app.utils.http_cache import etag_matches, list_etag, not_modified
+from app.utils.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.bulk import DELETED, UPDATED, bulk_result, read_items, succeeded_ids, validate_ids, validate_items, validate_updates
+from typing import List, Optional
 
 router = APIRouter()
 
+# Never fetched from the database, not even when listed in ?fields=
+HIDDEN_FIELDS = ("password",)
+
 @router.post("/", response_model=AdminRead)
 async def create_admin(admin: AdminCreate):
-    hashed_password = hash_password(admin.password)
+    hashed_password = await hash_password(admin.password)
     admin_data = admin.dict()
     admin_data["password"] = hashed_password
-    result = await Admin.insert_one(admin_data)
-    admin_data["id"] = str(result.inserted_id)
+    admin_data["_id"] = ObjectId()
+    try:
+        await register_identity("admin", admin_data["_id"], admin_data["email"], hashed_password)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        await Admin.insert_one(stamp_new(admin_data))
+    except DuplicateKeyError:
+        await remove_identity("admin", str(admin_data["_id"]))
+        raise HTTPException(status_code=400, detail="Email already registered")
+    admin_data["id"] = str(admin_data.pop("_id"))
     admin_data.pop("password")
     return AdminRead(**admin_data)
 
-@router.get("/", response_model=List[AdminRead])
-async def get_all_admins():
-    admins = await Admin.find().to_list()
-    if admins:
-        for admin in admins:
-            admin["id"] = str(admin.pop("_id"))
-            admin.pop("password", None) 
-        return [AdminRead(**admin) for admin in admins]
+ADMIN_SORT_FIELDS = ("full_name",)
+
+@router.get("/", response_model=Page[AdminRead])
+async def get_all_admins(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    next: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    sort: Optional[str] = Query(None, description="Field to sort by, prefix with '-' for descending"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
+    selected = select_fields(AdminRead, fields, HIDDEN_FIELDS)
+    etag = await list_etag(Admin, request)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    admins, next_cursor = await paginate(Admin, {}, limit, next, sort, ADMIN_SORT_FIELDS, selected.projection)
+    if admins or next:
+        return selected.page(admins, next_cursor, etag)
     raise HTTPException(status_code=404, detail="No admins found")
 
 @router.get("/{admin_id}", response_model=AdminRead)
-async def get_admin(admin_id: str):
+async def get_admin(
+    admin_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
     if not ObjectId.is_valid(admin_id):
         raise HTTPException(status_code=400, detail="Invalid admin ID")
 
-    admin = await Admin.find_one({"_id": ObjectId(admin_id)})
+    selected = select_fields(AdminRead, fields, HIDDEN_FIELDS)
+    admin = await find_by_id(Admin, admin_id, HIDDEN_FIELDS)
     if admin:
-        admin["id"] = str(admin.pop("_id"))
-        return AdminRead(**admin)
+        return selected.one(admin, if_none_match)
     raise HTTPException(status_code=404, detail="Admin not found")
 
 @router.put("/{admin_id}", response_model=AdminRead)
-async def update_admin(admin_id: str, admin: AdminUpdate):
+async def update_admin(admin_id: str, admin: AdminUpdate, response: Response, if_match: Optional[str] = Header(None)):
     if not ObjectId.is_valid(admin_id):
         raise HTTPException(status_code=400, detail="Invalid admin ID")
 
     update_data = {k: v for k, v in admin.dict().items() if v is not None}
-    result = await admin_colleAdminction.update_one({"_id": ObjectId(admin_id)}, {"$set": update_data})
-
-    if result.modified_count == 1:
-        updated_admin = await Admin.find_one({"_id": ObjectId(admin_id)})
-        updated_admin["id"] = str(updated_admin.pop("_id"))
-        return AdminRead(**updated_admin)
-
-    raise HTTPException(status_code=404, detail="Admin not found")
+    if "password" in update_data:
+        update_data["password"] = await hash_password(update_data["password"])
+    try:
+        updated_admin = await update_profile("admin", admin_id, update_data, if_match)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    if updated_admin is None:
+        raise HTTPException(status_code=404, detail="Admin not found")
+
+    if update_data:
+        await invalidate(Admin, admin_id)
+    response.headers["ETag"] = version_etag(updated_admin)
+    updated_admin["id"] = str(updated_admin.pop("_id"))
+    return AdminRead(**updated_admin)
 
 @router.delete("/{admin_id}")
 async def delete_admin(admin_id: str):
@@ -65,28 +107,59 @@ async def delete_admin(admin_id: str):
     result = await Admin.delete_one({"_id": ObjectId(admin_id)})
 
     if result.deleted_count == 1:
+        await invalidate(Admin, admin_id)
+        await remove_identity("admin", admin_id)
+        await revoke_subject(admin_id)
         return {"message": "Admin deleted successfully"}
 
     raise HTTPException(status_code=404, detail="Admin not found")
 
 @router.get("/1/search", response_model=List[AdminRead])
-async def search_admin(full_name: str = Query(None), email: str = Query(None)):
+async def search_admin(full_name: str = Query(None), email: str = Query(None), fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)):
     if not full_name and not email:
          raise HTTPException(status_code=400, detail="Either fullname or email must be provided")
-    print(f"Received full_name: {full_name}, email: {email}")
     query = {}
     if full_name:
          query["full_name"] = full_name
     if email:
          query["email"] = email
-    print(f"Query: {query}")
-    admins = await Admin.find(query).to_list()
-    print(admins)
+    selected = select_fields(AdminRead, fields, HIDDEN_FIELDS)
+    admins = await Admin.find(query, selected.projection).to_list()
     if admins:
-         for admin in admins:
-            print(admin)
-            admin.pop("password", None)  
-            admin["id"] = str(admin.pop("_id")) 
-         return [AdminRead(**admin) for admin in admins]
+        return selected.many(admins)
 
     raise HTTPException(status_code=404, detail="No matching admins found")
+
+@router.post("/1/bulk", response_model=BulkResult)
+async def bulk_create_admins(request: Request):
+    """Create admins from a JSON array or NDJSON body; results are reported per item."""
+    valid, errors = validate_items(await read_items(request, BULK_MAX_PROFILES), AdminCreate)
+    hashes = await hash_passwords([admin.password for _, admin in valid])
+    docs = []
+    for (index, admin), hashed_password in zip(valid, hashes):
+        data = admin.dict()
+        data["password"] = hashed_password
+        docs.append((index, data))
+    created = await bulk_create_profiles("admin", docs)
+    return bulk_result(errors, created)
+
+@router.put("/1/bulk", response_model=BulkResult)
+async def bulk_update_admins(request: Request):
+    """Update admins given as objects with an "id" and the fields to change."""
+    valid, errors = validate_updates(await read_items(request, BULK_MAX_PROFILES), AdminUpdate)
+    to_hash = [data for _, _, data in valid if "password" in data]
+    hashes = await hash_passwords([data["password"] for data in to_hash])
+    for data, hashed_password in zip(to_hash, hashes):
+        data["password"] = hashed_password
+    updated = await bulk_update_profiles("admin", valid)
+    await invalidate(Admin, *succeeded_ids(updated, UPDATED))
+    return bulk_result(errors, updated)
+
+@router.delete("/1/bulk", response_model=BulkResult)
+async def bulk_delete_admins(request: Request):
+    """Delete admins by id, together with their identities and tokens."""
+    valid, errors = validate_ids(await read_items(request))
+    deleted = await bulk_delete_profiles("admin", valid)
+    await invalidate(Admin, *succeeded_ids(deleted, DELETED))
+    await revoke_subject(*succeeded_ids(deleted, DELETED))
+    return bulk_result(errors, deleted)
@@ -1,84 +1,81 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
-from app.services.auth_service import authenticate_user, create_access_token, verify_password
-from app.db.session import get_db
-from app.models.admin import Admin
-from app.models.consumer import Consumer
-from app.models.worker import Worker  
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES
+from app.services.auth_service import (
+    authenticate_user, create_access_token, get_current_user, revoke_token,
+)
+from app.services.identity_service import ROLE_COLLECTIONS, register_identity, remove_identity
+from app.services.password_service import hash_password
+from app.utils.versioning import stamp_new
 from datetime import timedelta
-from app.config import ACCESS_TOKEN_EXPIRE_MINUTES
-from pymongo.database import Database
-from passlib.context import CryptContext
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Roles anyone may sign up for; admin accounts are only created by admins
+SIGNUP_ROLES = ("consumer", "worker")
 
 @router.post("/login")
-async def login(email: str, password: str, db: Database = Depends(get_db)):
-    user = await authenticate_user(db, email, password)
+async def login(email: str, password: str):
+    user = await authenticate_user(email, password)
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # Determine role
-    if "total_points" in user:
-        role = "consumer"
-    elif "profile_image" in user:
-        role = "worker" if await db["workers"].find_one({"email": email}) else "admin"
-    else:
-        raise HTTPException(status_code=500, detail="Role could not be determined")
-
-    # Generate token
-    access_token = create_access_token({"sub": user["email"], "role": role}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    # Generate token; it carries everything authorization needs, so requests never look the user up again
+    access_token = create_access_token(
+        {"sub": user["user_id"], "email": user["email"], "role": user["role"]},
+        timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
 
     return JSONResponse({"access_token": access_token, "token_type": "bearer"})
 
 
 @router.post("/logout")
-async def logout():
+async def logout(current_user: dict = Depends(get_current_user)):
+    await revoke_token(current_user)
     return JSONResponse({"message": "Logout successful"})
 
-@router.post("signup")
+@router.post("/signup")
 async def signup(
     role: str,
     full_name: str,
     phone: str,
     email: str,
     password: str,
-    db: Database = Depends(get_db)
 ):
     # Ensure role is valid
-    if role not in ["admin", "consumer", "worker"]:
+    if role not in SIGNUP_ROLES:
         raise HTTPException(status_code=400, detail="Invalid role")
 
-    # Check if user already exists
-    existing_user = await db["admins"].find_one({"email": email}) or \
-                    await db["consumers"].find_one({"email": email}) or \
-                    await db["workers"].find_one({"email": email})
-
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-
     # Hash password
-    hashed_password = pwd_context.hash(password)
+    hashed_password = await hash_password(password)
 
     # Create user based on role
     user_data = {
+        "_id": ObjectId(),
         "full_name": full_name,
         "phone": phone,
         "email": email,
         "password": hashed_password
     }
 
-    if role == "admin":
-        await db["admins"].insert_one(user_data)
-    elif role == "consumer":
+    # Claiming the email in the identity collection also checks every role for duplicates
+    try:
+        await register_identity(role, user_data["_id"], email, hashed_password)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    if role == "consumer":
         user_data["total_points"] = 0  # Consumers have points
-        await db["consumers"].insert_one(user_data)
     elif role == "worker":
         user_data["profile_image"] = None  # Workers have profile images
-        await db["workers"].insert_one(user_data)
-
-    return JSONResponse({"message": f"{role.capitalize()} registered successfully"})
 
+    try:
+        await ROLE_COLLECTIONS[role].insert_one(stamp_new(user_data))
+    except DuplicateKeyError:
+        await remove_identity(role, str(user_data["_id"]))
+        raise HTTPException(status_code=400, detail="Email already registered")
 
+    return JSONResponse({"message": f"{role.capitalize()} registered successfully"})
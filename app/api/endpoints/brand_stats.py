@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.db.db import BrandRollup
+from app.schemas.brand_stats import BrandRollupRead, BrandShareRead
+from app.schemas.page import Page
+from app.utils.export import day_range_query
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from datetime import datetime
+from typing import List, Optional
+
+router = APIRouter()
+
+BRAND_ROLLUP_SORT_FIELDS = ("store", "day", "brand", "count")
+
+def rollup_query(store: Optional[str], start: Optional[datetime], end: Optional[datetime], brand: Optional[str] = None) -> dict:
+    query = day_range_query(start, end)
+    if store:
+        query["store"] = store
+    if brand:
+        query["brand"] = brand
+    return query
+
+@router.get("/", response_model=Page[BrandRollupRead])
+async def get_brand_counts(
+    store: Optional[str] = Query(None),
+    start: Optional[datetime] = Query(None, description="First day included"),
+    end: Optional[datetime] = Query(None, description="First day excluded"),
+    brand: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    next: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    sort: Optional[str] = Query(None, description="Field to sort by, prefix with '-' for descending"),
+):
+    """Brand counts per store and day, read straight from the rollup one page at a time."""
+    rows, next_cursor = await paginate(
+        BrandRollup, rollup_query(store, start, end, brand), limit, next, sort or "day", BRAND_ROLLUP_SORT_FIELDS, {"jobs": 0},
+    )
+    if rows or next:
+        return Page(items=[BrandRollupRead(**row) for row in rows], next=next_cursor)
+    raise HTTPException(status_code=404, detail="No brand counts found")
+
+@router.get("/1/share", response_model=List[BrandShareRead])
+async def get_brand_share(
+    store: Optional[str] = Query(None),
+    start: Optional[datetime] = Query(None, description="First day included"),
+    end: Optional[datetime] = Query(None, description="First day excluded"),
+):
+    """Total count and share of each brand over the selected stores and days."""
+    totals = await BrandRollup.aggregate([
+        {"$match": rollup_query(store, start, end)},
+        {"$group": {"_id": "$brand", "count": {"$sum": "$count"}}},
+        {"$sort": {"count": -1}},
+    ]).to_list(None)
+    overall = sum(row["count"] for row in totals)
+    if overall:
+        return [BrandShareRead(brand=row["_id"], count=row["count"], share=row["count"] / overall) for row in totals]
+    raise HTTPException(status_code=404, detail="No brand counts found")
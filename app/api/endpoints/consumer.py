@@ -1,62 +1,107 @@
-from fastapi import APIRouter, HTTPException ,Query
+from fastapi import APIRouter, Header, HTTPException, Request, Query, Response
+import uuid
 from bson import ObjectId
-from app.db.db import Consumer
+from pymongo.errors import DuplicateKeyError
+from app.core.config import BULK_MAX_PROFILES
+from app.db.db import Consumer, Offer, PointsLedger
 from app.schemas.consumer import ConsumerCreate, ConsumerRead, ConsumerUpdate
-from passlib.context import CryptContext
-from typing import List
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+from app.schemas.page import Page
+from app.schemas.bulk import BulkResult
+from app.schemas.points import LedgerEntryRead
+from app.services.auth_service import revoke_subject
+from app.services.identity_service import (
+    bulk_create_profiles, bulk_delete_profiles, bulk_update_profiles, register_identity, remove_identity, update_profile,
+)
+from app.services.points_ledger import APPLIED, PENDING, record_entry
+from app.services.password_service import hash_password, hash_passwords
+from app.services.entity_cache import find_by_id, invalidate
+from app.utils.versioning import stamp_new, version_etag
+from app.utils.fields import FIELDS_DESCRIPTION, select_fields
+from app.utils.http_cache import etag_matches, list_etag, not_modified
+from app.utils.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.bulk import DELETED, UPDATED, bulk_result, read_items, succeeded_ids, validate_ids, validate_items, validate_updates
+from typing import List, Optional
 
 router = APIRouter()
 
+# Never fetched from the database, not even when listed in ?fields=
+HIDDEN_FIELDS = ("password",)
+
 @router.post("/", response_model=ConsumerRead)
 async def create_consumer(consumer: ConsumerCreate):
-    hashed_password = hash_password(consumer.password)
+    hashed_password = await hash_password(consumer.password)
     consumer_data = consumer.dict()
     consumer_data["password"] = hashed_password
     consumer_data["total_points"] = 0
-    result = await Consumer.insert_one(consumer_data)
-    consumer_data["id"] = str(result.inserted_id)
+    consumer_data["_id"] = ObjectId()
+    try:
+        await register_identity("consumer", consumer_data["_id"], consumer_data["email"], hashed_password)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        await Consumer.insert_one(stamp_new(consumer_data))
+    except DuplicateKeyError:
+        await remove_identity("consumer", str(consumer_data["_id"]))
+        raise HTTPException(status_code=400, detail="Email already registered")
+    consumer_data["id"] = str(consumer_data.pop("_id"))
     consumer_data.pop("password")
     return ConsumerRead(**consumer_data)
 
-@router.get("/", response_model=List[ConsumerRead])
-async def get_all_consumers():
-    consumers = await Consumer.find().to_list()
-    if consumers:
-        for consumer in consumers:
-            consumer["id"] = str(consumer.pop("_id"))
-            consumer.pop("password", None) 
-        return [ConsumerRead(**consumer) for consumer in consumers]
+CONSUMER_SORT_FIELDS = ("full_name",)
+
+@router.get("/", response_model=Page[ConsumerRead])
+async def get_all_consumers(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    next: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    sort: Optional[str] = Query(None, description="Field to sort by, prefix with '-' for descending"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
+    selected = select_fields(ConsumerRead, fields, HIDDEN_FIELDS)
+    etag = await list_etag(Consumer, request)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    consumers, next_cursor = await paginate(Consumer, {}, limit, next, sort, CONSUMER_SORT_FIELDS, selected.projection)
+    if consumers or next:
+        return selected.page(consumers, next_cursor, etag)
     raise HTTPException(status_code=404, detail="No consumers found")
 
 @router.get("/{consumer_id}", response_model=ConsumerRead)
-async def get_consumer(consumer_id: str):
+async def get_consumer(
+    consumer_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
     if not ObjectId.is_valid(consumer_id):
         raise HTTPException(status_code=400, detail="Invalid consumer ID")
 
-    consumer = await Consumer.find_one({"_id": ObjectId(consumer_id)})
+    selected = select_fields(ConsumerRead, fields, HIDDEN_FIELDS)
+    consumer = await find_by_id(Consumer, consumer_id, HIDDEN_FIELDS)
     if consumer:
-        consumer["id"] = str(consumer.pop("_id"))
-        return ConsumerRead(**consumer)
+        return selected.one(consumer, if_none_match)
     raise HTTPException(status_code=404, detail="Consumer not found")
 
 @router.put("/{consumer_id}", response_model=ConsumerRead)
-async def update_consumer(consumer_id: str, consumer: ConsumerUpdate):
+async def update_consumer(consumer_id: str, consumer: ConsumerUpdate, response: Response, if_match: Optional[str] = Header(None)):
     if not ObjectId.is_valid(consumer_id):
         raise HTTPException(status_code=400, detail="Invalid consumer ID")
 
     update_data = {k: v for k, v in consumer.dict().items() if v is not None}
-    result = await Consumer.update_one({"_id": ObjectId(consumer_id)}, {"$set": update_data})
-
-    if result.modified_count == 1:
-        updated_consumer = await Consumer.find_one({"_id": ObjectId(consumer_id)})
-        updated_consumer["id"] = str(updated_consumer.pop("_id"))
-        return ConsumerRead(**updated_consumer)
-
-    raise HTTPException(status_code=404, detail="Consumer not found")
+    if "password" in update_data:
+        update_data["password"] = await hash_password(update_data["password"])
+    try:
+        updated_consumer = await update_profile("consumer", consumer_id, update_data, if_match)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    if updated_consumer is None:
+        raise HTTPException(status_code=404, detail="Consumer not found")
+
+    if update_data:
+        await invalidate(Consumer, consumer_id)
+    response.headers["ETag"] = version_etag(updated_consumer)
+    updated_consumer["id"] = str(updated_consumer.pop("_id"))
+    return ConsumerRead(**updated_consumer)
 
 @router.delete("/{consumer_id}")
 async def delete_consumer(consumer_id: str):
@@ -66,28 +111,114 @@ async def delete_consumer(consumer_id: str):
     result = await Consumer.delete_one({"_id": ObjectId(consumer_id)})
 
     if result.deleted_count == 1:
+        await invalidate(Consumer, consumer_id)
+        await remove_identity("consumer", consumer_id)
+        await revoke_subject(consumer_id)
         return {"message": "Consumer deleted successfully"}
 
     raise HTTPException(status_code=404, detail="Consumer not found")
 
 @router.get("/1/search", response_model=List[ConsumerRead])
-async def search_consumer(full_name: str = Query(None), email: str = Query(None)):
+async def search_consumer(full_name: str = Query(None), email: str = Query(None), fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)):
     if not full_name and not email:
          raise HTTPException(status_code=400, detail="Either full name or email must be provided")
-    print(f"Received full_name: {full_name}, email: {email}")
     query = {}
     if full_name:
          query["full_name"] = full_name
     if email:
          query["email"] = email
-    print(f"Query: {query}")
-    consumers = await Consumer.find(query).to_list()
-    print(consumers)
+    selected = select_fields(ConsumerRead, fields, HIDDEN_FIELDS)
+    consumers = await Consumer.find(query, selected.projection).to_list()
     if consumers:
-         for consumer in consumers:
-            print(consumer)
-            consumer.pop("password", None)  
-            consumer["id"] = str(consumer.pop("_id")) 
-         return [ConsumerRead(**consumer) for consumer in consumers]
+        return selected.many(consumers)
+
+    raise HTTPException(status_code=404, detail="No matching consumers found")
+
+def _ledger_entry_read(entry: dict) -> LedgerEntryRead:
+    entry["id"] = str(entry.pop("_id"))
+    return LedgerEntryRead(**entry)
+
+@router.post("/{consumer_id}/redeem", response_model=LedgerEntryRead)
+async def redeem_offer(
+    consumer_id: str,
+    offer_id: str = Query(...),
+    idempotency_key: Optional[str] = Header(None, description="Retrying with the same key never redeems twice"),
+):
+    if not ObjectId.is_valid(consumer_id):
+        raise HTTPException(status_code=400, detail="Invalid consumer ID")
+    if not ObjectId.is_valid(offer_id):
+        raise HTTPException(status_code=400, detail="Invalid offer ID")
+
+    # The price is read from MongoDB, not the catalog cache, so an edit made elsewhere applies at once
+    offer = await Offer.find_one({"_id": ObjectId(offer_id)}, {"points_required": 1})
+    if offer is None:
+        raise HTTPException(status_code=404, detail="Offer not found")
+    if not isinstance(offer.get("points_required"), int) or offer["points_required"] <= 0:
+        raise HTTPException(status_code=400, detail="Offer cannot be redeemed")
+    if not await Consumer.count_documents({"_id": ObjectId(consumer_id)}, limit=1):
+        raise HTTPException(status_code=404, detail="Consumer not found")
+
+    key = f"redeem:{consumer_id}:{idempotency_key or uuid.uuid4().hex}"
+    entry = await record_entry(consumer_id, -offer["points_required"], key, "redeem", offer_id)
+
+    if entry["ref"] != offer_id:
+        raise HTTPException(status_code=400, detail="Idempotency key already used for another offer")
+    if entry["status"] == PENDING:
+        raise HTTPException(status_code=409, detail="Redemption still in progress")
+    if entry["status"] != APPLIED:
+        raise HTTPException(status_code=400, detail="Not enough points")
+    return _ledger_entry_read(entry)
+
+LEDGER_SORT_FIELDS = ("created_at",)
+
+@router.get("/{consumer_id}/ledger", response_model=Page[LedgerEntryRead])
+async def get_consumer_ledger(
+    consumer_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    next: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    sort: Optional[str] = Query(None, description="Field to sort by, prefix with '-' for descending"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    if not ObjectId.is_valid(consumer_id):
+        raise HTTPException(status_code=400, detail="Invalid consumer ID")
 
-    raise HTTPException(status_code=404, detail="No matching consumers found")
\ No newline at end of file
+    selected = select_fields(LedgerEntryRead, fields)
+    entries, next_cursor = await paginate(
+        PointsLedger, {"consumer": consumer_id}, limit, next, sort or "-created_at", LEDGER_SORT_FIELDS, selected.projection,
+    )
+    return selected.page(entries, next_cursor)
+
+@router.post("/1/bulk", response_model=BulkResult)
+async def bulk_create_consumers(request: Request):
+    """Create consumers from a JSON array or NDJSON body; results are reported per item."""
+    valid, errors = validate_items(await read_items(request, BULK_MAX_PROFILES), ConsumerCreate)
+    hashes = await hash_passwords([consumer.password for _, consumer in valid])
+    docs = []
+    for (index, consumer), hashed_password in zip(valid, hashes):
+        data = consumer.dict()
+        data["password"] = hashed_password
+        data["total_points"] = 0
+        docs.append((index, data))
+    created = await bulk_create_profiles("consumer", docs)
+    return bulk_result(errors, created)
+
+@router.put("/1/bulk", response_model=BulkResult)
+async def bulk_update_consumers(request: Request):
+    """Update consumers given as objects with an "id" and the fields to change."""
+    valid, errors = validate_updates(await read_items(request, BULK_MAX_PROFILES), ConsumerUpdate)
+    to_hash = [data for _, _, data in valid if "password" in data]
+    hashes = await hash_passwords([data["password"] for data in to_hash])
+    for data, hashed_password in zip(to_hash, hashes):
+        data["password"] = hashed_password
+    updated = await bulk_update_profiles("consumer", valid)
+    await invalidate(Consumer, *succeeded_ids(updated, UPDATED))
+    return bulk_result(errors, updated)
+
+@router.delete("/1/bulk", response_model=BulkResult)
+async def bulk_delete_consumers(request: Request):
+    """Delete consumers by id, together with their identities and tokens."""
+    valid, errors = validate_ids(await read_items(request))
+    deleted = await bulk_delete_profiles("consumer", valid)
+    await invalidate(Consumer, *succeeded_ids(deleted, DELETED))
+    await revoke_subject(*succeeded_ids(deleted, DELETED))
+    return bulk_result(errors, deleted)
@@ -1,25 +1,217 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Header, Query, Response
 from app.db.db import Offer
-from app.utils.qr_generator import generate_qr_code
+from app.schemas.offer import OfferCreate, OfferRead, OfferUpdate, OfferQRSheetRequest
+from app.schemas.bulk import BulkResult
+from app.core.config import QR_SHEET_MAX_OFFERS
+from app.services.offer_catalog import eligible_offers, find_offer, invalidate_offers, list_offers
+from app.services.qr_cache import QR_FORMATS, forget_offer_qr, get_offer_qr_image, prerender_offer_qr
+from app.utils.versioning import stamp_new, update_by_id, version_etag
+from app.utils.fields import FIELDS_DESCRIPTION, select_fields
+from app.utils.http_cache import etag_matches, not_modified
+from app.utils.bulk import (
+    CREATED, DELETED, UPDATED, bulk_delete, bulk_insert, bulk_result, bulk_update, read_items, succeeded_ids,
+    validate_ids, validate_items, validate_updates,
+)
+from app.utils.qr_sheet import build_svg_sheet, build_zip
 from bson import ObjectId
+from typing import List, Optional
+import asyncio
+import base64
 
 router = APIRouter()
 
+# Offers can be edited, so clients revalidate every time; an unchanged QR image costs a 304
+QR_CACHE_CONTROL = "no-cache"
+
+async def _prerender_offer_qrs(offer_ids: List[str]):
+    """Warm the QR cache for offers written in bulk, like create_offer does for one."""
+    if not offer_ids:
+        return
+    async for offer in Offer.find({"_id": {"$in": [ObjectId(offer_id) for offer_id in offer_ids]}}):
+        await prerender_offer_qr(offer)
+
+@router.post("/", response_model=OfferRead)
+async def create_offer(offer: OfferCreate):
+    offer_data = offer.dict()
+    result = await Offer.insert_one(stamp_new(offer_data))
+    invalidate_offers()
+    await prerender_offer_qr(offer_data)
+    offer_data["id"] = str(result.inserted_id)
+    return OfferRead(**offer_data)
+
+@router.get("/", response_model=List[OfferRead])
+async def get_all_offers(
+    if_none_match: Optional[str] = Header(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    selected = select_fields(OfferRead, fields)
+    offers, etag = await list_offers()
+    etag = selected.etag(etag)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    if offers:
+        return selected.respond([selected.trim(offer) for offer in offers], headers={"ETag": etag})
+    raise HTTPException(status_code=404, detail="No offers found")
+
+@router.get("/1/eligible", response_model=List[OfferRead])
+async def get_eligible_offers(
+    points: int = Query(..., ge=0, description="Points the consumer can spend"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    """Offers redeemable with `points`, cheapest first."""
+    selected = select_fields(OfferRead, fields)
+    offers = await eligible_offers(points)
+    if offers:
+        return selected.respond([selected.trim(offer) for offer in offers])
+    raise HTTPException(status_code=404, detail="No offers available for these points")
+
+@router.get("/{offer_id}", response_model=OfferRead)
+async def get_offer(
+    offer_id: str,
+    if_none_match: Optional[str] = Header(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    if not ObjectId.is_valid(offer_id):
+        raise HTTPException(status_code=400, detail="Invalid offer ID")
+
+    selected = select_fields(OfferRead, fields)
+    found = await find_offer(offer_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Offer not found")
+    _, offer, etag = found
+    etag = selected.etag(etag)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return selected.respond(selected.trim(offer), headers={"ETag": etag})
+
+@router.put("/{offer_id}", response_model=OfferRead)
+async def update_offer(offer_id: str, offer: OfferUpdate, response: Response, if_match: Optional[str] = Header(None)):
+    if not ObjectId.is_valid(offer_id):
+        raise HTTPException(status_code=400, detail="Invalid offer ID")
+
+    update_data = {k: v for k, v in offer.dict().items() if v is not None}
+    updated_offer = await update_by_id(Offer, offer_id, update_data, if_match)
+    if updated_offer is None:
+        raise HTTPException(status_code=404, detail="Offer not found")
+
+    invalidate_offers()
+    forget_offer_qr(offer_id)
+    await prerender_offer_qr(updated_offer)
+    response.headers["ETag"] = version_etag(updated_offer)
+    updated_offer["id"] = str(updated_offer.pop("_id"))
+    return OfferRead(**updated_offer)
+
+@router.delete("/{offer_id}")
+async def delete_offer(offer_id: str):
+    if not ObjectId.is_valid(offer_id):
+        raise HTTPException(status_code=400, detail="Invalid offer ID")
+
+    result = await Offer.delete_one({"_id": ObjectId(offer_id)})
+
+    if result.deleted_count == 1:
+        invalidate_offers()
+        forget_offer_qr(offer_id)
+        return {"message": "Offer deleted successfully"}
+
+    raise HTTPException(status_code=404, detail="Offer not found")
+
 @router.get("/{offer_id}/qr")
-async def get_offer_qr(offer_id: str):
+async def get_offer_qr(
+    offer_id: str,
+    format: str = Query("png", description="png, svg, or json for the legacy base64 payload"),
+    if_none_match: Optional[str] = Header(None),
+):
     """Generate a QR code when a user selects an offer."""
 
     if not ObjectId.is_valid(offer_id):
         raise HTTPException(status_code=400, detail="Invalid offer ID")
+    if format != "json" and format not in QR_FORMATS:
+        raise HTTPException(status_code=400, detail="QR format must be png, svg or json")
 
-    offer = await Offer.find_one({"_id": ObjectId(offer_id)})
-    if not offer:
+    found = await find_offer(offer_id)
+    if not found:
         raise HTTPException(status_code=404, detail="Offer not found")
+    offer = found[0]
 
-    qr_code = generate_qr_code(
-        offer_id=str(offer["_id"]),
-        description=offer["description"],
-        points_required=offer["points_required"]
+    if format == "json":
+        qr_png, _ = await get_offer_qr_image(offer, "png")
+        return {"qr_code": base64.b64encode(qr_png).decode("utf-8")}
+
+    image, etag = await get_offer_qr_image(offer, format)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, QR_CACHE_CONTROL)
+    return Response(
+        content=image,
+        media_type=QR_FORMATS[format][0],
+        headers={"ETag": etag, "Cache-Control": QR_CACHE_CONTROL},
     )
 
-    return {"qr_code": qr_code} 
+@router.post("/1/qr-sheet")
+async def get_offers_qr_sheet(request: OfferQRSheetRequest):
+    """
+    Render the QR codes of many offers at once, in parallel on the process pool,
+    as a ZIP of images (layout=zip) or one printable SVG sheet (layout=svg).
+    """
+    if request.layout not in ("zip", "svg"):
+        raise HTTPException(status_code=400, detail="Layout must be zip or svg")
+    if request.image_format not in QR_FORMATS:
+        raise HTTPException(status_code=400, detail="Image format must be png or svg")
+    if not 1 <= request.columns <= 20:
+        raise HTTPException(status_code=400, detail="Columns must be between 1 and 20")
+    if not request.offer_ids or len(request.offer_ids) > QR_SHEET_MAX_OFFERS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {QR_SHEET_MAX_OFFERS} offers can be rendered at once")
+    if not all(ObjectId.is_valid(offer_id) for offer_id in request.offer_ids):
+        raise HTTPException(status_code=400, detail="Invalid offer ID")
+
+    found = await Offer.find({"_id": {"$in": [ObjectId(offer_id) for offer_id in request.offer_ids]}}).to_list(None)
+    offers = {str(offer["_id"]): offer for offer in found}
+    missing = [offer_id for offer_id in request.offer_ids if offer_id not in offers]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Offers not found: {', '.join(missing)}")
+
+    ordered = [offers[offer_id] for offer_id in dict.fromkeys(request.offer_ids)]
+    images = await asyncio.gather(*(get_offer_qr_image(offer, request.image_format) for offer in ordered))
+    entries = [(offer, image, request.image_format) for offer, (image, _) in zip(ordered, images)]
+
+    if request.layout == "zip":
+        return Response(
+            content=build_zip(entries),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="offer-qr-codes.zip"'},
+        )
+    return Response(
+        content=build_svg_sheet(entries, request.columns),
+        media_type="image/svg+xml",
+        headers={"Content-Disposition": 'inline; filename="offer-qr-sheet.svg"'},
+    )
+
+@router.post("/1/bulk", response_model=BulkResult)
+async def bulk_create_offers(request: Request):
+    """Create offers from a JSON array or NDJSON body; results are reported per item."""
+    valid, errors = validate_items(await read_items(request), OfferCreate)
+    created = await bulk_insert(Offer, [(index, offer.dict()) for index, offer in valid])
+    invalidate_offers()
+    await _prerender_offer_qrs(succeeded_ids(created, CREATED))
+    return bulk_result(errors, created)
+
+@router.put("/1/bulk", response_model=BulkResult)
+async def bulk_update_offers(request: Request):
+    """Update offers given as objects with an "id" and the fields to change."""
+    valid, errors = validate_updates(await read_items(request), OfferUpdate)
+    updated = await bulk_update(Offer, valid)
+    invalidate_offers()
+    updated_ids = succeeded_ids(updated, UPDATED)
+    for offer_id in updated_ids:
+        forget_offer_qr(offer_id)
+    await _prerender_offer_qrs(updated_ids)
+    return bulk_result(errors, updated)
+
+@router.delete("/1/bulk", response_model=BulkResult)
+async def bulk_delete_offers(request: Request):
+    """Delete offers by id."""
+    valid, errors = validate_ids(await read_items(request))
+    deleted = await bulk_delete(Offer, valid)
+    invalidate_offers()
+    for offer_id in succeeded_ids(deleted, DELETED):
+        forget_offer_qr(offer_id)
+    return bulk_result(errors, deleted)
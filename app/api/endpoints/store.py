@@ -1,52 +1,79 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Request, Query, Header, Response
 from bson import ObjectId
 from app.db.db import Store
 from app.schemas.store import StoreCreate, StoreRead, StoreUpdate
-from typing import List
+from app.schemas.page import Page
+from app.schemas.bulk import BulkResult
+from app.services.entity_cache import find_by_id, invalidate
+from app.utils.versioning import stamp_new, update_by_id, version_etag
+from app.utils.fields import FIELDS_DESCRIPTION, select_fields
+from app.utils.http_cache import etag_matches, list_etag, not_modified
+from app.utils.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.bulk import (
+    DELETED, UPDATED, bulk_delete, bulk_insert, bulk_result, bulk_update, read_items, succeeded_ids,
+    validate_ids, validate_items, validate_updates,
+)
+from typing import List, Optional
 
 router = APIRouter()
 
 @router.post("/", response_model=StoreRead)
 async def create_store(store: StoreCreate):
     store_data = store.dict()
-    result = await Store.insert_one(store_data)
+    result = await Store.insert_one(stamp_new(store_data))
     store_data["id"] = str(result.inserted_id)
     return StoreRead(**store_data)
 
-@router.get("/", response_model=List[StoreRead])
-async def get_all_stores():
-    stores = await Store.find().to_list()
-    if stores:
-        for store in stores:
-            store["id"] = str(store.pop("_id"))
-        return [StoreRead(**store) for store in stores]
+STORE_SORT_FIELDS = ("name", "location")
+
+@router.get("/", response_model=Page[StoreRead])
+async def get_all_stores(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    next: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    sort: Optional[str] = Query(None, description="Field to sort by, prefix with '-' for descending"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
+    selected = select_fields(StoreRead, fields)
+    etag = await list_etag(Store, request)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    stores, next_cursor = await paginate(Store, {}, limit, next, sort, STORE_SORT_FIELDS, selected.projection)
+    if stores or next:
+        return selected.page(stores, next_cursor, etag)
     raise HTTPException(status_code=404, detail="No stores found")
 
 @router.get("/{store_id}", response_model=StoreRead)
-async def get_store(store_id: str):
+async def get_store(
+    store_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
     if not ObjectId.is_valid(store_id):
         raise HTTPException(status_code=400, detail="Invalid store ID")
 
-    store = await Store.find_one({"_id": ObjectId(store_id)})
+    selected = select_fields(StoreRead, fields)
+    store = await find_by_id(Store, store_id)
     if store:
-        store["id"] = str(store.pop("_id"))
-        return StoreRead(**store)
+        return selected.one(store, if_none_match)
     raise HTTPException(status_code=404, detail="Store not found")
 
 @router.put("/{store_id}", response_model=StoreRead)
-async def update_store(store_id: str, store: StoreUpdate):
+async def update_store(store_id: str, store: StoreUpdate, response: Response, if_match: Optional[str] = Header(None)):
     if not ObjectId.is_valid(store_id):
         raise HTTPException(status_code=400, detail="Invalid store ID")
 
     update_data = {k: v for k, v in store.dict().items() if v is not None}
-    result = await Store.update_one({"_id": ObjectId(store_id)}, {"$set": update_data})
+    updated_store = await update_by_id(Store, store_id, update_data, if_match)
+    if updated_store is None:
+        raise HTTPException(status_code=404, detail="Store not found")
 
-    if result.modified_count == 1:
-        updated_store = await Store.find_one({"_id": ObjectId(store_id)})
-        updated_store["id"] = str(updated_store.pop("_id"))
-        return StoreRead(**updated_store)
-
-    raise HTTPException(status_code=404, detail="Store not found")
+    if update_data:
+        await invalidate(Store, store_id)
+    response.headers["ETag"] = version_etag(updated_store)
+    updated_store["id"] = str(updated_store.pop("_id"))
+    return StoreRead(**updated_store)
 
 @router.delete("/{store_id}")
 async def delete_store(store_id: str):
@@ -56,12 +83,13 @@ async def delete_store(store_id: str):
     result = await Store.delete_one({"_id": ObjectId(store_id)})
 
     if result.deleted_count == 1:
+        await invalidate(Store, store_id)
         return {"message": "Store deleted successfully"}
 
     raise HTTPException(status_code=404, detail="Store not found")
 
 @router.get("/1/search", response_model=List[StoreRead])
-async def search_store(name: str = Query(None), location: str = Query(None)):
+async def search_store(name: str = Query(None), location: str = Query(None), fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)):
     if not name and not location:
         raise HTTPException(status_code=400, detail="Either name or location must be provided")
     
@@ -71,10 +99,32 @@ async def search_store(name: str = Query(None), location: str = Query(None)):
     if location:
         query["location"] = location
     
-    stores = await Store.find(query).to_list()
+    selected = select_fields(StoreRead, fields)
+    stores = await Store.find(query, selected.projection).to_list()
     if stores:
-        for store in stores:
-            store["id"] = str(store.pop("_id"))
-        return [StoreRead(**store) for store in stores]
+        return selected.many(stores)
 
     raise HTTPException(status_code=404, detail="No matching stores found")
+
+@router.post("/1/bulk", response_model=BulkResult)
+async def bulk_create_stores(request: Request):
+    """Create stores from a JSON array or NDJSON body; results are reported per item."""
+    valid, errors = validate_items(await read_items(request), StoreCreate)
+    created = await bulk_insert(Store, [(index, store.dict()) for index, store in valid])
+    return bulk_result(errors, created)
+
+@router.put("/1/bulk", response_model=BulkResult)
+async def bulk_update_stores(request: Request):
+    """Update stores given as objects with an "id" and the fields to change."""
+    valid, errors = validate_updates(await read_items(request), StoreUpdate)
+    updated = await bulk_update(Store, valid)
+    await invalidate(Store, *succeeded_ids(updated, UPDATED))
+    return bulk_result(errors, updated)
+
+@router.delete("/1/bulk", response_model=BulkResult)
+async def bulk_delete_stores(request: Request):
+    """Delete stores by id."""
+    valid, errors = validate_ids(await read_items(request))
+    deleted = await bulk_delete(Store, valid)
+    await invalidate(Store, *succeeded_ids(deleted, DELETED))
+    return bulk_result(errors, deleted)
@@ -1,118 +1,180 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, BackgroundTasks, Query
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Query, Header, Response
 from bson import ObjectId
-from app.db.db import Visit
+from app.db.db import Store, Visit
+from pymongo import ReturnDocument
 from app.schemas.visit import VisitCreate, VisitRead, VisitUpdate
-import aiofiles
+from app.schemas.page import Page
+from app.schemas.bulk import BulkResult
+from app.services.entity_cache import find_by_id, invalidate
+from app.services.expansion import EXPAND_DESCRIPTION, select_expansion
+from app.utils.versioning import stamp, stamp_new, update_by_id, version_etag
+from app.utils.fields import FIELDS_DESCRIPTION, select_fields
+from app.utils.http_cache import etag_matches, list_etag, not_modified
+from app.utils.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.bulk import (
+    DELETED, UPDATED, bulk_delete, bulk_insert, bulk_result, bulk_update, read_items, succeeded_ids,
+    validate_ids, validate_items, validate_updates,
+)
+from app.utils.image_quality import check_image_blurry
+from app.core.config import MAX_IMAGES_PER_BATCH, VISIT_CLAIM_LEASE
+from app.services.job_queue import enqueue_job
+from app.utils.uploads import content_upload_path, save_upload, upload_path, temp_upload_path
+from app.utils.export import stream_export, day_range_query, DEFAULT_EXPORT_BATCH_SIZE, MAX_EXPORT_BATCH_SIZE
+import asyncio
 import os
-from PIL import Image, ImageFilter
-import numpy as np
-from datetime import datetime
-from typing import List
+from datetime import datetime, timedelta
+from typing import List, Optional
 
 router = APIRouter()
 
-# Directory to store uploaded images
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 @router.post("/", response_model=VisitRead)
 async def create_visit(visit: VisitCreate):
     visit_data = visit.dict()
-    result = await Visit.insert_one(visit_data)
+    visit_data["is_complete"] = False
+    result = await Visit.insert_one(stamp_new(visit_data))
     visit_data["id"] = str(result.inserted_id)
     return VisitRead(**visit_data)
 
-def is_image_blurry(image_path: str) -> bool:
-    """Check if the image is blurry using the Laplacian method."""
-    img = Image.open(image_path)
-    img_gray = img.convert("L")  # Convert to grayscale
-    img_laplacian = np.array(img_gray.filter(ImageFilter.FIND_EDGES))
-    variance = np.var(img_laplacian)  # Variance measures sharpness
-    return variance < 100  # If variance is low, the image is blurry
-
 @router.post("/{visit_id}/upload-image")
 async def upload_image(visit_id: str, file: UploadFile = File(...)):
     if not ObjectId.is_valid(visit_id):
         raise HTTPException(status_code=400, detail="Invalid visit ID")
     
-    temp_file_path = os.path.join(UPLOAD_DIR, f"temp_{file.filename}")
-    async with aiofiles.open(temp_file_path, 'wb') as out_file:
-        content = await file.read()
-        await out_file.write(content)
+    temp_file_path = temp_upload_path(file.filename)
+    size, sha256 = await save_upload(file, temp_file_path)
     
-    if is_image_blurry(temp_file_path):
+    try:
+        blurry = await check_image_blurry(temp_file_path)
+    except Exception:
+        os.remove(temp_file_path)
+        raise HTTPException(status_code=400, detail="File is not a readable image")
+    if blurry:
         os.remove(temp_file_path)
         raise HTTPException(status_code=400, detail="Uploaded image is blurry. Please upload a clearer image.")
     
-    file_path = os.path.join(UPLOAD_DIR, f"{visit_id}_{file.filename}")
-    os.rename(temp_file_path, file_path)
+    file_path = upload_path(visit_id, file.filename)
+    os.replace(temp_file_path, file_path)
     
-    return {"message": "Image uploaded successfully", "file_path": file_path}
+    return {"message": "Image uploaded successfully", "file_path": file_path, "size": size, "sha256": sha256}
 
-async def send_images_to_ai(visit_id: str, image_path: str):
-    ai_result = {"BrandA": 5, "BrandB": 2}  # Example AI response
-    now = datetime.utcnow()
-    current_date = now.date()
-    current_time = now.time()
-    await Visit.update_one(
-        {"_id": ObjectId(visit_id)},
-        {"$set": {
-            "brand_detected": ai_result,
-            "completed": True,
-            "day": current_date,  
-            "time": current_time  
-        },
-        "$inc": {"gained_points": 10}}  
-    )
+async def _validate_and_store(visit_id: str, file: UploadFile) -> dict:
+    """Save, blur-check and file one image of a batch, reporting instead of raising."""
+    report = {"filename": file.filename, "accepted": False}
+    temp_file_path = temp_upload_path(file.filename)
+    try:
+        report["size"], report["sha256"] = await save_upload(file, temp_file_path)
+    except HTTPException as exc:
+        report["reason"] = exc.detail
+        return report
+
+    try:
+        blurry = await check_image_blurry(temp_file_path)
+    except Exception:
+        os.remove(temp_file_path)
+        report["reason"] = "File is not a readable image"
+        return report
+
+    if blurry:
+        os.remove(temp_file_path)
+        report["reason"] = "Image is blurry"
+        return report
+
+    # Identical photos share a file; different photos never overwrite each other
+    file_path = content_upload_path(visit_id, file.filename, report["sha256"])
+    os.replace(temp_file_path, file_path)
+    report.update(accepted=True, file_path=file_path)
+    return report
+
+@router.post("/{visit_id}/upload-images")
+async def upload_images(visit_id: str, files: List[UploadFile] = File(...)):
+    """Upload every photo of a visit at once; each one is blur-checked concurrently."""
+    if not ObjectId.is_valid(visit_id):
+        raise HTTPException(status_code=400, detail="Invalid visit ID")
+    if len(files) > MAX_IMAGES_PER_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMAGES_PER_BATCH} images can be uploaded at once")
+
+    results = await asyncio.gather(*(_validate_and_store(visit_id, file) for file in files))
+    accepted = sum(1 for result in results if result["accepted"])
+    return {
+        "message": f"{accepted} of {len(results)} images accepted",
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results,
+    }
 
 @router.post("/{visit_id}/process-images")
-async def process_images(visit_id: str, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def process_images(visit_id: str, file: UploadFile = File(...)):
     if not ObjectId.is_valid(visit_id):
         raise HTTPException(status_code=400, detail="Invalid visit ID")
     
-    file_path = os.path.join(UPLOAD_DIR, f"{visit_id}_{file.filename}")
-    async with aiofiles.open(file_path, 'wb') as out_file:
-        content = await file.read()
-        await out_file.write(content)
+    file_path = upload_path(visit_id, file.filename)
+    _, sha256 = await save_upload(file, file_path)
     
-    background_tasks.add_task(send_images_to_ai, visit_id, file_path)
+    job_id = await enqueue_job("visit", visit_id, file_path)
     
-    return {"message": "Images sent for AI processing", "file_path": file_path}
+    return {"message": "Images sent for AI processing", "file_path": file_path, "sha256": sha256, "job_id": job_id}
 
-@router.get("/", response_model=List[VisitRead])
-async def get_all_visits():
-    visits = await Visit.find().to_list()
-    if visits:
-        for visit in visits:
-            visit["id"] = str(visit.pop("_id"))
-        return [VisitRead(**visit) for visit in visits]
+VISIT_EXPANSIONS = ("store", "worker")
+VISIT_SORT_FIELDS = ("day", "time", "name")
+
+@router.get("/", response_model=Page[VisitRead])
+async def get_all_visits(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    next: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    sort: Optional[str] = Query(None, description="Field to sort by, prefix with '-' for descending"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
+    selected = select_fields(VisitRead, fields)
+    expansion = select_expansion(expand, VISIT_EXPANSIONS)
+    etag = None
+    if not expansion:
+        etag = await list_etag(Visit, request)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    visits, next_cursor = await paginate(Visit, {}, limit, next, sort, VISIT_SORT_FIELDS, selected.projection)
+    if visits or next:
+        if expansion:
+            return await expansion.page(selected, visits, next_cursor)
+        return selected.page(visits, next_cursor, etag)
     raise HTTPException(status_code=404, detail="No visits found")
 
 @router.get("/{visit_id}", response_model=VisitRead)
-async def get_visit(visit_id: str):
+async def get_visit(
+    visit_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
     if not ObjectId.is_valid(visit_id):
         raise HTTPException(status_code=400, detail="Invalid visit ID")
 
-    visit = await Visit.find_one({"_id": ObjectId(visit_id)})
+    selected = select_fields(VisitRead, fields)
+    expansion = select_expansion(expand, VISIT_EXPANSIONS)
+    visit = await find_by_id(Visit, visit_id)
     if visit:
-        visit["id"] = str(visit.pop("_id"))
-        return VisitRead(**visit)
+        if expansion:
+            return await expansion.one(selected, visit)
+        return selected.one(visit, if_none_match)
     raise HTTPException(status_code=404, detail="Visit not found")
 
 @router.put("/{visit_id}", response_model=VisitRead)
-async def update_visit(visit_id: str, visit: VisitUpdate):
+async def update_visit(visit_id: str, visit: VisitUpdate, response: Response, if_match: Optional[str] = Header(None)):
     if not ObjectId.is_valid(visit_id):
         raise HTTPException(status_code=400, detail="Invalid visit ID")
 
     update_data = {k: v for k, v in visit.dict().items() if v is not None}
-    result = await Visit.update_one({"_id": ObjectId(visit_id)}, {"$set": update_data})
+    updated_visit = await update_by_id(Visit, visit_id, update_data, if_match)
+    if updated_visit is None:
+        raise HTTPException(status_code=404, detail="Visit not found")
 
-    if result.modified_count == 1:
-        updated_visit = await Visit.find_one({"_id": ObjectId(visit_id)})
-        updated_visit["id"] = str(updated_visit.pop("_id"))
-        return VisitRead(**updated_visit)
-
-    raise HTTPException(status_code=404, detail="Visit not found")
+    if update_data:
+        await invalidate(Visit, visit_id)
+    response.headers["ETag"] = version_etag(updated_visit)
+    updated_visit["id"] = str(updated_visit.pop("_id"))
+    return VisitRead(**updated_visit)
 
 @router.delete("/{visit_id}")
 async def delete_visit(visit_id: str):
@@ -122,12 +184,18 @@ async def delete_visit(visit_id: str):
     result = await Visit.delete_one({"_id": ObjectId(visit_id)})
 
     if result.deleted_count == 1:
+        await invalidate(Visit, visit_id)
         return {"message": "Visit deleted successfully"}
 
     raise HTTPException(status_code=404, detail="Visit not found")
 
 @router.get("/1/search", response_model=List[VisitRead])
-async def search_visit(name: str = Query(None), consumer: str = Query(None)):
+async def search_visit(
+    name: str = Query(None),
+    consumer: str = Query(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+):
     if not name and not consumer:
         raise HTTPException(status_code=400, detail="Either name or consumer must be provided")
     
@@ -137,23 +205,130 @@ async def search_visit(name: str = Query(None), consumer: str = Query(None)):
     if consumer:
         query["consumer"] = consumer
     
-    visits = await Visit.find(query).to_list()
+    selected = select_fields(VisitRead, fields)
+    expansion = select_expansion(expand, VISIT_EXPANSIONS)
+    visits = await Visit.find(query, selected.projection).to_list()
     if visits:
-        for visit in visits:
-            visit["id"] = str(visit.pop("_id"))
-        return [VisitRead(**visit) for visit in visits]
+        if expansion:
+            return await expansion.many(selected, visits)
+        return selected.many(visits)
 
     raise HTTPException(status_code=404, detail="No matching visits found")
 
 @router.get("/1/not_completed", response_model=List[VisitRead])
-async def get_not_completed_visits():
+async def get_not_completed_visits(
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+):
+    selected = select_fields(VisitRead, fields)
+    expansion = select_expansion(expand, VISIT_EXPANSIONS)
     visits = await Visit.find({
         "is_complete": False,
-    }).to_list()
+    }, selected.projection).to_list()
 
     if visits:
-        for visit in visits:
-            visit["id"] = str(visit.pop("_id")) 
-        return [VisitRead(**visit) for visit in visits]
+        if expansion:
+            return await expansion.many(selected, visits)
+        return selected.many(visits)
 
     raise HTTPException(status_code=404, detail="No available visits found")
+
+@router.post("/1/claim", response_model=VisitRead)
+async def claim_next_visit(
+    worker: str = Query(..., description="ID of the worker taking the visit"),
+    store: Optional[str] = Query(None, description="Only claim visits of this store"),
+    region: Optional[str] = Query(None, description="Only claim visits of stores at this location"),
+):
+    """
+    Atomically hand the next incomplete, unclaimed visit to `worker`. The claim
+    is a lease: if the visit is not completed or released within
+    VISIT_CLAIM_LEASE seconds, it becomes available to other workers again.
+    """
+    if not ObjectId.is_valid(worker):
+        raise HTTPException(status_code=400, detail="Invalid worker ID")
+    if not store and not region:
+        raise HTTPException(status_code=400, detail="Either store or region must be provided")
+
+    now = datetime.utcnow()
+    query = {
+        "is_complete": False,
+        "$or": [{"claim_expires": None}, {"claim_expires": {"$lte": now}}],
+    }
+    if store:
+        query["store"] = store
+    else:
+        stores = await Store.find({"location": region}, {"_id": 1}).to_list(None)
+        query["store"] = {"$in": [str(doc["_id"]) for doc in stores]}
+
+    visit = await Visit.find_one_and_update(
+        query,
+        stamp({"$set": {"worker": worker, "claim_expires": now + timedelta(seconds=VISIT_CLAIM_LEASE)}}),
+        sort=[("day", 1), ("time", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if visit:
+        await invalidate(Visit, visit["_id"])
+        visit["id"] = str(visit.pop("_id"))
+        return VisitRead(**visit)
+    raise HTTPException(status_code=404, detail="No available visits found")
+
+@router.post("/{visit_id}/release")
+async def release_visit(visit_id: str, worker: str = Query(..., description="ID of the worker holding the claim")):
+    """Give a claimed visit back before its lease runs out."""
+    if not ObjectId.is_valid(visit_id):
+        raise HTTPException(status_code=400, detail="Invalid visit ID")
+
+    result = await Visit.update_one(
+        {"_id": ObjectId(visit_id), "worker": worker, "claim_expires": {"$gt": datetime.utcnow()}},
+        stamp({"$unset": {"claim_expires": ""}}),
+    )
+    if result.modified_count == 1:
+        await invalidate(Visit, visit_id)
+        return {"message": "Visit released successfully"}
+    raise HTTPException(status_code=404, detail="No active claim on this visit for this worker")
+
+VISIT_EXPORT_COLUMNS = ("id", "name", "time", "day", "is_complete", "total_pics", "worker", "store", "brand_detected")
+
+@router.get("/1/export")
+async def export_visits(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    start: Optional[datetime] = Query(None, description="Include visits whose day is on or after this date"),
+    end: Optional[datetime] = Query(None, description="Include visits whose day is before this date"),
+    store: Optional[str] = Query(None),
+    worker: Optional[str] = Query(None),
+    batch_size: int = Query(DEFAULT_EXPORT_BATCH_SIZE, ge=1, le=MAX_EXPORT_BATCH_SIZE),
+):
+    query = day_range_query(start, end)
+    if store:
+        query["store"] = store
+    if worker:
+        query["worker"] = worker
+    return stream_export(Visit, query, format, VISIT_EXPORT_COLUMNS, "visits", batch_size)
+
+@router.post("/1/bulk", response_model=BulkResult)
+async def bulk_create_visits(request: Request):
+    """Create visits from a JSON array or NDJSON body; results are reported per item."""
+    valid, errors = validate_items(await read_items(request), VisitCreate)
+    docs = []
+    for index, visit in valid:
+        data = visit.dict()
+        data["is_complete"] = False
+        docs.append((index, data))
+    created = await bulk_insert(Visit, docs)
+    return bulk_result(errors, created)
+
+@router.put("/1/bulk", response_model=BulkResult)
+async def bulk_update_visits(request: Request):
+    """Update visits given as objects with an "id" and the fields to change."""
+    valid, errors = validate_updates(await read_items(request), VisitUpdate)
+    updated = await bulk_update(Visit, valid)
+    await invalidate(Visit, *succeeded_ids(updated, UPDATED))
+    return bulk_result(errors, updated)
+
+@router.delete("/1/bulk", response_model=BulkResult)
+async def bulk_delete_visits(request: Request):
+    """Delete visits by id."""
+    valid, errors = validate_ids(await read_items(request))
+    deleted = await bulk_delete(Visit, valid)
+    await invalidate(Visit, *succeeded_ids(deleted, DELETED))
+    return bulk_result(errors, deleted)
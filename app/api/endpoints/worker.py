@@ -1,61 +1,103 @@
-from fastapi import APIRouter, HTTPException ,Query
+from fastapi import APIRouter, HTTPException, Request, Query, Header, Response
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from app.core.config import BULK_MAX_PROFILES
 from app.db.db import Worker
 from app.schemas.worker import WorkerCreate, WorkerRead, WorkerUpdate
-from passlib.context import CryptContext
-from typing import List
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+from app.schemas.page import Page
+from app.schemas.bulk import BulkResult
+from app.services.auth_service import revoke_subject
+from app.services.identity_service import (
+    bulk_create_profiles, bulk_delete_profiles, bulk_update_profiles, register_identity, remove_identity, update_profile,
+)
+from app.services.password_service import hash_password, hash_passwords
+from app.services.entity_cache import find_by_id, invalidate
+from app.utils.versioning import stamp_new, version_etag
+from app.utils.fields import FIELDS_DESCRIPTION, select_fields
+from app.utils.http_cache import etag_matches, list_etag, not_modified
+from app.utils.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.bulk import DELETED, UPDATED, bulk_result, read_items, succeeded_ids, validate_ids, validate_items, validate_updates
+from typing import List, Optional
 
 router = APIRouter()
 
+# Never fetched from the database, not even when listed in ?fields=
+HIDDEN_FIELDS = ("password",)
+
 @router.post("/", response_model=WorkerRead)
 async def create_worker(worker: WorkerCreate):
-    hashed_password = hash_password(worker.password)
+    hashed_password = await hash_password(worker.password)
     worker_data = worker.dict()
     worker_data["password"] = hashed_password
-    result = await Worker.insert_one(worker_data)
-    worker_data["id"] = str(result.inserted_id)
+    worker_data["_id"] = ObjectId()
+    try:
+        await register_identity("worker", worker_data["_id"], worker_data["email"], hashed_password)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        await Worker.insert_one(stamp_new(worker_data))
+    except DuplicateKeyError:
+        await remove_identity("worker", str(worker_data["_id"]))
+        raise HTTPException(status_code=400, detail="Email already registered")
+    worker_data["id"] = str(worker_data.pop("_id"))
     worker_data.pop("password")
     return WorkerRead(**worker_data)
 
-@router.get("/", response_model=List[WorkerRead])
-async def get_all_workers():
-    workers = await Worker.find().to_list()
-    if workers:
-        for worker in workers:
-            worker["id"] = str(worker.pop("_id"))
-            worker.pop("password", None) 
-        return [WorkerRead(**worker) for worker in workers]
+WORKER_SORT_FIELDS = ("full_name",)
+
+@router.get("/", response_model=Page[WorkerRead])
+async def get_all_workers(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    next: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    sort: Optional[str] = Query(None, description="Field to sort by, prefix with '-' for descending"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
+    selected = select_fields(WorkerRead, fields, HIDDEN_FIELDS)
+    etag = await list_etag(Worker, request)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    workers, next_cursor = await paginate(Worker, {}, limit, next, sort, WORKER_SORT_FIELDS, selected.projection)
+    if workers or next:
+        return selected.page(workers, next_cursor, etag)
     raise HTTPException(status_code=404, detail="No workers found")
 
 @router.get("/{worker_id}", response_model=WorkerRead)
-async def get_worker(worker_id: str):
+async def get_worker(
+    worker_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
     if not ObjectId.is_valid(worker_id):
         raise HTTPException(status_code=400, detail="Invalid worker ID")
 
-    worker = await Worker.find_one({"_id": ObjectId(worker_id)})
+    selected = select_fields(WorkerRead, fields, HIDDEN_FIELDS)
+    worker = await find_by_id(Worker, worker_id, HIDDEN_FIELDS)
     if worker:
-        worker["id"] = str(worker.pop("_id"))
-        return WorkerRead(**worker)
+        return selected.one(worker, if_none_match)
     raise HTTPException(status_code=404, detail="Worker not found")
 
 @router.put("/{worker_id}", response_model=WorkerRead)
-async def update_worker(worker_id: str, worker: WorkerUpdate):
+async def update_worker(worker_id: str, worker: WorkerUpdate, response: Response, if_match: Optional[str] = Header(None)):
     if not ObjectId.is_valid(worker_id):
         raise HTTPException(status_code=400, detail="Invalid worker ID")
 
     update_data = {k: v for k, v in worker.dict().items() if v is not None}
-    result = await Worker.update_one({"_id": ObjectId(worker_id)}, {"$set": update_data})
-
-    if result.modified_count == 1:
-        updated_worker = await Worker.find_one({"_id": ObjectId(worker_id)})
-        updated_worker["id"] = str(updated_worker.pop("_id"))
-        return WorkerRead(**updated_worker)
-
-    raise HTTPException(status_code=404, detail="Worker not found")
+    if "password" in update_data:
+        update_data["password"] = await hash_password(update_data["password"])
+    try:
+        updated_worker = await update_profile("worker", worker_id, update_data, if_match)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    if updated_worker is None:
+        raise HTTPException(status_code=404, detail="Worker not found")
+
+    if update_data:
+        await invalidate(Worker, worker_id)
+    response.headers["ETag"] = version_etag(updated_worker)
+    updated_worker["id"] = str(updated_worker.pop("_id"))
+    return WorkerRead(**updated_worker)
 
 @router.delete("/{worker_id}")
 async def delete_worker(worker_id: str):
@@ -65,28 +107,59 @@ async def delete_worker(worker_id: str):
     result = await Worker.delete_one({"_id": ObjectId(worker_id)})
 
     if result.deleted_count == 1:
+        await invalidate(Worker, worker_id)
+        await remove_identity("worker", worker_id)
+        await revoke_subject(worker_id)
         return {"message": "Worker deleted successfully"}
 
     raise HTTPException(status_code=404, detail="Worker not found")
 
 @router.get("/1/search", response_model=List[WorkerRead])
-async def search_worker(full_name: str = Query(None), email: str = Query(None)):
+async def search_worker(full_name: str = Query(None), email: str = Query(None), fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)):
     if not full_name and not email:
          raise HTTPException(status_code=400, detail="Either full name or email must be provided")
-    print(f"Received full_name: {full_name}, email: {email}")
     query = {}
     if full_name:
          query["full_name"] = full_name
     if email:
          query["email"] = email
-    print(f"Query: {query}")
-    workers = await Worker.find(query).to_list()
-    print(workers)
+    selected = select_fields(WorkerRead, fields, HIDDEN_FIELDS)
+    workers = await Worker.find(query, selected.projection).to_list()
     if workers:
-         for worker in workers:
-            print(worker)
-            worker.pop("password", None)  
-            worker["id"] = str(worker.pop("_id")) 
-         return [WorkerRead(**worker) for worker in workers]
+        return selected.many(workers)
 
     raise HTTPException(status_code=404, detail="No matching workers found")
+
+@router.post("/1/bulk", response_model=BulkResult)
+async def bulk_create_workers(request: Request):
+    """Create workers from a JSON array or NDJSON body; results are reported per item."""
+    valid, errors = validate_items(await read_items(request, BULK_MAX_PROFILES), WorkerCreate)
+    hashes = await hash_passwords([worker.password for _, worker in valid])
+    docs = []
+    for (index, worker), hashed_password in zip(valid, hashes):
+        data = worker.dict()
+        data["password"] = hashed_password
+        docs.append((index, data))
+    created = await bulk_create_profiles("worker", docs)
+    return bulk_result(errors, created)
+
+@router.put("/1/bulk", response_model=BulkResult)
+async def bulk_update_workers(request: Request):
+    """Update workers given as objects with an "id" and the fields to change."""
+    valid, errors = validate_updates(await read_items(request, BULK_MAX_PROFILES), WorkerUpdate)
+    to_hash = [data for _, _, data in valid if "password" in data]
+    hashes = await hash_passwords([data["password"] for data in to_hash])
+    for data, hashed_password in zip(to_hash, hashes):
+        data["password"] = hashed_password
+    updated = await bulk_update_profiles("worker", valid)
+    await invalidate(Worker, *succeeded_ids(updated, UPDATED))
+    return bulk_result(errors, updated)
+
+@router.delete("/1/bulk", response_model=BulkResult)
+async def bulk_delete_workers(request: Request):
+    """Delete workers by id, together with their identities and tokens."""
+    valid, errors = validate_ids(await read_items(request))
+    deleted = await bulk_delete_profiles("worker", valid)
+    await invalidate(Worker, *succeeded_ids(deleted, DELETED))
+    await revoke_subject(*succeeded_ids(deleted, DELETED))
+    return bulk_result(errors, deleted)
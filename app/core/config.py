@@ -1 +1,111 @@
-from pydantic import BaseSettings 
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# MongoDB; the client is created per process (see app/db/db.py)
+MONGO_URI = os.getenv("DATA_BASE")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "RAMY_APP")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+# 0 means no socket timeout
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))
+# Wire compression, e.g. "zstd,zlib" (zstd and snappy need their optional packages)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+# primary, primaryPreferred, secondary, secondaryPreferred or nearest
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+# Authentication
+SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Decoded tokens kept in memory so repeat requests skip signature checks
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Check logged-out tokens and deleted accounts against an in-memory revocation list,
+# shared between processes through the RevokedToken collection
+TOKEN_REVOCATION_ENABLED = os.getenv("TOKEN_REVOCATION_ENABLED", "true").lower() == "true"
+# Seconds between loads of the revocations recorded by other processes
+TOKEN_REVOCATION_POLL_INTERVAL = float(os.getenv("TOKEN_REVOCATION_POLL_INTERVAL", "5"))
+
+# Password hashing: new hashes use argon2, bcrypt hashes are upgraded on the next login
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads hashing and verifying passwords; bounds how many run at once
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
+# Bulk endpoints: items per request, and per insert_many / bulk_write round trip
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "50000"))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+# Bulk profile creates/updates hash a password per item, so they take far fewer items
+BULK_MAX_PROFILES = int(os.getenv("BULK_MAX_PROFILES", "1000"))
+
+# Read-through cache of documents fetched by id
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "30"))
+ENTITY_CACHE_MAX_BYTES = int(os.getenv("ENTITY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Dotted path of the InvalidationBackend that tells other processes about writes
+ENTITY_CACHE_BACKEND = os.getenv("ENTITY_CACHE_BACKEND", "app.services.entity_cache.LocalInvalidationBackend")
+
+# Seconds after which a list ETag changes even if no write to the collection was seen
+LIST_ETAG_MAX_AGE = float(os.getenv("LIST_ETAG_MAX_AGE", "60"))
+
+# What the app does with the index registry at startup: "ensure", "check" or "off"
+INDEX_MODE = os.getenv("INDEX_MODE", "ensure")
+
+# Seconds a worker keeps a claimed visit before it is offered to others again
+VISIT_CLAIM_LEASE = int(os.getenv("VISIT_CLAIM_LEASE", "3600"))
+
+# Image validation
+BLUR_THRESHOLD = float(os.getenv("BLUR_THRESHOLD", "100"))
+# Longest side the image is reduced to before the blur check (0 = full resolution).
+# Shrinking raises the edge variance, so BLUR_THRESHOLD must be tuned again when this is set.
+BLUR_CHECK_MAX_SIDE = int(os.getenv("BLUR_CHECK_MAX_SIDE", "0"))
+
+# Worker pool for CPU-bound work (0 means one process per CPU)
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "0"))
+
+# Uploads
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+# Largest single image accepted, and largest multipart request body overall
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES", str(256 * 1024 * 1024)))
+# Largest number of photos accepted by one batch upload request
+MAX_IMAGES_PER_BATCH = int(os.getenv("MAX_IMAGES_PER_BATCH", "50"))
+
+# AI brand detection job queue
+AI_DETECTOR = os.getenv("AI_DETECTOR", "app.services.brand_detector.StubBrandDetector")
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "8"))
+AI_POLL_INTERVAL = float(os.getenv("AI_POLL_INTERVAL", "1.0"))
+# Seconds a claimed job stays invisible to other workers before it can be reclaimed
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "5"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "600"))
+# Detection results are buffered and written in one bulk_write per window
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "500"))
+POINTS_PER_VISIT_IMAGE = int(os.getenv("POINTS_PER_VISIT_IMAGE", "10"))
+# Credited to the consumer's points ledger for every processed activity image
+POINTS_PER_ACTIVITY_IMAGE = int(os.getenv("POINTS_PER_ACTIVITY_IMAGE", "10"))
+
+# Points ledger: entries still pending after this many seconds are finished by reconciliation
+LEDGER_PENDING_TIMEOUT = int(os.getenv("LEDGER_PENDING_TIMEOUT", "60"))
+# Seconds between reconciliation runs, taken in turns by the AI workers (0 disables them)
+LEDGER_RECONCILE_INTERVAL = float(os.getenv("LEDGER_RECONCILE_INTERVAL", "300"))
+
+# Offer QR codes
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "1024"))
+# Rendering backend: "segno" (direct PNG/SVG writer) or "qrcode" (qrcode + PIL)
+QR_RENDERER = os.getenv("QR_RENDERER", "segno")
+QR_SCALE = int(os.getenv("QR_SCALE", "10"))
+QR_BORDER = int(os.getenv("QR_BORDER", "4"))
+QR_SHEET_MAX_OFFERS = int(os.getenv("QR_SHEET_MAX_OFFERS", "500"))
+
+# Offer catalog read cache
+OFFER_CACHE_TTL = float(os.getenv("OFFER_CACHE_TTL", "60"))
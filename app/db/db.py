@@ -1,24 +1,155 @@
+"""
+Per-process MongoDB client.
+
+The client is never created at import time. The app connects from its
+lifespan hook (so every worker process gets its own pool, also under
+gunicorn --preload), and anything else connects on first use. A client
+inherited through fork() is discarded and replaced.
+
+The module-level collections (Visit, Consumer, ...) are proxies that resolve
+to the current process's collection on each use, so they can be imported
+anywhere before a connection exists.
+
+Connecting also measures the database clock; db_now() is the current time
+on it, for timestamps written by inserts (updates use $currentDate).
+"""
+import asyncio
+import logging
 import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
-import logging
 
-load_dotenv()
-MONGO_URI = os.getenv("DATA_BASE")
+from app.core.config import (
+    MONGO_URI, MONGO_DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_COMPRESSORS, MONGO_READ_PREFERENCE,
+)
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[AsyncIOMotorClient] = None
+_client_pid: Optional[int] = None
+_collections: Dict[str, object] = {}
+# database clock - local clock, measured by sync_clock()
+_clock_offset = timedelta(0)
+
+
+def client_options() -> dict:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+    }
+    if MONGO_SOCKET_TIMEOUT_MS:
+        options["socketTimeoutMS"] = MONGO_SOCKET_TIMEOUT_MS
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+
+def get_client() -> AsyncIOMotorClient:
+    """The client of the current process, created on first use."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        # A client copied from the parent by fork() shares its sockets; never reuse it
+        _client = AsyncIOMotorClient(MONGO_URI, **client_options())
+        _client_pid = os.getpid()
+        _collections.clear()
+    return _client
+
+
+def get_database():
+    return get_client()[MONGO_DB_NAME]
+
+
+def get_collection(name: str):
+    get_client()
+    collection = _collections.get(name)
+    if collection is None:
+        collection = _collections[name] = get_database()[name]
+    return collection
+
+
+async def connect_database():
+    """Create this process's client and open MONGO_MIN_POOL_SIZE connections before serving."""
+    client = get_client()
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(1, MONGO_MIN_POOL_SIZE))))
+    await sync_clock()
+    logger.info("Connected to MongoDB (pid %s)", os.getpid())
+
+
+async def sync_clock():
+    """Measure the offset of the database clock from ours, halfway through one round trip."""
+    global _clock_offset
+    sent = datetime.utcnow()
+    try:
+        reply = await get_client().admin.command("hello")
+    except Exception:
+        logger.warning("Could not read the database clock; stamping inserts with the local clock")
+        return
+    received = datetime.utcnow()
+    if isinstance(reply.get("localTime"), datetime):
+        _clock_offset = reply["localTime"].replace(tzinfo=None) - (sent + (received - sent) / 2)
+
+
+def db_now() -> datetime:
+    """The current UTC time on the database clock (as of the last sync_clock())."""
+    return datetime.utcnow() + _clock_offset
+
+
+def close_database():
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        _client.close()
+    _client = None
+    _client_pid = None
+    _collections.clear()
+
+
+class CollectionProxy:
+    """Stands in for a Motor collection until the process has a client."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_collection(self.name), attr)
+
+    def __getitem__(self, key):
+        return get_collection(self.name)[key]
 
-client = AsyncIOMotorClient(MONGO_URI)
+    def __repr__(self):
+        return f"CollectionProxy({self.name!r})"
 
-database = client["RAMY_APP"]
 
-your_collection = database["TEST"]
-Activity = database["Activity"]
-Admin = database["Admin"]
-Consumer = database["Consumer"]
-Offer = database["Offer"]
-Store = database["Store"]
-Visit = database["Visit"]
-Worker = database["Worker"]
+class DatabaseProxy:
+    def __getitem__(self, name: str) -> CollectionProxy:
+        return CollectionProxy(name)
 
+    def __getattr__(self, attr):
+        return getattr(get_database(), attr)
 
 
+database = DatabaseProxy()
 
+your_collection = CollectionProxy("TEST")
+Activity = CollectionProxy("Activity")
+Admin = CollectionProxy("Admin")
+BrandRollup = CollectionProxy("BrandRollup")
+Consumer = CollectionProxy("Consumer")
+Identity = CollectionProxy("Identity")
+Job = CollectionProxy("Job")
+Lease = CollectionProxy("Lease")
+Offer = CollectionProxy("Offer")
+PointsLedger = CollectionProxy("PointsLedger")
+RevokedToken = CollectionProxy("RevokedToken")
+Store = CollectionProxy("Store")
+Visit = CollectionProxy("Visit")
+Worker = CollectionProxy("Worker")
@@ -0,0 +1,147 @@
+"""
+Registry of every index the routers and services rely on.
+
+    python -m app.db.indexes           create missing indexes
+    python -m app.db.indexes --check   list missing indexes, exit 1 if any
+
+The app runs the same registry from its lifespan hook (see INDEX_MODE).
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Dict, List
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.db.db import database
+
+logger = logging.getLogger(__name__)
+
+
+def _index(*keys: str, **options) -> IndexModel:
+    name = options.pop("name", "_".join(f"{key}_1" for key in keys))
+    return IndexModel([(key, ASCENDING) for key in keys], name=name, **options)
+
+
+def _incomplete(*keys: str) -> IndexModel:
+    """Partial index holding only the tasks that still have to be done."""
+    return _index(*keys, name="_".join(f"{key}_1" for key in keys) + "_incomplete",
+                  partialFilterExpression={"is_complete": False})
+
+
+def _user_indexes() -> List[IndexModel]:
+    return [
+        _index("email", unique=True),
+        _index("full_name", "_id"),
+        _index("updated_at", "_id"),
+    ]
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "Visit": [
+        _index("name", "_id"),
+        _index("day", "_id"),
+        _index("time", "_id"),
+        _index("worker", "day"),
+        _index("store", "day"),
+        # list ETags: the most recently written visit
+        _index("updated_at", "_id"),
+        _incomplete("is_complete"),
+        # claim_next_visit: open visits of a store, oldest first, skipping live claims
+        _incomplete("store", "day", "time", "claim_expires"),
+    ],
+    "Activity": [
+        _index("name", "_id"),
+        _index("day", "_id"),
+        _index("time", "_id"),
+        _index("consumer", "day"),
+        _index("store", "day"),
+        _index("updated_at", "_id"),
+        _incomplete("is_complete"),
+    ],
+    "Offer": [
+        _index("points_required", "_id"),
+    ],
+    "Store": [
+        _index("name", "_id"),
+        _index("location", "_id"),
+        _index("updated_at", "_id"),
+    ],
+    "Admin": _user_indexes(),
+    # reconciliation: consumers with ledger entries still marked on them
+    "Consumer": _user_indexes() + [_index("pending_entries")],
+    "Worker": _user_indexes(),
+    "Identity": [
+        _index("email", unique=True),
+        _index("role", "user_id"),
+    ],
+    "PointsLedger": [
+        _index("key", unique=True),
+        _index("consumer", "created_at", "_id"),
+        _index("status", "created_at"),
+    ],
+    "Job": [
+        _index("status", "run_at"),
+        _index("status", "lease_expires"),
+    ],
+    # token revocations: polled by creation time, dropped once the tokens have expired anyway
+    "RevokedToken": [
+        _index("created_at"),
+        _index("expires", expireAfterSeconds=0),
+    ],
+    "BrandRollup": [
+        _index("store", "day", "brand", unique=True),
+        _index("day", "brand"),
+    ],
+}
+
+
+async def _missing_in(collection_name: str) -> List[str]:
+    existing = await database[collection_name].index_information()
+    return [
+        f"{collection_name}.{index.document['name']}"
+        for index in INDEXES[collection_name]
+        if index.document["name"] not in existing
+    ]
+
+
+async def ensure_indexes() -> List[str]:
+    """Create every registered index; returns the ones that could not be built."""
+    failed = []
+    for collection_name, indexes in INDEXES.items():
+        try:
+            await database[collection_name].create_indexes(indexes)
+        except OperationFailure as exc:
+            # e.g. a unique index over data that already holds duplicates
+            logger.error("Creating indexes on %s failed: %s", collection_name, exc)
+            failed.extend(await _missing_in(collection_name))
+    return failed
+
+
+async def missing_indexes() -> List[str]:
+    """Names ("Collection.index") of registered indexes that do not exist yet."""
+    missing = []
+    for collection_name in INDEXES:
+        missing.extend(await _missing_in(collection_name))
+    return missing
+
+
+async def _main(check: bool) -> int:
+    if check:
+        missing = await missing_indexes()
+        for name in missing:
+            print(f"missing index: {name}")
+        return 1 if missing else 0
+    failed = await ensure_indexes()
+    for name in failed:
+        print(f"could not create index: {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or check the MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="Only report missing indexes")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args.check)))
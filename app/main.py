@@ -1,22 +1,69 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.api.endpoints.activity import router as activity_router
 from app.api.endpoints.admin import router as admin_router
+from app.api.endpoints.brand_stats import router as brand_stats_router
 from app.api.endpoints.visit import router as visit_router
-#from app.api.endpoints.auth import router as auth_router
+from app.api.endpoints.auth import router as auth_router
 from app.api.endpoints.consumer import router as consumer_router
 from app.api.endpoints.offer import router as offer_router
 from app.api.endpoints.store import router as store_router
 from app.api.endpoints.worker import router as worker_router
+from app.core.config import INDEX_MODE, TOKEN_REVOCATION_ENABLED
+from app.db.db import close_database, connect_database
+from app.db.indexes import ensure_indexes, missing_indexes
+from app.services.auth_service import run_revocation_sync, sync_revocations
+from app.services.entity_cache import start_entity_cache, stop_entity_cache
+from app.services.password_service import shutdown_password_pool
+from app.utils.process_pool import shutdown_process_pool
+from app.utils.responses import FastJSONResponse
+from app.utils.uploads import UploadSizeLimitMiddleware
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One client per worker process, created after any fork and warmed before traffic arrives
+    await connect_database()
+    if INDEX_MODE == "ensure":
+        failed = await ensure_indexes()
+        if failed:
+            logger.error("Indexes that could not be created: %s", ", ".join(failed))
+    elif INDEX_MODE == "check":
+        missing = await missing_indexes()
+        if missing:
+            logger.warning("Missing indexes: %s", ", ".join(missing))
+    await start_entity_cache()
+
+    stopping = asyncio.Event()
+    tasks = []
+    if TOKEN_REVOCATION_ENABLED:
+        # Logouts and deleted accounts recorded by the other workers
+        await sync_revocations()
+        tasks.append(asyncio.create_task(run_revocation_sync(stopping)))
+    yield
+    stopping.set()
+    await asyncio.gather(*tasks)
+    await stop_entity_cache()
+    shutdown_process_pool()
+    shutdown_password_pool()
+    close_database()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(UploadSizeLimitMiddleware)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Organizer App API!"}
 
 # Include all routers with appropriate prefixes and tags
+app.include_router(activity_router, prefix="/activities", tags=["Activities"])
 app.include_router(admin_router, prefix="/admins", tags=["Admins"])
+app.include_router(brand_stats_router, prefix="/brand-stats", tags=["Brand statistics"])
 app.include_router(visit_router, prefix="/visits", tags=["Visits"])
-#app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
+app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(consumer_router, prefix="/consumers", tags=["Consumers"])
 app.include_router(offer_router, prefix="/offers", tags=["Offers"])
 app.include_router(store_router, prefix="/stores", tags=["Stores"])
@@ -14,13 +14,13 @@ class ActivityCreate(ActivityBase):
     pass
 
 class ActivityRead(ActivityBase):
-    pass
+    id: str
 
 class ActivityUpdate(BaseModel):
-    name: Optional[str] 
-    total_pics: Optional[int] 
-    consumer: Optional[str]  
-    store: Optional[str]    
-    gained_points: Optional[int] 
-    brand_detected: Optional[Dict[str,int]]
-    is_complete: Optional[bool]
+    name: Optional[str] = None
+    total_pics: Optional[int] = None
+    consumer: Optional[str] = None
+    store: Optional[str] = None
+    gained_points: Optional[int] = None
+    brand_detected: Optional[Dict[str,int]] = None
+    is_complete: Optional[bool] = None
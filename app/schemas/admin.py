@@ -12,13 +12,14 @@ class AdminCreate(AdminBase):
     pass
 
 class AdminUpdate(AdminBase):
-    full_name: Optional[str]  
-    phone: Optional[str] 
-    email: Optional[EmailStr ] 
-    password: Optional[str] 
-    profile_image: Optional[str] 
+    full_name: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[EmailStr ] = None
+    password: Optional[str] = None
+    profile_image: Optional[str] = None
 
 class AdminRead(BaseModel):
+    id: str
     full_name: str 
     phone: str 
     email: EmailStr 
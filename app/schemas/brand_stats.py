@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class BrandRollupRead(BaseModel):
+    store: str
+    day: datetime
+    brand: str
+    count: int
+
+class BrandShareRead(BaseModel):
+    brand: str
+    count: int
+    share: float
@@ -12,14 +12,14 @@ class ConsumerCreate(ConsumerBase):
      pass
 
 class ConsumerUpdate(ConsumerBase):
-    full_name: Optional[str]  
-    phone: Optional[str] 
-    email: Optional[EmailStr ] 
-    password: Optional[str] 
-    total_points: Optional[int] 
+    full_name: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[EmailStr ] = None
+    password: Optional[str] = None
 
 
 class ConsumerRead(BaseModel):
+    id: str
     full_name: str 
     phone: str 
     email: EmailStr 
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from bson import ObjectId
+from typing import List, Optional
 
 class OfferBase(BaseModel):
     points_required: int
@@ -11,3 +12,12 @@ class OfferCreate(OfferBase):
 class OfferRead(OfferBase):
     id: str
 
+class OfferUpdate(BaseModel):
+    points_required: Optional[int] = None
+    description: Optional[str] = None
+
+class OfferQRSheetRequest(BaseModel):
+    offer_ids: List[str]
+    layout: str = "zip"
+    image_format: str = "png"
+    columns: int = 4
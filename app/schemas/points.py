@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class LedgerEntryRead(BaseModel):
+    id: str
+    amount: int
+    reason: str
+    ref: Optional[str] = None
+    status: str
+    created_at: datetime
+    applied_at: Optional[datetime] = None
@@ -13,11 +13,11 @@ class StoreCreate(StoreBase):
     pass
 
 class StoreRead(StoreBase):
-    pass
+    id: str
 
 class StoreUpdate(BaseModel):
-    name: Optional[str]
-    opening_time: Optional[datetime] 
-    closing_time: Optional[datetime] 
-    location: Optional[str]
-    phone: Optional[str]
+    name: Optional[str] = None
+    opening_time: Optional[datetime] = None
+    closing_time: Optional[datetime] = None
+    location: Optional[str] = None
+    phone: Optional[str] = None
@@ -16,11 +16,11 @@ class VisitCreate(VisitBase):
     pass
 
 class VisitRead(VisitBase):
-    pass
+    id: str
 
 class VisitUpdate(BaseModel):
-    name: Optional[str] 
-    total_pics: Optional[int] 
-    consumer: Optional[str]  
-    store: Optional[str]    
-    is_complete: Optional[bool] 
+    name: Optional[str] = None
+    total_pics: Optional[int] = None
+    consumer: Optional[str] = None
+    store: Optional[str] = None
+    is_complete: Optional[bool] = None
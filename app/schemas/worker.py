@@ -12,13 +12,14 @@ class WorkerCreate(WorkerBase):
     pass
 
 class WorkerUpdate(WorkerBase):
-    full_name: Optional[str]  
-    phone: Optional[str] 
-    email: Optional[EmailStr ] 
-    password: Optional[str] 
-    profile_image: Optional[str] 
+    full_name: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[EmailStr ] = None
+    password: Optional[str] = None
+    profile_image: Optional[str] = None
 
 class WorkerRead(BaseModel):
+    id: str
     full_name: str 
     phone: str 
     email: EmailStr 
@@ -1,81 +1,186 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
+import asyncio
 import jwt
-from motor.motor_asyncio import AsyncIOMotorDatabase
+import logging
+import time
+import uuid
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
-from functools import wraps
+from typing import Dict, Iterable, Optional
 
-SECRET_KEY = "your_secret_key"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+from pymongo import UpdateOne
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncIOMotorDatabase = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except jwt.InvalidTokenError:
-        raise credentials_exception
+from app.core.config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, TOKEN_CACHE_SIZE, TOKEN_REVOCATION_ENABLED,
+    TOKEN_REVOCATION_POLL_INTERVAL,
+)
+from app.db.db import RevokedToken
+from app.services.identity_service import find_identity, store_password_hash
+from app.services.password_service import verify_password
+from app.utils.cache import TTLCache
 
-    # Search in all collections
-    user = await db["admins"].find_one({"email": email}) or \
-           await db["consumers"].find_one({"email": email}) or \
-           await db["workers"].find_one({"email": email})
-
-    if not user:
-        raise credentials_exception
+logger = logging.getLogger(__name__)
 
-    return user
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# token -> decoded claims, each entry expiring with its token
+_token_cache = TTLCache(TOKEN_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# jti -> exp of tokens revoked by logout
+_revoked_tokens: Dict[str, float] = {}
+# user id -> time after which none of its earlier tokens are accepted
+_revoked_subjects: Dict[str, float] = {}
+
+# Revocations are also recorded in the RevokedToken collection, which every
+# process polls (see run_revocation_sync), so a logout handled by one worker
+# reaches the others within TOKEN_REVOCATION_POLL_INTERVAL. Each poll loads
+# what was recorded since the newest record seen, minus an overlap for
+# writes that became visible out of order.
+_KINDS = {"token": _revoked_tokens, "subject": _revoked_subjects}
+_SYNC_OVERLAP = timedelta(seconds=30)
+_synced_until: Optional[datetime] = None
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    """Sign `data` (sub = user id, email, role) together with iat, exp and a unique jti."""
+    to_encode = data.copy()
+    now = datetime.utcnow()
+    to_encode.update({
+        "iat": now,
+        "exp": now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)),
+        "jti": uuid.uuid4().hex,
+    })
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def _prune(revoked: Dict[str, float], now: float):
+    for key in [key for key, until in revoked.items() if until <= now]:
+        del revoked[key]
+
+def _merge(kind: str, key: str, at: float):
+    revoked = _KINDS[kind]
+    revoked[key] = max(at, revoked.get(key, at))
+
+async def _record(kind: str, entries: Iterable[tuple]):
+    """Store (key, at, expires) revocations for the other processes."""
+    await RevokedToken.bulk_write([
+        UpdateOne(
+            {"_id": f"{kind}:{key}"},
+            {"$set": {"kind": kind, "key": key, "at": at, "expires": expires}, "$currentDate": {"created_at": True}},
+            upsert=True,
+        )
+        for key, at, expires in entries
+    ], ordered=False)
+
+async def revoke_token(claims: dict):
+    """Reject this token from now on (until it would have expired anyway), in every process."""
+    now = time.time()
+    _prune(_revoked_tokens, now)
+    _merge("token", claims["jti"], claims["exp"])
+    await _record("token", [(claims["jti"], claims["exp"], datetime.utcfromtimestamp(claims["exp"]))])
+
+async def revoke_subject(*user_ids: str):
+    """Reject every token issued so far to these users, e.g. when their accounts are deleted."""
+    if not user_ids:
+        return
+    now = time.time()
+    lifetime = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    _prune(_revoked_subjects, now - lifetime)
+    for user_id in user_ids:
+        _merge("subject", user_id, now)
+    expires = datetime.utcfromtimestamp(now + lifetime)
+    await _record("subject", [(user_id, now, expires) for user_id in user_ids])
+
+async def sync_revocations():
+    """Load the revocations other processes recorded since the last call."""
+    global _synced_until
+    if _synced_until is None:
+        query = {"expires": {"$gt": datetime.utcnow()}}
+    else:
+        query = {"created_at": {"$gte": _synced_until - _SYNC_OVERLAP}}
+    async for doc in RevokedToken.find(query, {"kind": 1, "key": 1, "at": 1, "created_at": 1}):
+        if doc.get("kind") in _KINDS:
+            _merge(doc["kind"], doc["key"], doc["at"])
+        if _synced_until is None or doc["created_at"] > _synced_until:
+            _synced_until = doc["created_at"]
+    now = time.time()
+    _prune(_revoked_tokens, now)
+    _prune(_revoked_subjects, now - ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+async def run_revocation_sync(stopping: asyncio.Event, interval: float = TOKEN_REVOCATION_POLL_INTERVAL):
+    """Poll for revocations every `interval` seconds until `stopping` is set."""
+    while not stopping.is_set():
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        if stopping.is_set():
+            break
+        try:
+            await sync_revocations()
+        except Exception:
+            logger.exception("Loading token revocations failed")
+
+def _is_revoked(claims: dict) -> bool:
+    if claims["jti"] in _revoked_tokens:
+        return True
+    revoked_at = _revoked_subjects.get(claims["user_id"])
+    return revoked_at is not None and claims["iat"] <= revoked_at
+
+def decode_token(token: str) -> dict:
+    """
+    Verify `token` and return its claims without touching the database.
+    Raises jwt.InvalidTokenError for bad, expired or revoked tokens.
+    """
+    claims = _token_cache.get(token)
+    if claims is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp", "iat", "jti", "sub"]})
+        if "role" not in payload:
+            raise jwt.InvalidTokenError("Token carries no role")
+        claims = {
+            "user_id": payload["sub"],
+            "email": payload.get("email"),
+            "role": payload["role"],
+            "jti": payload["jti"],
+            "iat": payload["iat"],
+            "exp": payload["exp"],
+        }
+        _token_cache.set(token, claims, ttl=claims["exp"] - time.time())
+    if TOKEN_REVOCATION_ENABLED and _is_revoked(claims):
+        raise jwt.InvalidTokenError("Token has been revoked")
+    return claims
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """The signed claims of the bearer token: user_id, email and role."""
+    try:
+        return decode_token(token)
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=401,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
 
 def role_required(allowed_roles: list):
     """
-    Decorator to enforce role-based access control.
+    Dependency enforcing role-based access control from the token's role claim.
     :param allowed_roles: List of allowed roles ('admin', 'consumer', 'worker').
     """
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, current_user=Depends(get_current_user), **kwargs):
-            # Infer role from collection name
-            if "total_points" in current_user:
-                role = "consumer"
-            elif "profile_image" in current_user:
-                role = "worker" if "workers" in current_user else "admin"
-            else:
-                raise HTTPException(status_code=500, detail="Role could not be determined")
-
-            if role not in allowed_roles:
-                raise HTTPException(status_code=403, detail="Access forbidden: insufficient permissions")
-
-            return await func(*args, **kwargs)
-        return wrapper
-    return decorator
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    async def checker(current_user: dict = Depends(get_current_user)):
+        if current_user["role"] not in allowed_roles:
+            raise HTTPException(status_code=403, detail="Access forbidden: insufficient permissions")
+        return current_user
+    return checker
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
 
-async def authenticate_user(db: AsyncIOMotorDatabase, email: str, password: str):
-    user = await db["admins"].find_one({"email": email}) or \
-           await db["consumers"].find_one({"email": email}) or \
-           await db["workers"].find_one({"email": email})
+async def authenticate_user(email: str, password: str):
+    user = await find_identity(email)
+    if not user:
+        return None
 
-    if not user or not verify_password(password, user["password"]):
+    matches, new_hash = await verify_password(password, user.get("password"))
+    if not matches:
         return None
+    if new_hash:
+        # Legacy bcrypt (or outdated cost) hash: store the upgraded one now that we know the password
+        await store_password_hash(user["role"], user["user_id"], new_hash)
+        user["password"] = new_hash
     return user
-
-
@@ -0,0 +1,29 @@
+import importlib
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+from app.core.config import AI_DETECTOR
+
+
+class BrandDetector(ABC):
+    """Interface of the brand detection model used by the AI worker."""
+
+    @abstractmethod
+    async def detect(self, image_paths: List[str]) -> List[Dict[str, int]]:
+        """Return the brand counts found in each image, in the same order as `image_paths`."""
+
+
+class StubBrandDetector(BrandDetector):
+    """Local stand-in for the real model, used in development and tests."""
+
+    def __init__(self, result: Dict[str, int] = None):
+        self.result = result or {"BrandA": 5, "BrandB": 2}  # Example response from AI
+
+    async def detect(self, image_paths: List[str]) -> List[Dict[str, int]]:
+        return [dict(self.result) for _ in image_paths]
+
+
+def load_detector(path: str = AI_DETECTOR) -> BrandDetector:
+    """Instantiate the detector class named by a dotted path such as "package.module.Class"."""
+    module_name, class_name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)()
@@ -0,0 +1,105 @@
+"""
+Per store, day and brand counts of detected products, kept in the BrandRollup
+collection so dashboards never have to scan Visit and Activity.
+
+    python -m app.services.brand_rollup --rebuild
+
+recomputes the whole collection from brand_detected, e.g. after a failed flush.
+"""
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.db.db import Activity, BrandRollup, Visit, database
+from app.db.indexes import INDEXES
+
+RollupKey = Tuple[str, datetime, str]
+# (store, day, brand), id of the job that detected it, count
+RollupIncrement = Tuple[RollupKey, ObjectId, int]
+
+REBUILD_COLLECTION = "BrandRollup_rebuild"
+REBUILD_BATCH_SIZE = 1000
+
+
+def day_of(moment: datetime) -> datetime:
+    """Midnight of the day `moment` falls on, the granularity of the rollup."""
+    return datetime(moment.year, moment.month, moment.day)
+
+
+async def record_brand_counts(increments: Iterable[RollupIncrement]):
+    """
+    Add the counts of each job to the rollup in one bulk write. A rollup
+    document lists the jobs it already counts, so replaying a job adds
+    nothing: its update matches no document and the upsert collides with the
+    unique (store, day, brand) index.
+    """
+    operations = [
+        UpdateOne(
+            {"store": store, "day": day, "brand": brand, "jobs": {"$ne": job_id}},
+            {"$inc": {"count": count}, "$addToSet": {"jobs": job_id}},
+            upsert=True,
+        )
+        for (store, day, brand), job_id, count in increments
+        if count
+    ]
+    if not operations:
+        return
+    try:
+        await BrandRollup.bulk_write(operations, ordered=False)
+    except BulkWriteError as exc:
+        if any(error["code"] != 11000 for error in exc.details.get("writeErrors", [])):
+            raise
+
+
+async def rebuild_rollups():
+    """
+    Recompute every rollup document from the brand counts and processed jobs
+    stored on visits and activities. The result is written to a scratch
+    collection and renamed over BrandRollup, so readers never see it half
+    built. Counts ingested while the rebuild reads are only kept if the read
+    saw their visit or activity; rebuild while ingest is quiet.
+    """
+    counts: Counter = Counter()
+    jobs: Dict[RollupKey, set] = defaultdict(set)
+    pipeline = [
+        {"$match": {"brand_detected": {"$type": "object"}, "store": {"$exists": True}, "day": {"$type": "date"}}},
+        {"$project": {"store": 1, "day": 1, "processed_jobs": 1, "brands": {"$objectToArray": "$brand_detected"}}},
+        {"$unwind": "$brands"},
+        {"$group": {
+            "_id": {"store": "$store", "day": {"$dateTrunc": {"date": "$day", "unit": "day"}}, "brand": "$brands.k"},
+            "count": {"$sum": "$brands.v"},
+            "jobs": {"$push": "$processed_jobs"},
+        }},
+    ]
+    for collection in (Visit, Activity):
+        async for row in collection.aggregate(pipeline):
+            key = (row["_id"]["store"], row["_id"]["day"], row["_id"]["brand"])
+            counts[key] += row["count"]
+            for processed in row["jobs"]:
+                jobs[key].update(processed or ())
+
+    scratch = database[REBUILD_COLLECTION]
+    await scratch.drop()
+    await scratch.create_indexes(INDEXES["BrandRollup"])
+    documents = [
+        {"store": store, "day": day, "brand": brand, "count": count, "jobs": sorted(jobs[(store, day, brand)])}
+        for (store, day, brand), count in counts.items()
+        if count
+    ]
+    for start in range(0, len(documents), REBUILD_BATCH_SIZE):
+        await scratch.insert_many(documents[start:start + REBUILD_BATCH_SIZE], ordered=False)
+    await scratch.rename(BrandRollup.name, dropTarget=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the brand rollup collection")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all rollups from visits and activities")
+    args = parser.parse_args()
+    if args.rebuild:
+        asyncio.run(rebuild_rollups())
@@ -0,0 +1,120 @@
+"""
+Read-through cache of single documents fetched by id, e.g. the store or
+worker a mobile app re-fetches dozens of times per session.
+
+Entries live for ENTITY_CACHE_TTL seconds at most and the least recently used
+ones are evicted once ENTITY_CACHE_MAX_BYTES (BSON size) is reached. Every
+write path calls invalidate(), which drops the entries locally and publishes
+the ids through the configured InvalidationBackend so other processes drop
+them too. With the default local backend, other workers rely on the TTL.
+"""
+import importlib
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import bson
+from bson import ObjectId
+
+from app.core.config import ENTITY_CACHE_BACKEND, ENTITY_CACHE_MAX_BYTES, ENTITY_CACHE_TTL
+from app.utils.cache import SizedTTLCache
+
+logger = logging.getLogger(__name__)
+
+OnInvalidate = Callable[[str, List[str]], None]
+
+
+class InvalidationBackend(ABC):
+    """Interface carrying cache invalidations between processes."""
+
+    async def start(self, on_invalidate: OnInvalidate):
+        """Begin calling `on_invalidate(collection, ids)` for invalidations published elsewhere."""
+
+    @abstractmethod
+    async def publish(self, collection: str, ids: List[str]):
+        """Tell the other processes to drop these documents of `collection`."""
+
+    async def stop(self):
+        pass
+
+
+class LocalInvalidationBackend(InvalidationBackend):
+    """Stand-in for a shared backend: nothing to notify beyond this process."""
+
+    async def publish(self, collection: str, ids: List[str]):
+        pass
+
+
+def load_invalidation_backend(path: str = ENTITY_CACHE_BACKEND) -> InvalidationBackend:
+    """Instantiate the backend class named by a dotted path such as "package.module.Class"."""
+    module_name, class_name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+_cache = SizedTTLCache(ENTITY_CACHE_MAX_BYTES, ENTITY_CACHE_TTL, sizeof=lambda doc: len(bson.encode(doc)))
+_backend: InvalidationBackend = LocalInvalidationBackend()
+
+
+def _evict(collection_name: str, ids: Iterable[str]):
+    for doc_id in ids:
+        _cache.delete((collection_name, doc_id))
+
+
+async def start_entity_cache():
+    """Connect the configured backend so invalidations from other processes are applied here."""
+    global _backend
+    _backend = load_invalidation_backend()
+    await _backend.start(_evict)
+
+
+async def stop_entity_cache():
+    await _backend.stop()
+    _cache.clear()
+
+
+async def find_by_id(collection, doc_id: str, hidden: Sequence[str] = ()) -> Optional[dict]:
+    """
+    The document with `doc_id`, without the `hidden` fields, from the cache
+    or from MongoDB. Returns a copy the caller may modify.
+    """
+    key = (collection.name, doc_id)
+    doc = _cache.get(key)
+    if doc is None:
+        doc = await collection.find_one({"_id": ObjectId(doc_id)}, {name: 0 for name in hidden} or None)
+        if doc is None:
+            return None
+        _cache.set(key, doc)
+    return dict(doc)
+
+
+async def find_many_by_id(collection, doc_ids: Iterable[str], hidden: Sequence[str] = ()) -> Dict[str, dict]:
+    """
+    id -> copy of the document for every id that exists, like find_by_id but
+    with one $in query for all the ids that are not cached.
+    """
+    found, missing = {}, []
+    for doc_id in dict.fromkeys(doc_ids):
+        doc = _cache.get((collection.name, doc_id))
+        if doc is None:
+            missing.append(doc_id)
+        else:
+            found[doc_id] = dict(doc)
+    if missing:
+        query = {"_id": {"$in": [ObjectId(doc_id) for doc_id in missing]}}
+        async for doc in collection.find(query, {name: 0 for name in hidden} or None):
+            doc_id = str(doc["_id"])
+            _cache.set((collection.name, doc_id), doc)
+            found[doc_id] = dict(doc)
+    return found
+
+
+async def invalidate(collection, *doc_ids):
+    """Forget cached copies of these documents here and in every other process."""
+    ids = [str(doc_id) for doc_id in doc_ids]
+    if not ids:
+        return
+    _evict(collection.name, ids)
+    try:
+        await _backend.publish(collection.name, ids)
+    except Exception:
+        logger.exception("Publishing cache invalidation for %s failed", collection.name)
@@ -0,0 +1,89 @@
+"""
+`?expand=store,worker` on visit and activity reads: the referenced ids in the
+response are replaced by the documents they point to (null when the
+reference is dangling).
+
+The references of a whole page are resolved together, with one $in query per
+referenced collection for the ids that are not in the entity cache, and an
+Expansion remembers what it resolved for the rest of its request. A list of
+50 visits therefore costs at most two extra queries instead of 100 requests.
+Expanded responses are not tagged: their content also depends on other
+collections, so neither the version nor the list ETag describes it.
+"""
+from typing import Dict, List, Optional, Sequence
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.db.db import Consumer, Store, Worker
+from app.schemas.consumer import ConsumerRead
+from app.schemas.store import StoreRead
+from app.schemas.worker import WorkerRead
+from app.services.entity_cache import find_many_by_id
+from app.utils.fields import FieldSelection, select_fields
+from app.utils.responses import FastJSONResponse
+
+EXPAND_DESCRIPTION = "Comma-separated references to embed, e.g. 'store,worker'"
+
+# reference field -> (collection, *Read schema, fields that never leave the database)
+REFERENCES = {
+    "store": (Store, StoreRead, ()),
+    "worker": (Worker, WorkerRead, ("password",)),
+    "consumer": (Consumer, ConsumerRead, ("password",)),
+}
+
+
+class Expansion:
+    def __init__(self, names: Sequence[str]):
+        self.names = tuple(names)
+        self._resolved: Dict[str, Dict[str, Optional[dict]]] = {name: {} for name in self.names}
+
+    def __bool__(self):
+        return bool(self.names)
+
+    async def _resolve(self, name: str, ids: List[str]):
+        collection, model, hidden = REFERENCES[name]
+        resolved = self._resolved[name]
+        missing = [ref for ref in dict.fromkeys(ids) if ref not in resolved]
+        if not missing:
+            return
+        valid = [ref for ref in missing if ObjectId.is_valid(ref)]
+        docs = await find_many_by_id(collection, valid, hidden) if valid else {}
+        selection = select_fields(model, None, hidden)
+        for ref in missing:
+            doc = docs.get(ref)
+            resolved[ref] = selection.build(doc) if doc is not None else None
+
+    async def apply(self, items: List[dict]) -> List[dict]:
+        """Replace the references of built response dicts in place."""
+        for name in self.names:
+            refs = [item[name] for item in items if isinstance(item.get(name), str)]
+            await self._resolve(name, refs)
+            for item in items:
+                if name in item:
+                    item[name] = self._resolved[name].get(item[name]) if isinstance(item[name], str) else None
+        return items
+
+    async def one(self, selected: FieldSelection, doc: dict) -> FastJSONResponse:
+        return selected.respond((await self.apply([selected.build(doc)]))[0])
+
+    async def many(self, selected: FieldSelection, docs: List[dict]) -> FastJSONResponse:
+        return selected.respond(await self.apply([selected.build(doc) for doc in docs]))
+
+    async def page(self, selected: FieldSelection, docs: List[dict], next_cursor: Optional[str]) -> FastJSONResponse:
+        items = await self.apply([selected.build(doc) for doc in docs])
+        return selected.respond({"items": items, "next": next_cursor})
+
+
+def select_expansion(expand: Optional[str], allowed: Sequence[str]) -> Expansion:
+    """Parse an `expand` query value against the reference fields `allowed` for the resource."""
+    if not expand or not expand.strip():
+        return Expansion(())
+    names = []
+    for name in (part.strip() for part in expand.split(",")):
+        if not name or name in names:
+            continue
+        if name not in allowed:
+            raise HTTPException(status_code=400, detail=f"Cannot expand '{name}'")
+        names.append(name)
+    return Expansion(names)
@@ -0,0 +1,171 @@
+"""
+One Identity document per account, keyed by a unique email, holding the role,
+the id of the Admin/Consumer/Worker profile and the password hash. Every auth
+path resolves an email with a single indexed lookup here.
+
+    python -m app.services.identity_service --rebuild
+
+backfills the collection from existing profiles.
+"""
+import argparse
+import asyncio
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.db.db import Admin, Consumer, Identity, Worker
+from app.schemas.bulk import BulkItemResult
+from app.services.entity_cache import invalidate
+from app.utils.bulk import ERROR, DELETED, batches, bulk_delete, bulk_insert, bulk_update, succeeded_ids, write_error_detail
+from app.utils.versioning import stamp, update_by_id
+
+ROLE_COLLECTIONS = {"admin": Admin, "consumer": Consumer, "worker": Worker}
+
+
+async def find_identity(email: str) -> Optional[dict]:
+    return await Identity.find_one({"email": email})
+
+
+async def register_identity(role: str, user_id: ObjectId, email: str, password_hash: str):
+    """Claim `email` for a new account; raises DuplicateKeyError if any role already uses it."""
+    await Identity.insert_one({
+        "email": email,
+        "role": role,
+        "user_id": str(user_id),
+        "password": password_hash,
+    })
+
+
+async def update_identity(role: str, user_id: str, update_data: dict) -> bool:
+    """
+    Mirror email/password changes of a profile; raises DuplicateKeyError when
+    the new email belongs to another account. Returns False if nothing matched.
+    """
+    changes = {key: update_data[key] for key in ("email", "password") if key in update_data}
+    if not changes:
+        return True
+    result = await Identity.update_one({"role": role, "user_id": user_id}, {"$set": changes})
+    return result.matched_count == 1
+
+
+async def store_password_hash(role: str, user_id: str, password_hash: str):
+    """Replace the hash on both the identity and the profile, e.g. after a rehash on login."""
+    await Identity.update_one({"role": role, "user_id": user_id}, {"$set": {"password": password_hash}})
+    collection = ROLE_COLLECTIONS[role]
+    result = await collection.update_one({"_id": ObjectId(user_id)}, stamp({"$set": {"password": password_hash}}))
+    if result.modified_count:
+        await invalidate(collection, user_id)
+
+
+async def update_profile(role: str, user_id: str, update_data: dict, if_match: Optional[str] = None) -> Optional[dict]:
+    """
+    Update a profile (without returning its password) and mirror email/password
+    changes onto its identity. Raises DuplicateKeyError when the new email
+    belongs to another account and HTTP 412 when If-Match names another
+    version; returns None when the profile does not exist.
+    """
+    await update_identity(role, user_id, update_data)
+    try:
+        return await update_by_id(ROLE_COLLECTIONS[role], user_id, update_data, if_match, {"password": 0})
+    except HTTPException:
+        # The profile kept its old email/password, so the identity must too
+        current = await ROLE_COLLECTIONS[role].find_one({"_id": ObjectId(user_id)}, {"email": 1, "password": 1})
+        if current:
+            await update_identity(role, user_id, current)
+        raise
+
+
+async def remove_identity(role: str, user_id: str):
+    await Identity.delete_one({"role": role, "user_id": user_id})
+
+
+def _email_taken(error: dict) -> str:
+    return "Email already registered" if error.get("code") == 11000 else write_error_detail(error)
+
+
+async def bulk_create_profiles(role: str, docs: List[Tuple[int, dict]]) -> List[BulkItemResult]:
+    """
+    Bulk version of the create flow: claim every email in the identity
+    collection, insert the profiles that got one, and release the identities
+    of profiles that failed to insert. Passwords must already be hashed.
+    """
+    failed = {}
+    for batch in batches(docs):
+        for _, doc in batch:
+            doc["_id"] = ObjectId()
+        try:
+            await Identity.insert_many(
+                [{"email": doc["email"], "role": role, "user_id": str(doc["_id"]), "password": doc["password"]} for _, doc in batch],
+                ordered=False,
+            )
+        except BulkWriteError as exc:
+            failed.update({batch[error["index"]][0]: _email_taken(error) for error in exc.details.get("writeErrors", [])})
+
+    results = [BulkItemResult(index=index, status=ERROR, detail=detail) for index, detail in failed.items()]
+    inserted = await bulk_insert(ROLE_COLLECTIONS[role], [(index, doc) for index, doc in docs if index not in failed])
+    rolled_back = succeeded_ids(inserted, ERROR)
+    if rolled_back:
+        await Identity.delete_many({"role": role, "user_id": {"$in": rolled_back}})
+    for item in inserted:
+        if item.status == ERROR and item.detail == "Duplicate key":
+            item.detail = "Email already registered"
+    return results + inserted
+
+
+async def bulk_update_profiles(role: str, updates: List[Tuple[int, str, dict]]) -> List[BulkItemResult]:
+    """Mirror email/password changes onto the identities, then update the profiles whose identity accepted them."""
+    failed = {}
+    for batch in batches(updates):
+        changes = [
+            (index, user_id, {key: data[key] for key in ("email", "password") if key in data})
+            for index, user_id, data in batch
+        ]
+        changes = [change for change in changes if change[2]]
+        if not changes:
+            continue
+        try:
+            await Identity.bulk_write(
+                [UpdateOne({"role": role, "user_id": user_id}, {"$set": data}) for _, user_id, data in changes], ordered=False,
+            )
+        except BulkWriteError as exc:
+            failed.update({changes[error["index"]][0]: _email_taken(error) for error in exc.details.get("writeErrors", [])})
+
+    results = [
+        BulkItemResult(index=index, id=user_id, status=ERROR, detail=failed[index])
+        for index, user_id, _ in updates if index in failed
+    ]
+    return results + await bulk_update(ROLE_COLLECTIONS[role], [update for update in updates if update[0] not in failed])
+
+
+async def bulk_delete_profiles(role: str, ids: List[Tuple[int, str]]) -> List[BulkItemResult]:
+    results = await bulk_delete(ROLE_COLLECTIONS[role], ids)
+    deleted = succeeded_ids(results, DELETED)
+    if deleted:
+        await Identity.delete_many({"role": role, "user_id": {"$in": deleted}})
+    return results
+
+
+async def rebuild_identities():
+    """Upsert an identity for every existing profile, e.g. after restoring a backup."""
+    for role, collection in ROLE_COLLECTIONS.items():
+        operations = [
+            UpdateOne(
+                {"email": user["email"]},
+                {"$set": {"role": role, "user_id": str(user["_id"]), "password": user.get("password")}},
+                upsert=True,
+            )
+            async for user in collection.find({}, {"email": 1, "password": 1})
+        ]
+        if operations:
+            await Identity.bulk_write(operations, ordered=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the identity collection")
+    parser.add_argument("--rebuild", action="store_true", help="Backfill identities from admins, consumers and workers")
+    args = parser.parse_args()
+    if args.rebuild:
+        asyncio.run(rebuild_identities())
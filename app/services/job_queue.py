@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.core.config import JOB_VISIBILITY_TIMEOUT, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_DELAY, JOB_RETRY_MAX_DELAY
+from app.db.db import Job
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+async def enqueue_job(kind: str, target_id: str, image_path: str) -> str:
+    """Queue one image of a visit or activity for brand detection."""
+    now = datetime.utcnow()
+    result = await Job.insert_one({
+        "kind": kind,
+        "target_id": target_id,
+        "image_path": image_path,
+        "status": PENDING,
+        "attempts": 0,
+        "run_at": now,
+        "created_at": now,
+    })
+    return str(result.inserted_id)
+
+
+async def claim_job(worker_id: str) -> Optional[dict]:
+    """
+    Atomically take the oldest runnable job: a pending job that is due, or a
+    running job whose lease has expired because its worker died.
+    """
+    now = datetime.utcnow()
+    return await Job.find_one_and_update(
+        {"$or": [
+            {"status": PENDING, "run_at": {"$lte": now}},
+            {"status": RUNNING, "lease_expires": {"$lte": now}},
+        ]},
+        {
+            "$set": {
+                "status": RUNNING,
+                "worker": worker_id,
+                "lease_expires": now + timedelta(seconds=JOB_VISIBILITY_TIMEOUT),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("run_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def claim_jobs(worker_id: str, limit: int) -> List[dict]:
+    """Claim up to `limit` jobs so they can be sent to the model in one batch."""
+    jobs = []
+    while len(jobs) < limit:
+        job = await claim_job(worker_id)
+        if job is None:
+            break
+        if job["attempts"] > JOB_MAX_ATTEMPTS:
+            # Its lease kept expiring, so the worker most likely crashes on it
+            await _finish(job["_id"], worker_id, FAILED, "Lease expired too many times")
+            continue
+        jobs.append(job)
+    return jobs
+
+
+async def _finish(job_id: ObjectId, worker_id: str, status: str, error: Optional[str] = None) -> bool:
+    update = {"status": status, "finished_at": datetime.utcnow()}
+    if error:
+        update["last_error"] = error
+    result = await Job.update_one(
+        {"_id": job_id, "worker": worker_id, "status": RUNNING},
+        {"$set": update, "$unset": {"lease_expires": ""}},
+    )
+    return result.modified_count == 1
+
+
+async def complete_jobs(job_ids: List[ObjectId], worker_id: str) -> int:
+    """Acknowledge jobs this worker still holds; jobs reclaimed by someone else are left alone."""
+    if not job_ids:
+        return 0
+    result = await Job.update_many(
+        {"_id": {"$in": job_ids}, "worker": worker_id, "status": RUNNING},
+        {"$set": {"status": DONE, "finished_at": datetime.utcnow()}, "$unset": {"lease_expires": ""}},
+    )
+    return result.modified_count
+
+
+async def fail_job(job: dict, worker_id: str, error: str):
+    """Schedule a retry with exponential backoff, or give up after JOB_MAX_ATTEMPTS."""
+    if job["attempts"] >= JOB_MAX_ATTEMPTS:
+        await _finish(job["_id"], worker_id, FAILED, error)
+        return
+
+    delay = min(JOB_RETRY_BASE_DELAY * 2 ** (job["attempts"] - 1), JOB_RETRY_MAX_DELAY)
+    await Job.update_one(
+        {"_id": job["_id"], "worker": worker_id, "status": RUNNING},
+        {
+            "$set": {
+                "status": PENDING,
+                "run_at": datetime.utcnow() + timedelta(seconds=delay),
+                "last_error": error,
+            },
+            "$unset": {"lease_expires": "", "worker": ""},
+        },
+    )
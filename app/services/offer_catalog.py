@@ -0,0 +1,59 @@
+import bisect
+import json
+from typing import List, Optional
+
+from app.core.config import OFFER_CACHE_TTL
+from app.db.db import Offer
+from app.utils.cache import TTLCache
+from app.utils.http_cache import make_etag
+from app.utils.versioning import version_etag
+
+# The whole catalog is one small entry; keep it around for OFFER_CACHE_TTL
+# seconds at most so writes made by other processes show up eventually.
+_cache = TTLCache(maxsize=1, ttl=OFFER_CACHE_TTL)
+
+
+def offer_payload(offer: dict) -> dict:
+    return {"id": str(offer["_id"]), "description": offer["description"], "points_required": offer["points_required"]}
+
+
+def _etag(payload) -> str:
+    return make_etag(json.dumps(payload, sort_keys=True).encode("utf-8"))
+
+
+async def _catalog() -> dict:
+    """Every offer, sorted by points_required, plus lookup tables built once per load."""
+    catalog = _cache.get("catalog")
+    if catalog is None:
+        offers = await Offer.find().sort([("points_required", 1), ("_id", 1)]).to_list(None)
+        payloads = [offer_payload(offer) for offer in offers]
+        catalog = {
+            "offers": offers,
+            "payloads": payloads,
+            "points": [offer["points_required"] for offer in offers],
+            "by_id": {payload["id"]: (offer, payload, version_etag(offer)) for offer, payload in zip(offers, payloads)},
+            "etag": _etag(payloads),
+        }
+        _cache.set("catalog", catalog)
+    return catalog
+
+
+async def list_offers():
+    """(offer payloads, ETag of the whole list)."""
+    catalog = await _catalog()
+    return catalog["payloads"], catalog["etag"]
+
+
+async def find_offer(offer_id: str) -> Optional[tuple]:
+    """(raw document, payload, ETag) of one offer, or None."""
+    return (await _catalog())["by_id"].get(offer_id)
+
+
+async def eligible_offers(points: int) -> List[dict]:
+    """Offers redeemable with `points`, cheapest first."""
+    catalog = await _catalog()
+    return catalog["payloads"][:bisect.bisect_right(catalog["points"], points)]
+
+
+def invalidate_offers():
+    _cache.clear()
@@ -0,0 +1,71 @@
+"""
+Password hashing shared by every account type.
+
+Hashing is deliberately slow, so it runs on a small thread pool (argon2-cffi
+and bcrypt release the GIL) instead of the event loop. New hashes use argon2;
+bcrypt hashes still verify and are replaced with argon2 on the next login.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.core.config import (
+    ARGON2_MEMORY_COST, ARGON2_PARALLELISM, ARGON2_TIME_COST, BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS,
+)
+
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated=["bcrypt"],
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+    bcrypt__rounds=BCRYPT_ROUNDS,
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password")
+    return _executor
+
+
+async def _run(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """
+    Hash many passwords, at most PASSWORD_HASH_WORKERS at a time, so that
+    logins submitted meanwhile wait behind one chunk instead of the whole list.
+    """
+    hashes = []
+    for start in range(0, len(passwords), PASSWORD_HASH_WORKERS):
+        hashes.extend(await asyncio.gather(*(hash_password(password) for password in passwords[start:start + PASSWORD_HASH_WORKERS])))
+    return hashes
+
+
+async def verify_password(password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    (matches, replacement hash). The replacement is set when the stored hash
+    uses a deprecated scheme or outdated cost settings and should be saved.
+    """
+    if not hashed_password:
+        return False, None
+    return await _run(pwd_context.verify_and_update, password, hashed_password)
+
+
+def shutdown_password_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,254 @@
+"""
+Append-only ledger of every change to Consumer.total_points.
+
+An entry is inserted as pending under a unique idempotency key, applied with
+one conditional $inc on the consumer that also pushes the entry id onto
+`pending_entries`, and then marked applied. Every step is a single-document
+atomic update: concurrent credits and redemptions never lose updates, a
+redemption can never overdraw (the $inc only matches while total_points
+covers it), and only the one consumer document is ever written. Because the
+id stays on the consumer until reconcile() prunes it, an entry that is
+resumed twice is still applied once.
+
+    python -m app.services.points_ledger --reconcile           finish stale entries, report drift
+    python -m app.services.points_ledger --reconcile --adjust  also record drift as adjustments
+
+The AI workers also reconcile every LEDGER_RECONCILE_INTERVAL seconds,
+taking turns through a lease so only one of them runs it per interval.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.core.config import LEDGER_PENDING_TIMEOUT, LEDGER_RECONCILE_INTERVAL
+from app.db.db import Consumer, Lease, PointsLedger
+from app.services.entity_cache import invalidate
+from app.utils.versioning import stamp
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+APPLIED = "applied"
+REJECTED = "rejected"
+
+RECONCILE_BATCH_SIZE = 500
+RECONCILE_LEASE = "ledger-reconcile"
+
+
+def _new_entry(consumer_id: str, amount: int, key: str, reason: str, ref: Optional[str]) -> dict:
+    return {
+        "_id": ObjectId(),
+        "key": key,
+        "consumer": consumer_id,
+        "amount": amount,
+        "reason": reason,
+        "ref": ref,
+        "status": PENDING,
+        "created_at": datetime.utcnow(),
+    }
+
+
+async def _apply(entry: dict) -> dict:
+    """Move `entry` from pending to applied, or to rejected if the consumer cannot cover it."""
+    consumer_id = ObjectId(entry["consumer"])
+    query = {"_id": consumer_id, "pending_entries": {"$ne": entry["_id"]}}
+    if entry["amount"] < 0:
+        query["total_points"] = {"$gte": -entry["amount"]}
+    result = await Consumer.update_one(query, stamp({
+        "$inc": {"total_points": entry["amount"], "ledger_seq": 1},
+        "$push": {"pending_entries": entry["_id"]},
+    }))
+    status = APPLIED
+    if result.modified_count:
+        await invalidate(Consumer, consumer_id)
+    else:
+        # Either an earlier attempt already applied it, or the balance (or consumer) is not there
+        if not await Consumer.count_documents({"_id": consumer_id, "pending_entries": entry["_id"]}):
+            status = REJECTED
+
+    now = datetime.utcnow()
+    await PointsLedger.update_one({"_id": entry["_id"], "status": PENDING}, {"$set": {"status": status, "applied_at": now}})
+    entry.update(status=status, applied_at=now)
+    return entry
+
+
+async def record_entry(consumer_id: str, amount: int, key: str, reason: str, ref: Optional[str] = None) -> dict:
+    """
+    Credit (amount > 0) or debit (amount < 0) a consumer exactly once per `key`.
+    Replaying a key returns the stored entry; it is still "pending" while
+    another request is applying it.
+    """
+    entry = _new_entry(consumer_id, amount, key, reason, ref)
+    try:
+        await PointsLedger.insert_one(entry)
+    except DuplicateKeyError:
+        return await PointsLedger.find_one({"key": key})
+    return await _apply(entry)
+
+
+async def record_entries(entries: List[dict]) -> int:
+    """
+    Record many credits at once (dicts with consumer, amount, key, reason, ref).
+    Keys that were already recorded are skipped; returns how many were applied.
+    """
+    if not entries:
+        return 0
+    docs = [_new_entry(e["consumer"], e["amount"], e["key"], e["reason"], e.get("ref")) for e in entries]
+    skipped = set()
+    try:
+        await PointsLedger.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if any(error["code"] != 11000 for error in errors):
+            raise
+        skipped = {error["index"] for error in errors}
+    inserted = [doc for index, doc in enumerate(docs) if index not in skipped]
+    results = await asyncio.gather(*(_apply(doc) for doc in inserted))
+    return sum(1 for entry in results if entry["status"] == APPLIED)
+
+
+async def _resume_stale(cutoff: datetime) -> int:
+    """Finish entries whose writer died between inserting and marking them."""
+    resumed = 0
+    async for entry in PointsLedger.find({"status": PENDING, "created_at": {"$lte": cutoff}}):
+        await _apply(entry)
+        resumed += 1
+    return resumed
+
+
+async def _prune_markers(cutoff: datetime):
+    """Drop ids of entries applied before `cutoff` from the consumers' pending_entries."""
+    async for consumer in Consumer.find({"pending_entries": {"$type": "objectId"}}, {"pending_entries": 1}):
+        done = [
+            entry["_id"]
+            async for entry in PointsLedger.find(
+                {"_id": {"$in": consumer["pending_entries"]}, "status": {"$ne": PENDING}, "applied_at": {"$lte": cutoff}},
+                {"_id": 1},
+            )
+        ]
+        if done:
+            await Consumer.update_one({"_id": consumer["_id"]}, {"$pull": {"pending_entries": {"$in": done}}})
+
+
+async def _check_batch(consumers: List[dict], adjust: bool) -> Dict[str, int]:
+    ids = [str(consumer["_id"]) for consumer in consumers]
+    # Order matters: pending entries are counted before applied ones are summed,
+    # so an entry that finishes in between is seen by one of the two queries.
+    busy = set(await PointsLedger.distinct("consumer", {"consumer": {"$in": ids}, "status": PENDING}))
+    sums = {
+        row["_id"]: row["total"]
+        async for row in PointsLedger.aggregate([
+            {"$match": {"consumer": {"$in": ids}, "status": APPLIED}},
+            {"$group": {"_id": "$consumer", "total": {"$sum": "$amount"}}},
+        ])
+    }
+    current = {
+        str(doc["_id"]): doc
+        async for doc in Consumer.find({"_id": {"$in": [c["_id"] for c in consumers]}}, {"total_points": 1, "ledger_seq": 1})
+    }
+
+    drift = {}
+    for before in consumers:
+        consumer_id = str(before["_id"])
+        after = current.get(consumer_id)
+        if consumer_id in busy or after is None:
+            continue
+        if (after.get("total_points"), after.get("ledger_seq")) != (before.get("total_points"), before.get("ledger_seq")):
+            continue  # changed while we were looking; checked again next run
+        difference = (before.get("total_points") or 0) - sums.get(consumer_id, 0)
+        if difference:
+            drift[consumer_id] = difference
+            if adjust:
+                # The balance is what the consumer sees, so the ledger is brought in line with it
+                entry = _new_entry(consumer_id, difference, f"adjust:{consumer_id}:{before.get('ledger_seq')}", "adjustment", None)
+                entry.update(status=APPLIED, applied_at=datetime.utcnow())
+                try:
+                    await PointsLedger.insert_one(entry)
+                except DuplicateKeyError:
+                    pass
+    return drift
+
+
+async def reconcile(adjust: bool = False) -> Dict[str, int]:
+    """
+    Finish stale pending entries, prune applied markers and compare every
+    consumer's total_points with the sum of its applied entries. Returns
+    consumer id -> (balance - ledger) for consumers that disagree; with
+    `adjust`, an adjustment entry is recorded for each of them (e.g. balances
+    from before the ledger existed). Consumers with entries in flight are
+    skipped and picked up by the next run.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=LEDGER_PENDING_TIMEOUT)
+    resumed = await _resume_stale(cutoff)
+    if resumed:
+        logger.warning("Finished %d interrupted ledger entries", resumed)
+    await _prune_markers(cutoff)
+
+    drift: Dict[str, int] = {}
+    batch = []
+    async for consumer in Consumer.find({}, {"total_points": 1, "ledger_seq": 1}).sort("_id", 1):
+        batch.append(consumer)
+        if len(batch) >= RECONCILE_BATCH_SIZE:
+            drift.update(await _check_batch(batch, adjust))
+            batch = []
+    if batch:
+        drift.update(await _check_batch(batch, adjust))
+    if drift:
+        logger.warning("Points ledger disagrees with %d consumer balances", len(drift))
+    return drift
+
+
+async def take_reconcile_turn(holder: str, interval: float = LEDGER_RECONCILE_INTERVAL) -> bool:
+    """
+    Claim the next reconciliation run for `holder` unless another process
+    took one less than `interval` seconds ago.
+    """
+    now = datetime.utcnow()
+    try:
+        # Matches only an expired lease; otherwise the upsert collides with the live one
+        await Lease.update_one(
+            {"_id": RECONCILE_LEASE, "expires": {"$lte": now}},
+            {"$set": {"holder": holder, "expires": now + timedelta(seconds=interval)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def run_reconciliation(stopping: asyncio.Event, holder: str, interval: float = LEDGER_RECONCILE_INTERVAL):
+    """Every `interval` seconds until `stopping` is set, reconcile if it is `holder`'s turn."""
+    while not stopping.is_set():
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        if stopping.is_set():
+            break
+        try:
+            if await take_reconcile_turn(holder, interval):
+                await reconcile()
+        except Exception:
+            logger.exception("Reconciling the points ledger failed")
+
+
+async def _main(adjust: bool) -> int:
+    drift = await reconcile(adjust)
+    for consumer_id, difference in drift.items():
+        print(f"consumer {consumer_id}: balance differs from ledger by {difference:+d}")
+    return 1 if drift and not adjust else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the consumer points ledger")
+    parser.add_argument("--reconcile", action="store_true", help="Finish stale entries and compare balances with the ledger")
+    parser.add_argument("--adjust", action="store_true", help="Record an adjustment entry for every balance that differs")
+    args = parser.parse_args()
+    if args.reconcile:
+        sys.exit(asyncio.run(_main(args.adjust)))
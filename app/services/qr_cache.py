@@ -0,0 +1,44 @@
+import hashlib
+from typing import Tuple
+
+from app.core.config import QR_CACHE_SIZE
+from app.utils.cache import LRUCache
+from app.utils.http_cache import make_etag
+from app.utils.process_pool import run_in_process
+from app.utils.qr_generator import qr_payload, render_qr_png, render_qr_svg
+
+QR_FORMATS = {
+    "png": ("image/png", render_qr_png),
+    "svg": ("image/svg+xml", render_qr_svg),
+}
+
+# (offer id, hash of the encoded text, format) -> (image bytes, ETag)
+_cache = LRUCache(QR_CACHE_SIZE)
+
+
+async def get_offer_qr_image(offer: dict, qr_format: str = "png") -> Tuple[bytes, str]:
+    """
+    Return (image bytes, ETag) of an offer's QR code, rendering it on the
+    process pool only when it is not cached yet. The key includes a hash of
+    the encoded text, so editing an offer never serves a stale image.
+    """
+    payload = qr_payload(str(offer["_id"]), offer["description"], offer["points_required"])
+    key = (str(offer["_id"]), hashlib.sha256(payload.encode("utf-8")).hexdigest(), qr_format)
+    cached = _cache.get(key)
+    if cached is None:
+        image = await run_in_process(QR_FORMATS[qr_format][1], payload)
+        cached = (image, make_etag(image))
+        _cache.set(key, cached)
+    return cached
+
+
+async def prerender_offer_qr(offer: dict):
+    """Warm the cache with every format so the first scan is served from memory."""
+    for qr_format in QR_FORMATS:
+        await get_offer_qr_image(offer, qr_format)
+
+
+def forget_offer_qr(offer_id: str):
+    """Drop every cached image of an offer, e.g. once it is deleted."""
+    for key in [key for key in _cache.keys() if key[0] == offer_id]:
+        _cache.delete(key)
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import INGEST_FLUSH_INTERVAL, INGEST_MAX_PENDING, POINTS_PER_ACTIVITY_IMAGE, POINTS_PER_VISIT_IMAGE
+from app.db.db import Activity, Visit
+from app.services.brand_rollup import RollupIncrement, day_of, record_brand_counts
+from app.services.entity_cache import invalidate
+from app.services.job_queue import complete_jobs, fail_job
+from app.services.points_ledger import record_entries
+from app.utils.versioning import stamp
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = {"visit": Visit, "activity": Activity}
+# Ids of the jobs already applied to a visit or activity
+PROCESSED_JOBS = "processed_jobs"
+
+
+def valid_brand(brand: str) -> bool:
+    """Brand names become field names under brand_detected, so they cannot hold "." or "$"."""
+    return isinstance(brand, str) and bool(brand) and "." not in brand and "$" not in brand
+
+
+class ResultBuffer:
+    """
+    Collects detection results for a short window and writes them with one
+    unordered bulk_write per collection.
+
+    Each image is applied by its own update, which only matches while the job
+    id is missing from the target's `processed_jobs` and adds it in the same
+    write. Jobs are acknowledged after the flush that stored their result, so
+    a crash before a flush loses nothing and a crash (or failed ack) after it
+    counts nothing twice: the leases expire, the images are detected again and
+    the replayed updates match no document. The brand rollup and the points
+    ledger are keyed by job id in the same way. Call close() on shutdown to
+    flush what is still buffered.
+    """
+
+    def __init__(self, worker_id: str, flush_interval: float = INGEST_FLUSH_INTERVAL, max_pending: int = INGEST_MAX_PENDING):
+        self.worker_id = worker_id
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[Tuple[dict, Dict[str, int]]] = []
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def add(self, job: dict, brands: Dict[str, int]):
+        if job["kind"] not in COLLECTIONS or not ObjectId.is_valid(job["target_id"]):
+            await fail_job(job, self.worker_id, f"Invalid target {(job['kind'], job['target_id'])}")
+            return
+
+        invalid = [brand for brand in brands if not valid_brand(brand)]
+        if invalid:
+            # They would turn into nested or operator paths in brand_detected.<brand>
+            logger.warning("Dropping brand names %r detected in job %s", invalid, job["_id"])
+            brands = {brand: count for brand, count in brands.items() if valid_brand(brand)}
+        self._pending.append((job, brands))
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+
+    def _update_for(self, job: dict, brands: Dict[str, int], now: datetime) -> UpdateOne:
+        points = POINTS_PER_VISIT_IMAGE if job["kind"] == "visit" else POINTS_PER_ACTIVITY_IMAGE
+        update = {
+            "$set": {"is_complete": True, "day": now, "time": now},
+            "$inc": {**{f"brand_detected.{brand}": count for brand, count in brands.items()}, "gained_points": points},
+            "$addToSet": {PROCESSED_JOBS: job["_id"]},
+        }
+        return UpdateOne({"_id": ObjectId(job["target_id"]), PROCESSED_JOBS: {"$ne": job["_id"]}}, stamp(update))
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of images stored."""
+        async with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+
+            now = datetime.utcnow()
+            stored, failed = [], []
+            rollup: List[RollupIncrement] = []
+            for kind, collection in COLLECTIONS.items():
+                results = [(job, brands) for job, brands in pending if job["kind"] == kind]
+                if not results:
+                    continue
+                operations = [self._update_for(job, brands, now) for job, brands in results]
+                failed_indexes = set()
+                try:
+                    await collection.bulk_write(operations, ordered=False)
+                except BulkWriteError as exc:
+                    failed_indexes = {error["index"] for error in exc.details.get("writeErrors", [])}
+                except Exception:
+                    logger.exception("Flushing %d %s results failed", len(results), kind)
+                    failed_indexes = set(range(len(results)))
+                written = []
+                for index, (job, brands) in enumerate(results):
+                    if index in failed_indexes:
+                        failed.append(job)
+                    else:
+                        stored.append(job)
+                        written.append((job, brands))
+                await invalidate(collection, *dict.fromkeys(job["target_id"] for job, _ in written))
+                targets = await self._lookup(collection, written)
+                self._count_brands(targets, written, day_of(now), rollup)
+                if kind == "activity":
+                    await self._credit_consumers(targets, written)
+
+            try:
+                await record_brand_counts(rollup)
+            except Exception:
+                logger.exception("Updating the brand rollup failed; rebuild it with app.services.brand_rollup --rebuild")
+
+            await complete_jobs([job["_id"] for job in stored], self.worker_id)
+            for job in failed:
+                await fail_job(job, self.worker_id, "Storing the detection result failed")
+            return len(stored)
+
+    async def _lookup(self, collection, written) -> Dict[str, dict]:
+        """Store and consumer of every visit or activity just written, by id."""
+        if not written:
+            return {}
+        try:
+            return {
+                str(doc["_id"]): doc
+                async for doc in collection.find(
+                    {"_id": {"$in": [ObjectId(job["target_id"]) for job, _ in written]}}, {"store": 1, "consumer": 1},
+                )
+            }
+        except Exception:
+            logger.exception("Looking up stores and consumers of stored results failed")
+            return {}
+
+    def _count_brands(self, targets: Dict[str, dict], written, day: datetime, rollup: List[RollupIncrement]):
+        """Add the brands just written to `rollup`, keyed by the store of each visit or activity and the job."""
+        for job, brands in written:
+            store = targets.get(job["target_id"], {}).get("store")
+            if store is None:
+                continue
+            for brand, count in brands.items():
+                rollup.append(((store, day, brand), job["_id"], count))
+
+    async def _credit_consumers(self, targets: Dict[str, dict], written):
+        """
+        Credit each processed activity image to the consumer's points ledger.
+        The job id is the idempotency key, so a job detected again after a
+        crash is not paid twice.
+        """
+        credits = [
+            {
+                "consumer": consumer,
+                "amount": POINTS_PER_ACTIVITY_IMAGE,
+                "key": f"job:{job['_id']}",
+                "reason": "activity",
+                "ref": job["target_id"],
+            }
+            for job, _ in written
+            if ObjectId.is_valid(consumer := targets.get(job["target_id"], {}).get("consumer"))
+        ]
+        try:
+            await record_entries(credits)
+        except Exception:
+            logger.exception("Crediting points for %d activity images failed", len(credits))
+
+    async def run(self, stopping: asyncio.Event):
+        """Flush every `flush_interval` seconds until `stopping` is set, then flush once more."""
+        while not stopping.is_set():
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flushing detection results failed")
+
+    async def close(self):
+        await self.flush()
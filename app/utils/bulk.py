@@ -0,0 +1,200 @@
+"""
+Helpers behind the routers' /1/bulk endpoints.
+
+Request bodies are a JSON array, or NDJSON (one object per line) when sent
+as application/x-ndjson. Items are validated one by one and written in
+batches of BULK_BATCH_SIZE with unordered insert_many / bulk_write, so a bad
+item only fails itself: every item gets its own BulkItemResult, in input order.
+"""
+import json
+from typing import Any, Iterable, List, Sequence, Tuple, Type
+
+from bson import ObjectId
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import BULK_BATCH_SIZE, BULK_MAX_ITEMS
+from app.schemas.bulk import BulkItemResult, BulkResult
+from app.utils.versioning import stamp, stamp_new
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+NOT_FOUND = "not_found"
+ERROR = "error"
+
+
+def _too_many(max_items: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"At most {max_items} items per request")
+
+
+async def read_items(request: Request, max_items: int = BULK_MAX_ITEMS) -> List[Any]:
+    """Parse the request body as a JSON array or as NDJSON of at most `max_items` items."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        items, buffer, line_number = [], b"", 0
+
+        def parse(line: bytes):
+            nonlocal line_number
+            line_number += 1
+            if not line.strip():
+                return
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON on line {line_number}")
+            if len(items) > max_items:
+                raise _too_many(max_items)
+
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                parse(line)
+        parse(buffer)
+        return items
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if len(items) > max_items:
+        raise _too_many(max_items)
+    return items
+
+
+def batches(items: Sequence, size: int = BULK_BATCH_SIZE) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _validation_detail(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc']) or 'item'}: {error['msg']}" for error in exc.errors())
+
+
+def write_error_detail(error: dict) -> str:
+    return "Duplicate key" if error.get("code") == 11000 else error.get("errmsg", "Write failed")
+
+
+def validate_items(items: List[Any], schema: Type[BaseModel]) -> Tuple[List[Tuple[int, BaseModel]], List[BulkItemResult]]:
+    """(index, model) of the items that match `schema`, and an error result for the rest."""
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.model_validate(item)))
+        except ValidationError as exc:
+            errors.append(BulkItemResult(index=index, status=ERROR, detail=_validation_detail(exc)))
+    return valid, errors
+
+
+def validate_updates(
+    items: List[Any], schema: Type[BaseModel],
+) -> Tuple[List[Tuple[int, str, dict]], List[BulkItemResult]]:
+    """
+    (index, id, fields to $set) of update items, which are objects holding
+    an "id" next to the fields of `schema`; None values are left untouched.
+    """
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        item_id = item.get("id") if isinstance(item, dict) else None
+        if not isinstance(item_id, str) or not ObjectId.is_valid(item_id):
+            errors.append(BulkItemResult(index=index, id=item_id if isinstance(item_id, str) else None, status=ERROR, detail="Invalid ID"))
+            continue
+        try:
+            model = schema.model_validate({key: value for key, value in item.items() if key != "id"})
+        except ValidationError as exc:
+            errors.append(BulkItemResult(index=index, id=item_id, status=ERROR, detail=_validation_detail(exc)))
+            continue
+        valid.append((index, item_id, {key: value for key, value in model.dict().items() if value is not None}))
+    return valid, errors
+
+
+def validate_ids(items: List[Any]) -> Tuple[List[Tuple[int, str]], List[BulkItemResult]]:
+    """Delete bodies list ids, either as strings or as {"id": ...} objects."""
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        item_id = item.get("id") if isinstance(item, dict) else item
+        if isinstance(item_id, str) and ObjectId.is_valid(item_id):
+            valid.append((index, item_id))
+        else:
+            errors.append(BulkItemResult(index=index, id=item_id if isinstance(item_id, str) else None, status=ERROR, detail="Invalid ID"))
+    return valid, errors
+
+
+async def bulk_insert(collection, docs: List[Tuple[int, dict]]) -> List[BulkItemResult]:
+    """insert_many(ordered=False) per batch; `_id` is assigned up front so failures keep theirs."""
+    results = []
+    for batch in batches(docs):
+        for _, doc in batch:
+            doc.setdefault("_id", ObjectId())
+            stamp_new(doc)
+        failed = {}
+        try:
+            await collection.insert_many([doc for _, doc in batch], ordered=False)
+        except BulkWriteError as exc:
+            failed = {error["index"]: write_error_detail(error) for error in exc.details.get("writeErrors", [])}
+        for position, (index, doc) in enumerate(batch):
+            if position in failed:
+                results.append(BulkItemResult(index=index, id=str(doc["_id"]), status=ERROR, detail=failed[position]))
+            else:
+                results.append(BulkItemResult(index=index, id=str(doc["_id"]), status=CREATED))
+    return results
+
+
+async def _existing_ids(collection, ids: List[str]) -> set:
+    return {str(doc["_id"]) async for doc in collection.find({"_id": {"$in": [ObjectId(i) for i in ids]}}, {"_id": 1})}
+
+
+async def bulk_update(collection, updates: List[Tuple[int, str, dict]]) -> List[BulkItemResult]:
+    """$set each item's fields with one unordered bulk_write per batch."""
+    results = []
+    for batch in batches(updates):
+        existing = await _existing_ids(collection, [item_id for _, item_id, _ in batch])
+        writes = [(index, item_id, data) for index, item_id, data in batch if item_id in existing and data]
+        failed = {}
+        if writes:
+            try:
+                await collection.bulk_write(
+                    [UpdateOne({"_id": ObjectId(item_id)}, stamp({"$set": data})) for _, item_id, data in writes], ordered=False,
+                )
+            except BulkWriteError as exc:
+                failed = {writes[error["index"]][0]: write_error_detail(error) for error in exc.details.get("writeErrors", [])}
+        for index, item_id, _ in batch:
+            if item_id not in existing:
+                results.append(BulkItemResult(index=index, id=item_id, status=NOT_FOUND))
+            elif index in failed:
+                results.append(BulkItemResult(index=index, id=item_id, status=ERROR, detail=failed[index]))
+            else:
+                results.append(BulkItemResult(index=index, id=item_id, status=UPDATED))
+    return results
+
+
+async def bulk_delete(collection, ids: List[Tuple[int, str]]) -> List[BulkItemResult]:
+    """delete_many over the ids of each batch that exist."""
+    results = []
+    for batch in batches(ids):
+        existing = await _existing_ids(collection, [item_id for _, item_id in batch])
+        if existing:
+            await collection.delete_many({"_id": {"$in": [ObjectId(item_id) for item_id in existing]}})
+        results.extend(
+            BulkItemResult(index=index, id=item_id, status=DELETED if item_id in existing else NOT_FOUND)
+            for index, item_id in batch
+        )
+    return results
+
+
+def bulk_result(*groups: List[BulkItemResult]) -> BulkResult:
+    """Merge result lists into one response, in input order."""
+    items = sorted((item for group in groups for item in group), key=lambda item: item.index)
+    succeeded = sum(1 for item in items if item.status in (CREATED, UPDATED, DELETED))
+    return BulkResult(succeeded=succeeded, failed=len(items) - succeeded, items=items)
+
+
+def succeeded_ids(results: List[BulkItemResult], status: str) -> List[str]:
+    return [item.id for item in results if item.status == status]
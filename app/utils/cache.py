@@ -0,0 +1,99 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """In-process mapping that evicts the least recently used entry beyond `maxsize`."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def keys(self):
+        return list(self._data)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class TTLCache(LRUCache):
+    """LRUCache whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        entry = super().get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        expires, value = entry
+        if expires <= time.monotonic():
+            self.delete(key)
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        super().set(key, (time.monotonic() + (self.ttl if ttl is None else ttl), value))
+
+
+class SizedTTLCache(TTLCache):
+    """TTLCache bounded by the total `sizeof` of its values rather than by an entry count."""
+
+    def __init__(self, max_bytes: int, ttl: float, sizeof: Callable[[Any], int]):
+        super().__init__(sys.maxsize, ttl)
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._sizes: Dict[Hashable, int] = {}
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self.delete(key)
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        super().set(key, value, ttl)
+        self._sizes[key] = size
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            oldest, _ = self._data.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(oldest)
+
+    def delete(self, key: Hashable):
+        super().delete(key)
+        self.total_bytes -= self._sizes.pop(key, 0)
+
+    def clear(self):
+        super().clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+
+_MISSING = object()
@@ -0,0 +1,99 @@
+"""
+Sparse fieldsets and the shared read response path.
+
+`?fields=name,day` becomes a MongoDB projection. Fields in `hidden` (e.g.
+password hashes) are excluded by the projection itself, so they never leave
+the database. Documents from our own collections are trusted: each is turned
+into a plain dict holding the fields of the *Read schema and written straight
+to orjson, without building a model and having FastAPI validate it again
+against response_model.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+from app.utils.http_cache import etag_matches, make_etag, not_modified
+from app.utils.responses import FastJSONResponse
+from app.utils.versioning import VERSION, version_etag
+
+FIELDS_DESCRIPTION = "Comma-separated fields to return, e.g. 'id,name'"
+
+
+@lru_cache(maxsize=None)
+def _field_defaults(model: Type[BaseModel]) -> Dict[str, Any]:
+    """Field name -> value used when a document lacks it (None for required fields)."""
+    return {
+        name: None if field.is_required() else field.get_default(call_default_factory=True)
+        for name, field in model.model_fields.items()
+    }
+
+
+class FieldSelection:
+    def __init__(self, model: Type[BaseModel], names: Optional[Tuple[str, ...]], hidden: Sequence[str]):
+        defaults = _field_defaults(model)
+        self.names = names
+        self.partial = names is not None
+        if names is None:
+            self.defaults = defaults
+            self.projection = {name: 0 for name in hidden} or None
+        else:
+            self.defaults = {name: defaults[name] for name in names}
+            # _id is always returned; it is only kept in the response when "id" was asked for
+            self.projection = {name: 1 for name in names if name != "id"} or {"_id": 1}
+
+    def build(self, doc: dict) -> dict:
+        """Response dict from a raw document of our own (its _id becomes `id`)."""
+        if "_id" in doc:
+            doc["id"] = str(doc.pop("_id"))
+        return {name: doc.get(name, default) for name, default in self.defaults.items()}
+
+    def trim(self, payload: dict) -> dict:
+        """Drop unrequested keys from an already serialized payload."""
+        if not self.partial:
+            return payload
+        return {name: payload[name] for name in self.names if name in payload}
+
+    def etag(self, etag: str) -> str:
+        """ETag of the trimmed representation of a resource whose full ETag is `etag`."""
+        if not self.partial:
+            return etag
+        return make_etag(f"{etag}:{','.join(self.names)}".encode("utf-8"))
+
+    def respond(self, content: Any, **kwargs) -> FastJSONResponse:
+        """Send `content` as is; returning a Response skips FastAPI's response_model pass."""
+        return FastJSONResponse(content, **kwargs)
+
+    def one(self, doc: dict, if_none_match: Optional[str] = None) -> Response:
+        """
+        Response for one full document, tagged with its version. When the
+        client already holds that version the body is not even built: 304.
+        """
+        if VERSION not in doc:
+            return self.respond(self.build(doc))
+        etag = self.etag(version_etag(doc))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return self.respond(self.build(doc), headers={"ETag": etag})
+
+    def many(self, docs: List[dict]) -> FastJSONResponse:
+        return self.respond([self.build(doc) for doc in docs])
+
+    def page(self, docs: List[dict], next_cursor: Optional[str], etag: Optional[str] = None) -> FastJSONResponse:
+        headers = {"ETag": etag} if etag else None
+        return self.respond({"items": [self.build(doc) for doc in docs], "next": next_cursor}, headers=headers)
+
+
+def select_fields(model: Type[BaseModel], fields: Optional[str], hidden: Sequence[str] = ()) -> FieldSelection:
+    """Parse a `fields` query value against the fields of `model` (a *Read schema)."""
+    if not fields or not fields.strip():
+        return FieldSelection(model, None, hidden)
+    names = []
+    for name in (part.strip() for part in fields.split(",")):
+        if not name or name in names:
+            continue
+        if name not in model.model_fields or name in hidden:
+            raise HTTPException(status_code=400, detail=f"Unknown field '{name}'")
+        names.append(name)
+    return FieldSelection(model, tuple(sorted(names)), hidden)
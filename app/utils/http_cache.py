@@ -0,0 +1,54 @@
+import asyncio
+import hashlib
+import time
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.core.config import LIST_ETAG_MAX_AGE
+from app.utils.versioning import UPDATED_AT, VERSION
+
+
+def make_etag(data: bytes) -> str:
+    """Strong ETag derived from the exact bytes of a representation."""
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when an If-None-Match header value lists `etag` (or is "*")."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified(etag: str, cache_control: Optional[str] = None) -> Response:
+    headers = {"ETag": etag}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Response(status_code=304, headers=headers)
+
+
+async def list_etag(collection, request: Request) -> str:
+    """
+    ETag of a list of `collection` as requested by `request`, derived from
+    the collection itself: its document count and its most recently written
+    document (indexed on updated_at, _id). An insert or update moves the
+    latter and a delete the former, so nothing extra is written per change.
+    Writes that neither show, such as a raw update that skipped stamp(), are
+    picked up once the tag's LIST_ETAG_MAX_AGE window rolls over.
+
+    Cost: two small reads per list request, sent concurrently so they add one
+    round trip. The count comes from collection metadata and the newest
+    document from one seek on the (updated_at, _id) index plus one fetch.
+    A request answered with 304 skips the list query entirely; any other
+    request pays this on top of it.
+    """
+    count, latest = await asyncio.gather(
+        collection.estimated_document_count(),
+        collection.find({}, {VERSION: 1, UPDATED_AT: 1}).sort([(UPDATED_AT, -1), ("_id", -1)]).limit(1).to_list(1),
+    )
+    newest = latest[0] if latest else {}
+    window = int(time.time() // LIST_ETAG_MAX_AGE) if LIST_ETAG_MAX_AGE > 0 else 0
+    state = f"{collection.name}:{count}:{newest.get('_id')}:{newest.get(VERSION)}:{newest.get(UPDATED_AT)}:{window}"
+    return make_etag(f"{state}:{request.url.query}".encode("utf-8"))
@@ -0,0 +1,69 @@
+import numpy as np
+from PIL import Image
+
+from app.core.config import BLUR_THRESHOLD, BLUR_CHECK_MAX_SIDE
+from app.utils.process_pool import run_in_process
+
+# Rows of the edge response computed at a time
+EDGE_STRIP_ROWS = 256
+_NEIGHBOURS = [(dy, dx) for dy in range(3) for dx in range(3) if (dy, dx) != (1, 1)]
+
+
+def edge_variance(image_path: str, max_side: int = BLUR_CHECK_MAX_SIDE) -> float:
+    """
+    Variance of the FIND_EDGES response of the image, computed on a grayscale
+    copy no larger than `max_side` pixels per side (0 keeps full resolution).
+    """
+    with Image.open(image_path) as img:
+        if max_side:
+            # For JPEGs this lets libjpeg decode at 1/2, 1/4 or 1/8 scale directly
+            img.draft("L", (max_side, max_side))
+        gray = img.convert("L")
+    if max_side:
+        gray.thumbnail((max_side, max_side))
+
+    pixels = np.asarray(gray)
+    height, width = pixels.shape
+    if height < 3 or width < 3:
+        return 0.0
+
+    # Same 3x3 kernel as ImageFilter.FIND_EDGES (8 * centre - 8 neighbours),
+    # clipped to the 0..255 range PIL produces for "L" images. PIL leaves the
+    # one-pixel border untouched, so keep it too to preserve the threshold.
+    # The response is built in strips of int16 (|8 * 255| + 8 * 255 fits) and
+    # only its sum and sum of squares are kept, so a 12MP photo needs a few
+    # MB on top of its decoded pixels instead of several full-size arrays.
+    total = squares = 0
+
+    def add(values: np.ndarray):
+        nonlocal total, squares
+        wide = values.astype(np.int64)
+        total += int(wide.sum())
+        squares += int(np.dot(wide.ravel(), wide.ravel()))
+
+    add(pixels[0])
+    add(pixels[-1])
+    for start in range(1, height - 1, EDGE_STRIP_ROWS):
+        stop = min(start + EDGE_STRIP_ROWS, height - 1)
+        block = pixels[start - 1:stop + 1].astype(np.int16)
+        rows = stop - start
+        edges = block[1:-1, 1:-1] * 8
+        for dy, dx in _NEIGHBOURS:
+            edges -= block[dy:dy + rows, dx:dx + width - 2]
+        np.clip(edges, 0, 255, out=edges)
+        add(edges)
+        add(block[1:-1, 0])
+        add(block[1:-1, -1])
+
+    count = height * width
+    return (count * squares - total * total) / (count * count)
+
+
+def is_image_blurry(image_path: str, threshold: float = BLUR_THRESHOLD) -> bool:
+    """Check if the image is blurry using the Laplacian method."""
+    return edge_variance(image_path) < threshold  # If variance is low, the image is blurry
+
+
+async def check_image_blurry(image_path: str) -> bool:
+    """Run the blur check on the process pool so the event loop keeps serving requests."""
+    return await run_in_process(is_image_blurry, image_path)
@@ -0,0 +1,99 @@
+import base64
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from bson import json_util
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def parse_sort(sort: Optional[str], allowed: Sequence[str]) -> Tuple[str, int]:
+    """Turn a `sort` query value such as "day" or "-day" into (field, direction)."""
+    if not sort:
+        return "_id", ASCENDING
+
+    direction = DESCENDING if sort.startswith("-") else ASCENDING
+    field = sort.lstrip("-")
+    if field == "id":
+        field = "_id"
+    if field != "_id" and field not in allowed:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by '{field}'")
+    return field, direction
+
+
+def encode_cursor(doc: dict, field: str, direction: int) -> str:
+    """Build an opaque token pointing just after `doc` in (field, _id) order."""
+    position = {"sort": field, "dir": direction, "id": doc["_id"]}
+    if field != "_id":
+        position["value"] = doc.get(field)
+    raw = json_util.dumps(position).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(token: str, field: str, direction: int) -> dict:
+    """The position stored in `token`, which must come from a page in the same sort order."""
+    try:
+        position = json_util.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if not isinstance(position, dict) or "id" not in position or (field != "_id" and "value" not in position):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if position.get("sort") != field or position.get("dir") != direction:
+        raise HTTPException(status_code=400, detail="Pagination cursor belongs to a different sort order")
+    return position
+
+
+def keyset_filter(position: dict, field: str, direction: int) -> dict:
+    """
+    Filter matching every document that sorts strictly after `position`.
+    MongoDB sorts null and missing values before all others, so they come
+    first in ascending order and last in descending order.
+    """
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if field == "_id":
+        return {"_id": {op: position["id"]}}
+    value = position["value"]
+    same_value = {field: value, "_id": {op: position["id"]}}
+    if value is None:
+        if direction == ASCENDING:
+            return {"$or": [{field: {"$ne": None}}, same_value]}
+        return same_value
+    after = [{field: {op: value}}, same_value]
+    if direction == DESCENDING:
+        after.append({field: None})
+    return {"$or": after}
+
+
+async def paginate(
+    collection,
+    query: Dict,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    allowed_sorts: Sequence[str] = (),
+    projection: Optional[Dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Fetch one page of `collection` using keyset pagination on (sort field, _id).
+    Returns the raw documents and the token for the next page (None on the last page).
+    """
+    field, direction = parse_sort(sort, allowed_sorts)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    if cursor:
+        query = {"$and": [query, keyset_filter(decode_cursor(cursor, field, direction), field, direction)]}
+
+    if projection and field != "_id" and any(projection.values()):
+        # The cursor is built from the sort field, so an inclusion projection must carry it
+        projection = {**projection, field: 1}
+
+    order = [("_id", direction)] if field == "_id" else [(field, direction), ("_id", direction)]
+    docs = await collection.find(query, projection).sort(order).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], field, direction)
+    return docs, next_cursor
@@ -0,0 +1,33 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from app.core.config import PROCESS_POOL_WORKERS
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the per-process pool used for CPU-bound work, creating it on first use."""
+    global _executor
+    if _executor is None:
+        # Spawned, not forked: this process already runs Motor's threads, whose locks a fork could copy held
+        _executor = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS or os.cpu_count(), mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def run_in_process(func, *args):
+    """Run `func(*args)` on the process pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+def shutdown_process_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
@@ -1,29 +1,96 @@
 import qrcode
+import qrcode.image.svg
+import segno
 import io
 import base64
+from abc import ABC, abstractmethod
+
+from app.core.config import QR_RENDERER, QR_SCALE, QR_BORDER
+
+def qr_payload(offer_id: str, description: str, points_required: int) -> str:
+    """Text encoded in the QR code of an offer."""
+    return f"Offer ID: {offer_id}\nDescription: {description}\nPoints Required: {points_required}"
+
+
+class QRRenderer(ABC):
+    """Backend that turns QR text into image bytes."""
+
+    def __init__(self, scale: int = QR_SCALE, border: int = QR_BORDER):
+        self.scale = scale
+        self.border = border
+
+    @abstractmethod
+    def png(self, qr_data: str) -> bytes:
+        """PNG image of the QR code for `qr_data`."""
+
+    @abstractmethod
+    def svg(self, qr_data: str) -> bytes:
+        """SVG document of the QR code for `qr_data`."""
+
+
+class QrcodeRenderer(QRRenderer):
+    """qrcode + PIL, the original rendering path."""
+
+    def _make_qr(self, qr_data: str) -> qrcode.QRCode:
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=self.scale,
+            border=self.border,
+        )
+        qr.add_data(qr_data)
+        qr.make(fit=True)
+        return qr
+
+    def png(self, qr_data: str) -> bytes:
+        img = self._make_qr(qr_data).make_image(fill="black", back_color="white")
+        buffered = io.BytesIO()
+        img.save(buffered, format="PNG")
+        return buffered.getvalue()
+
+    def svg(self, qr_data: str) -> bytes:
+        img = self._make_qr(qr_data).make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        return img.to_string(encoding="unicode").encode("utf-8")
+
+
+class SegnoRenderer(QRRenderer):
+    """segno writes PNG and SVG directly, without going through PIL."""
+
+    def _save(self, qr_data: str, kind: str) -> bytes:
+        buffered = io.BytesIO()
+        segno.make(qr_data, error="l", micro=False).save(buffered, kind=kind, scale=self.scale, border=self.border)
+        return buffered.getvalue()
+
+    def png(self, qr_data: str) -> bytes:
+        return self._save(qr_data, "png")
+
+    def svg(self, qr_data: str) -> bytes:
+        return self._save(qr_data, "svg")
+
+
+RENDERERS = {
+    "qrcode": QrcodeRenderer,
+    "segno": SegnoRenderer,
+}
+
+_renderer = None
+
+def get_renderer() -> QRRenderer:
+    """The renderer selected by QR_RENDERER, created once per process."""
+    global _renderer
+    if _renderer is None:
+        _renderer = RENDERERS[QR_RENDERER]()
+    return _renderer
+
+def render_qr_png(qr_data: str) -> bytes:
+    """Render `qr_data` as PNG bytes."""
+    return get_renderer().png(qr_data)
+
+def render_qr_svg(qr_data: str) -> bytes:
+    """Render `qr_data` as a standalone SVG document."""
+    return get_renderer().svg(qr_data)
 
 def generate_qr_code(offer_id: str, description: str, points_required: int) -> str:
     """Generate a QR code containing offer details and return it as a base64-encoded string."""
-    
-    # Prepare QR data
-    qr_data = f"Offer ID: {offer_id}\nDescription: {description}\nPoints Required: {points_required}"
-    
-    # Create QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-
-    # Generate image
-    img = qr.make_image(fill="black", back_color="white")
-    
-    # Convert image to base64
-    buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    qr_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-
-    return qr_base64  # Return base64 image
+    qr_png = render_qr_png(qr_payload(offer_id, description, points_required))
+    return base64.b64encode(qr_png).decode("utf-8")  # Return base64 image
@@ -0,0 +1,52 @@
+import base64
+import io
+import zipfile
+from typing import List, Tuple
+from xml.sax.saxutils import escape
+
+# (offer document, rendered image, "png" or "svg")
+SheetEntry = Tuple[dict, bytes, str]
+
+MIME_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+CELL_WIDTH = 240
+CELL_HEIGHT = 290
+QR_SIZE = 220
+
+
+def build_zip(entries: List[SheetEntry]) -> bytes:
+    """One file per offer, named after its id. Images are stored, they are already compressed."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for offer, image, image_format in entries:
+            archive.writestr(f"{offer['_id']}.{image_format}", image)
+    return buffer.getvalue()
+
+
+def build_svg_sheet(entries: List[SheetEntry], columns: int) -> bytes:
+    """A printable grid of QR codes captioned with each offer's description and points."""
+    rows = (len(entries) + columns - 1) // columns
+    width, height = columns * CELL_WIDTH, rows * CELL_HEIGHT
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+    ]
+    for index, (offer, image, image_format) in enumerate(entries):
+        x = (index % columns) * CELL_WIDTH + (CELL_WIDTH - QR_SIZE) // 2
+        y = (index // columns) * CELL_HEIGHT + 10
+        data = base64.b64encode(image).decode("ascii")
+        parts.append(
+            f'<image x="{x}" y="{y}" width="{QR_SIZE}" height="{QR_SIZE}" '
+            f'href="data:{MIME_TYPES[image_format]};base64,{data}"/>'
+        )
+        caption_x = x + QR_SIZE // 2
+        parts.append(
+            f'<text x="{caption_x}" y="{y + QR_SIZE + 22}" text-anchor="middle" font-family="sans-serif" font-size="14">'
+            f'{escape(str(offer["description"]))}</text>'
+        )
+        parts.append(
+            f'<text x="{caption_x}" y="{y + QR_SIZE + 42}" text-anchor="middle" font-family="sans-serif" font-size="12">'
+            f'{offer["points_required"]} points</text>'
+        )
+    parts.append("</svg>")
+    return "\n".join(parts).encode("utf-8")
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import uuid
+from typing import Tuple
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from starlette.responses import PlainTextResponse
+
+from app.core.config import UPLOAD_DIR, UPLOAD_CHUNK_SIZE, MAX_UPLOAD_BYTES, MAX_UPLOAD_REQUEST_BYTES
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+def upload_path(owner_id: str, filename: str) -> str:
+    """Final location of an accepted image for a visit or activity."""
+    return os.path.join(UPLOAD_DIR, f"{owner_id}_{os.path.basename(filename)}")
+
+
+def content_upload_path(owner_id: str, filename: str, sha256: str) -> str:
+    """
+    Location of an accepted image named after its content, for batches where
+    several files may share a name (mobile browsers send "image.jpg" for all).
+    """
+    extension = os.path.splitext(os.path.basename(filename or ""))[1].lower()
+    return os.path.join(UPLOAD_DIR, f"{owner_id}_{sha256}{extension}")
+
+
+def temp_upload_path(filename: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"temp_{uuid.uuid4().hex}_{os.path.basename(filename)}")
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Uploaded file exceeds the {max_bytes} byte limit")
+
+
+async def save_upload(
+    file: UploadFile,
+    destination: str,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Tuple[int, str]:
+    """
+    Copy `file` to `destination` in fixed-size chunks, hashing as it goes.
+    Returns (size in bytes, SHA-256 hex digest). Oversized files are rejected
+    with 413 and nothing is left on disk.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(destination, "wb") as out_file:
+            while chunk := await file.read(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                digest.update(chunk)
+                await out_file.write(chunk)
+    except BaseException:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+    return size, digest.hexdigest()
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject multipart requests whose body is larger than `max_bytes` before the
+    form parser spools them: up front from Content-Length, or as soon as a
+    chunked body crosses the limit.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = PlainTextResponse("Request body too large", status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
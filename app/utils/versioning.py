@@ -0,0 +1,81 @@
+"""
+Optimistic concurrency for the documents the API writes.
+
+Every write bumps the document's `version` and sets `updated_at` in the same
+atomic update (see stamp()), so a version names one state of a document.
+It is sent to clients as the ETag `"v<version>"` and checked against
+If-Match: an update carrying an If-Match for an older version matches no
+document and is answered with 412 instead of overwriting someone else's change.
+Documents written before versioning count as version 0.
+
+`updated_at` comes from the database clock, so it orders writes made by
+different processes; the list ETags rely on that. Updates use $currentDate,
+inserts db_now(), which tracks the same clock to within half a round trip.
+"""
+import re
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from app.db.db import db_now
+
+VERSION = "version"
+UPDATED_AT = "updated_at"
+
+_VERSION_TAG = re.compile(r'^"v(\d+)"$')
+
+
+def stamp(update: dict) -> dict:
+    """Add the version bump and `updated_at` to a MongoDB update document."""
+    update = dict(update)
+    update["$currentDate"] = {**update.get("$currentDate", {}), UPDATED_AT: True}
+    update["$inc"] = {**update.get("$inc", {}), VERSION: 1}
+    return update
+
+
+def stamp_new(doc: dict) -> dict:
+    """Give a document about to be inserted its first version."""
+    doc[VERSION] = 1
+    doc[UPDATED_AT] = db_now()
+    return doc
+
+
+def version_etag(doc: dict) -> str:
+    return f'"v{doc.get(VERSION) or 0}"'
+
+
+def if_match_filter(if_match: Optional[str]) -> dict:
+    """
+    Query condition for an If-Match header: nothing to add when it is absent
+    or "*", otherwise the listed versions. Weak or foreign tags never match.
+    """
+    if not if_match or if_match.strip() == "*":
+        return {}
+    versions = []
+    for tag in if_match.split(","):
+        match = _VERSION_TAG.match(tag.strip())
+        if match:
+            version = int(match.group(1))
+            versions.extend([version, None] if version == 0 else [version])
+    return {VERSION: {"$in": versions}}
+
+
+async def update_by_id(collection, doc_id: str, changes: dict, if_match: Optional[str] = None, projection: Optional[dict] = None) -> Optional[dict]:
+    """
+    $set `changes` on one document and return it as updated, in one round
+    trip. Returns None when the document does not exist and raises 412 when
+    it exists but If-Match names another version. An empty `changes` writes
+    nothing and returns the document as it is.
+    """
+    query = {"_id": ObjectId(doc_id), **if_match_filter(if_match)}
+    if changes:
+        doc = await collection.find_one_and_update(
+            query, stamp({"$set": changes}), projection=projection, return_document=ReturnDocument.AFTER,
+        )
+    else:
+        doc = await collection.find_one(query, projection)
+    if doc is None and if_match and await collection.count_documents({"_id": ObjectId(doc_id)}, limit=1):
+        raise HTTPException(status_code=412, detail="Precondition failed: the document has been modified")
+    return doc
@@ -0,0 +1,104 @@
+"""
+Standalone brand detection worker.
+
+    python -m app.workers.ai_worker [--once] [--batch-size N]
+
+Claims queued image jobs from Mongo, runs them through the detector in
+batches and writes the results back through a ResultBuffer. Run as many
+copies as inference needs; the atomic claim keeps them from processing the
+same job twice. SIGINT/SIGTERM stop claiming and flush buffered results.
+The workers also take turns reconciling the points ledger.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+from app.core.config import AI_BATCH_SIZE, AI_POLL_INTERVAL, LEDGER_RECONCILE_INTERVAL
+from app.db.db import close_database, connect_database
+from app.services.entity_cache import start_entity_cache, stop_entity_cache
+from app.services.brand_detector import BrandDetector, load_detector
+from app.services.job_queue import claim_jobs, fail_job
+from app.services.points_ledger import run_reconciliation
+from app.services.result_ingest import ResultBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class AIWorker:
+    def __init__(self, detector: BrandDetector, batch_size: int = AI_BATCH_SIZE, poll_interval: float = AI_POLL_INTERVAL):
+        self.detector = detector
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = asyncio.Event()
+        self.results = ResultBuffer(self.worker_id)
+
+    async def run_once(self) -> int:
+        """Process one batch of jobs and return how many were claimed."""
+        jobs = await claim_jobs(self.worker_id, self.batch_size)
+        if not jobs:
+            return 0
+
+        try:
+            results = await self.detector.detect([job["image_path"] for job in jobs])
+        except Exception as exc:
+            logger.exception("Brand detection failed for a batch of %d images", len(jobs))
+            for job in jobs:
+                await fail_job(job, self.worker_id, str(exc))
+            return len(jobs)
+
+        for job, brands in zip(jobs, results):
+            await self.results.add(job, brands)
+        return len(jobs)
+
+    async def run(self):
+        logger.info("AI worker %s started", self.worker_id)
+        tasks = [asyncio.create_task(self.results.run(self.stopping))]
+        if LEDGER_RECONCILE_INTERVAL > 0:
+            tasks.append(asyncio.create_task(run_reconciliation(self.stopping, self.worker_id)))
+        try:
+            while not self.stopping.is_set():
+                if await self.run_once() == 0:
+                    try:
+                        await asyncio.wait_for(self.stopping.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self.stopping.set()
+            await asyncio.gather(*tasks)
+            await self.results.close()
+        logger.info("AI worker %s stopped", self.worker_id)
+
+    def stop(self):
+        self.stopping.set()
+
+
+async def main(once: bool, batch_size: int):
+    await connect_database()
+    await start_entity_cache()
+    worker = AIWorker(load_detector(), batch_size=batch_size)
+    try:
+        if once:
+            await worker.run_once()
+            await worker.results.close()
+            return
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+    finally:
+        await stop_entity_cache()
+        close_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the AI brand detection worker")
+    parser.add_argument("--once", action="store_true", help="Process a single batch and exit")
+    parser.add_argument("--batch-size", type=int, default=AI_BATCH_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.once, args.batch_size))
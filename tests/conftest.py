@@ -0,0 +1,34 @@
+"""
+The tests run the app against mongomock (an in-memory MongoDB) with a fresh,
+empty database per test. Install the extra packages with
+
+    pip install -r requirements-dev.txt
+"""
+import os
+import tempfile
+
+os.environ.setdefault("DATA_BASE", "mongodb://localhost:27017")
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="uploads-"))
+os.environ.setdefault("LEDGER_RECONCILE_INTERVAL", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+from app.db import db
+
+
+@pytest.fixture(autouse=True)
+def mock_mongo(monkeypatch):
+    monkeypatch.setattr(db, "AsyncIOMotorClient", AsyncMongoMockClient)
+    db.close_database()
+    yield
+    db.close_database()
+
+
+@pytest.fixture
+def client():
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
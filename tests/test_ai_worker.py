@@ -0,0 +1,101 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.db.db import Activity, BrandRollup, Consumer, Job, PointsLedger
+from app.services.brand_detector import StubBrandDetector
+from app.services.job_queue import DONE, PENDING, enqueue_job
+from app.workers.ai_worker import AIWorker
+
+
+class FailingDetector(StubBrandDetector):
+    async def detect(self, image_paths):
+        raise RuntimeError("model unavailable")
+
+
+def _activity_with_consumer(client):
+    consumer_id, activity_id, store = ObjectId(), ObjectId(), str(ObjectId())
+    client.portal.call(Consumer.insert_one, {
+        "_id": consumer_id, "full_name": "Ada", "phone": "1", "email": "ada@example.com", "total_points": 0,
+    })
+    client.portal.call(Activity.insert_one, {
+        "_id": activity_id, "name": "shelf", "time": datetime(2024, 1, 1), "day": datetime(2024, 1, 1),
+        "total_pics": 2, "consumer": str(consumer_id), "store": store, "is_complete": False,
+    })
+    return consumer_id, activity_id, store
+
+
+async def _process(worker: AIWorker) -> int:
+    claimed = await worker.run_once()
+    await worker.results.close()
+    return claimed
+
+
+def test_jobs_flow_from_queue_to_activity_and_ledger(client):
+    consumer_id, activity_id, store = _activity_with_consumer(client)
+    for name in ("a.jpg", "b.jpg"):
+        client.portal.call(enqueue_job, "activity", str(activity_id), name)
+
+    worker = AIWorker(StubBrandDetector({"BrandA": 2, "BrandB": 1}))
+    assert client.portal.call(_process, worker) == 2
+    assert client.portal.call(_process, worker) == 0
+
+    activity = client.portal.call(Activity.find_one, {"_id": activity_id})
+    assert activity["is_complete"] is True
+    assert activity["brand_detected"] == {"BrandA": 4, "BrandB": 2}
+    assert activity["version"] == 2  # one write per image
+
+    jobs = client.portal.call(Job.find({}).to_list, None)
+    assert {job["status"] for job in jobs} == {DONE}
+
+    consumer = client.portal.call(Consumer.find_one, {"_id": consumer_id})
+    entries = client.portal.call(PointsLedger.find({"consumer": str(consumer_id)}).to_list, None)
+    assert consumer["total_points"] == sum(entry["amount"] for entry in entries) > 0
+    assert len(entries) == 2
+
+    rollup = client.portal.call(BrandRollup.find({"store": store}).to_list, None)
+    assert {doc["brand"]: doc["count"] for doc in rollup} == {"BrandA": 4, "BrandB": 2}
+
+
+def test_failed_detection_puts_jobs_back_for_a_retry(client):
+    _, activity_id, _ = _activity_with_consumer(client)
+    client.portal.call(enqueue_job, "activity", str(activity_id), "a.jpg")
+
+    assert client.portal.call(_process, AIWorker(FailingDetector())) == 1
+
+    job = client.portal.call(Job.find_one, {})
+    assert job["status"] == PENDING
+    assert job["last_error"] == "model unavailable"
+    assert job["run_at"] > datetime.utcnow()
+    activity = client.portal.call(Activity.find_one, {"_id": activity_id})
+    assert activity["is_complete"] is False
+
+
+def test_replayed_jobs_are_not_counted_twice(client):
+    consumer_id, activity_id, store = _activity_with_consumer(client)
+    client.portal.call(enqueue_job, "activity", str(activity_id), "a.jpg")
+    worker = AIWorker(StubBrandDetector({"BrandA": 2}))
+    client.portal.call(_process, worker)
+
+    # The acknowledgement was lost: the lease runs out and the job is detected again
+    client.portal.call(Job.update_many, {}, {"$set": {"status": PENDING, "run_at": datetime(2000, 1, 1)}})
+    assert client.portal.call(_process, worker) == 1
+
+    activity = client.portal.call(Activity.find_one, {"_id": activity_id})
+    assert activity["brand_detected"] == {"BrandA": 2}
+    assert activity["version"] == 1
+    rollup = client.portal.call(BrandRollup.find_one, {"store": store})
+    assert rollup["count"] == 2
+    consumer = client.portal.call(Consumer.find_one, {"_id": consumer_id})
+    assert consumer["total_points"] == activity["gained_points"]
+    assert {job["status"] for job in client.portal.call(Job.find({}).to_list, None)} == {DONE}
+
+
+def test_brand_names_that_are_not_field_names_are_dropped(client):
+    _, activity_id, _ = _activity_with_consumer(client)
+    client.portal.call(enqueue_job, "activity", str(activity_id), "a.jpg")
+    detector = StubBrandDetector({"BrandA": 1, "Brand.B": 1, "$inc": 1})
+    client.portal.call(_process, AIWorker(detector))
+
+    activity = client.portal.call(Activity.find_one, {"_id": activity_id})
+    assert activity["brand_detected"] == {"BrandA": 1}
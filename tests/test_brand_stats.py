@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from app.db.db import BrandRollup
+
+
+def _rollup(store: str, day: int, brand: str, count: int) -> dict:
+    return {"store": store, "day": datetime(2024, 1, day), "brand": brand, "count": count, "jobs": []}
+
+
+def test_brand_counts_are_paged_instead_of_truncated(client):
+    rows = [_rollup(store, day, brand, day) for store in ("a", "b") for day in (1, 2, 3) for brand in ("cola", "soda")]
+    client.portal.call(BrandRollup.insert_many, rows)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 5, **({"next": cursor} if cursor else {})}
+        page = client.get("/brand-stats/", params=params).json()
+        seen.extend(page["items"])
+        cursor = page["next"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(rows)
+    assert [row["day"] for row in seen] == sorted(row["day"] for row in seen)
+    assert "jobs" not in seen[0]
+
+    page = client.get("/brand-stats/", params={"store": "b", "brand": "cola", "sort": "-count"}).json()
+    assert [row["count"] for row in page["items"]] == [3, 2, 1]
+    assert page["next"] is None
+
+
+def test_brand_counts_without_rows_is_404(client):
+    assert client.get("/brand-stats/", params={"store": "nowhere"}).status_code == 404
+    assert client.get("/brand-stats/", params={"sort": "jobs"}).status_code == 400
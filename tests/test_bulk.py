@@ -0,0 +1,98 @@
+import json
+
+from bson import ObjectId
+
+from app.api.endpoints import consumer as consumer_endpoints
+from app.services import qr_cache
+from app.db.db import Consumer, Identity, Store
+
+STORE = {
+    "name": "corner shop",
+    "opening_time": "2024-01-01T08:00:00",
+    "closing_time": "2024-01-01T20:00:00",
+    "location": "city 0",
+    "phone": "1",
+}
+
+
+def _consumer(email: str) -> dict:
+    return {"full_name": "Ada", "phone": "1", "email": email, "password": "secret"}
+
+
+def test_each_item_gets_its_own_result_in_input_order(client):
+    items = [STORE, {"name": "no hours"}, {**STORE, "name": "second"}]
+    body = client.post("/stores/1/bulk", json=items).json()
+
+    assert (body["succeeded"], body["failed"]) == (2, 1)
+    assert [item["index"] for item in body["items"]] == [0, 1, 2]
+    assert [item["status"] for item in body["items"]] == ["created", "error", "created"]
+    assert "opening_time" in body["items"][1]["detail"]
+    assert client.portal.call(Store.count_documents, {}) == 2
+
+
+def test_ndjson_body(client):
+    lines = "\n".join(json.dumps({**STORE, "name": f"store {index}"}) for index in range(3)) + "\n\n"
+    response = client.post("/stores/1/bulk", content=lines, headers={"Content-Type": "application/x-ndjson"})
+    assert response.json()["succeeded"] == 3
+
+    response = client.post("/stores/1/bulk", content='{"name": "a"}\nnot json\n', headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid JSON on line 2"
+
+
+def test_duplicate_emails_fail_only_their_items(client):
+    client.post("/consumers/1/bulk", json=[_consumer("taken@example.com")])
+    items = [_consumer("new@example.com"), _consumer("taken@example.com"), _consumer("new@example.com")]
+    body = client.post("/consumers/1/bulk", json=items).json()
+
+    assert [item["status"] for item in body["items"]] == ["created", "error", "error"]
+    assert client.portal.call(Consumer.count_documents, {}) == 2
+    identities = client.portal.call(Identity.find({}).to_list, None)
+    assert sorted(identity["email"] for identity in identities) == ["new@example.com", "taken@example.com"]
+    profile = client.portal.call(Consumer.find_one, {"email": "new@example.com"})
+    assert profile["password"].startswith("$argon2")
+    assert {identity["user_id"] for identity in identities} >= {body["items"][0]["id"]}
+
+
+def test_updates_and_deletes_report_invalid_and_missing_ids(client):
+    created = client.post("/stores/1/bulk", json=[STORE]).json()["items"][0]["id"]
+    missing = str(ObjectId())
+
+    body = client.put("/stores/1/bulk", json=[
+        {"id": created, "phone": "2"}, {"id": "nope", "phone": "3"}, {"id": missing, "phone": "4"},
+    ]).json()
+    assert [item["status"] for item in body["items"]] == ["updated", "error", "not_found"]
+    assert client.get(f"/stores/{created}").json()["phone"] == "2"
+
+    body = client.request("DELETE", "/stores/1/bulk", json=[created, "nope", missing]).json()
+    assert [item["status"] for item in body["items"]] == ["deleted", "error", "not_found"]
+    assert client.get(f"/stores/{created}").status_code == 404
+
+
+def test_profile_bulk_endpoints_take_fewer_items(client, monkeypatch):
+    monkeypatch.setattr(consumer_endpoints, "BULK_MAX_PROFILES", 2)
+    items = [_consumer(f"user{index}@example.com") for index in range(3)]
+    response = client.post("/consumers/1/bulk", json=items)
+    assert response.status_code == 413
+    assert client.portal.call(Consumer.count_documents, {}) == 0
+
+
+def test_bulk_offer_writes_prerender_their_qr_codes(client, monkeypatch):
+    renders = []
+
+    async def render(function, payload):
+        renders.append(payload)
+        return function(payload)
+
+    monkeypatch.setattr(qr_cache, "run_in_process", render)
+    items = [{"points_required": 10, "description": "coffee"}, {"points_required": 20, "description": "tea"}]
+    offer_ids = [item["id"] for item in client.post("/offers/1/bulk", json=items).json()["items"]]
+    assert len(renders) == 2 * len(qr_cache.QR_FORMATS)
+
+    updated = client.put("/offers/1/bulk", json=[{"id": offer_ids[0], "points_required": 15}]).json()
+    assert updated["items"][0]["status"] == "updated"
+    assert len(renders) == 3 * len(qr_cache.QR_FORMATS)
+
+    for offer_id in offer_ids:
+        assert client.get(f"/offers/{offer_id}/qr", params={"format": "svg"}).status_code == 200
+    assert len(renders) == 3 * len(qr_cache.QR_FORMATS)
@@ -0,0 +1,92 @@
+import pytest
+
+from app.db.db import Store
+from app.services import entity_cache
+from app.utils import cache
+from app.utils.cache import SizedTTLCache
+
+STORE = {
+    "name": "corner shop",
+    "opening_time": "2024-01-01T08:00:00",
+    "closing_time": "2024-01-01T20:00:00",
+    "location": "city 0",
+    "phone": "1",
+}
+
+
+class RecordingBackend(entity_cache.InvalidationBackend):
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, collection, ids):
+        self.published.append((collection, ids))
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    recording = RecordingBackend()
+    monkeypatch.setattr(entity_cache, "_backend", recording)
+    return recording
+
+
+def _cached(store_id: str) -> bool:
+    return (Store.name, store_id) in entity_cache._cache
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    entries = SizedTTLCache(100, ttl=10, sizeof=len)
+    entries.set("a", "value")
+
+    now[0] += 9
+    assert entries.get("a") == "value"
+    now[0] += 1
+    assert entries.get("a") is None
+    assert entries.total_bytes == 0
+
+
+def test_least_recently_used_entries_go_first_once_full():
+    entries = SizedTTLCache(10, ttl=60, sizeof=len)
+    entries.set("a", "aaaa")
+    entries.set("b", "bbbb")
+    entries.get("a")
+    entries.set("c", "cccc")
+
+    assert "b" not in entries
+    assert entries.get("a") == "aaaa" and entries.get("c") == "cccc"
+    assert entries.total_bytes == 8
+
+    entries.set("huge", "x" * 11)
+    assert "huge" not in entries
+    assert entries.total_bytes == 8
+
+
+def test_single_writes_invalidate_the_cached_document(client, backend):
+    store_id = client.post("/stores/", json=STORE).json()["id"]
+    assert client.get(f"/stores/{store_id}").status_code == 200
+    assert _cached(store_id)
+
+    assert client.put(f"/stores/{store_id}", json={"phone": "2"}).status_code == 200
+    assert not _cached(store_id)
+    assert client.get(f"/stores/{store_id}").json()["phone"] == "2"
+
+    assert client.delete(f"/stores/{store_id}").status_code == 200
+    assert not _cached(store_id)
+    assert client.get(f"/stores/{store_id}").status_code == 404
+    assert backend.published == [("Store", [store_id]), ("Store", [store_id])]
+
+
+def test_bulk_writes_invalidate_the_cached_documents(client, backend):
+    store_ids = [item["id"] for item in client.post("/stores/1/bulk", json=[STORE, STORE]).json()["items"]]
+    for store_id in store_ids:
+        client.get(f"/stores/{store_id}")
+
+    client.put("/stores/1/bulk", json=[{"id": store_ids[0], "phone": "2"}])
+    assert not _cached(store_ids[0]) and _cached(store_ids[1])
+    assert client.get(f"/stores/{store_ids[0]}").json()["phone"] == "2"
+
+    client.request("DELETE", "/stores/1/bulk", json=store_ids)
+    assert not any(_cached(store_id) for store_id in store_ids)
+    assert all(client.get(f"/stores/{store_id}").status_code == 404 for store_id in store_ids)
+    assert backend.published[-1] == ("Store", store_ids)
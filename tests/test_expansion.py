@@ -0,0 +1,71 @@
+from collections import Counter
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.db.db import Activity, Consumer, Store
+from app.services import expansion
+
+
+def _insert(client, collection, **doc) -> str:
+    doc_id = ObjectId()
+    client.portal.call(collection.insert_one, {"_id": doc_id, "version": 1, **doc})
+    return str(doc_id)
+
+
+def _activity(client, consumer: str, store: str) -> str:
+    now = datetime(2024, 1, 1, 12)
+    return _insert(client, Activity, name="visit", time=now, day=now, total_pics=1, consumer=consumer, store=store)
+
+
+def _setup(client):
+    stores = [
+        _insert(client, Store, name=f"store {index}", opening_time=datetime(2024, 1, 1, 8),
+                closing_time=datetime(2024, 1, 1, 20), location="city", phone="1")
+        for index in range(2)
+    ]
+    consumer = _insert(client, Consumer, full_name="Ada", phone="1", email="ada@example.com", password="hash", points=0)
+    return stores, consumer
+
+
+def test_a_page_resolves_each_referenced_collection_once(client, monkeypatch):
+    stores, consumer = _setup(client)
+    for index in range(4):
+        _activity(client, consumer, stores[index % 2])
+
+    lookups = Counter()
+    find_many_by_id = expansion.find_many_by_id
+
+    async def counting(collection, doc_ids, hidden=()):
+        lookups[collection.name] += 1
+        return await find_many_by_id(collection, doc_ids, hidden)
+
+    monkeypatch.setattr(expansion, "find_many_by_id", counting)
+    response = client.get("/activities/", params={"expand": "store,consumer"})
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+    items = response.json()["items"]
+
+    assert lookups == {"Store": 1, "Consumer": 1}
+    assert [item["store"]["id"] for item in items] == [stores[index % 2] for index in range(4)]
+    assert {item["consumer"]["email"] for item in items} == {"ada@example.com"}
+
+
+def test_dangling_references_expand_to_null(client):
+    stores, consumer = _setup(client)
+    activity_id = _activity(client, str(ObjectId()), "not-an-id")
+
+    body = client.get(f"/activities/{activity_id}", params={"expand": "store,consumer"}).json()
+    assert body["store"] is None
+    assert body["consumer"] is None
+
+
+def test_expanded_profiles_never_include_the_password(client):
+    stores, consumer = _setup(client)
+    activity_id = _activity(client, consumer, stores[0])
+
+    body = client.get(f"/activities/{activity_id}", params={"expand": "consumer"}).json()
+    assert body["consumer"]["id"] == consumer
+    assert "password" not in body["consumer"]
+    assert body["store"] == stores[0]
+    assert client.get(f"/activities/{activity_id}", params={"expand": "worker"}).status_code == 400
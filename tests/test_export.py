@@ -0,0 +1,26 @@
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.api.endpoints.visit import VISIT_EXPORT_COLUMNS
+from app.db.db import Visit
+
+
+def test_ndjson_export_holds_only_the_export_columns_in_day_order(client):
+    store = str(ObjectId())
+    docs = [
+        {
+            "_id": ObjectId(), "name": f"visit {day}", "day": datetime(2024, 1, day), "time": "10:00",
+            "is_complete": False, "total_pics": 0, "worker": None, "store": store,
+            "version": 3, "updated_at": datetime(2024, 2, 1), "claim_expires": datetime(2024, 2, 1),
+        }
+        for day in (3, 1, 2)
+    ]
+    client.portal.call(Visit.insert_many, docs)
+
+    response = client.get("/visits/1/export", params={"store": store})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["name"] for row in rows] == ["visit 1", "visit 2", "visit 3"]
+    assert all(list(row) == list(VISIT_EXPORT_COLUMNS) for row in rows)
@@ -0,0 +1,53 @@
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.api.endpoints.worker import HIDDEN_FIELDS
+from app.db.db import Worker
+from app.schemas.worker import WorkerBase, WorkerRead
+from app.utils.fields import select_fields
+
+
+def _insert_worker(client) -> str:
+    worker_id = ObjectId()
+    client.portal.call(Worker.insert_one, {
+        "_id": worker_id, "full_name": "Ada", "phone": "1", "email": "ada@example.com", "password": "hash",
+        "profile_image": None, "version": 1,
+    })
+    return str(worker_id)
+
+
+def test_fields_become_a_projection():
+    assert select_fields(WorkerRead, "email, id,email", HIDDEN_FIELDS).projection == {"email": 1}
+    assert select_fields(WorkerRead, "id", HIDDEN_FIELDS).projection == {"_id": 1}
+    assert select_fields(WorkerRead, None, HIDDEN_FIELDS).projection == {"password": 0}
+
+
+def test_only_requested_fields_are_returned(client):
+    worker_id = _insert_worker(client)
+    response = client.get(f"/workers/{worker_id}", params={"fields": "phone,id"})
+    assert response.json() == {"id": worker_id, "phone": "1"}
+    assert response.headers["ETag"] != client.get(f"/workers/{worker_id}").headers["ETag"]
+
+    page = client.get("/workers/", params={"fields": "email"}).json()
+    assert page["items"] == [{"email": "ada@example.com"}]
+
+
+def test_unknown_fields_are_rejected(client):
+    worker_id = _insert_worker(client)
+    response = client.get(f"/workers/{worker_id}", params={"fields": "phone,salary"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown field 'salary'"
+    assert client.get("/workers/", params={"fields": "salary"}).status_code == 400
+
+
+def test_hidden_fields_are_never_projected(client):
+    worker_id = _insert_worker(client)
+    assert "password" not in client.get(f"/workers/{worker_id}").json()
+    assert "password" not in client.get("/workers/").json()["items"][0]
+    assert client.get(f"/workers/{worker_id}", params={"fields": "id,password"}).status_code == 400
+
+    # Even a schema that declares the field cannot select it once it is hidden
+    with pytest.raises(HTTPException) as error:
+        select_fields(WorkerBase, "email,password", HIDDEN_FIELDS)
+    assert error.value.status_code == 400
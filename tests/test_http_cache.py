@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from app.db import db
+from app.db.db import Identity, Store, Worker
+from app.utils.versioning import UPDATED_AT, stamp_new
+from app.services.password_service import pwd_context
+
+STORE = {
+    "name": "corner shop",
+    "opening_time": "2024-01-01T08:00:00",
+    "closing_time": "2024-01-01T20:00:00",
+    "location": "city 0",
+    "phone": "1",
+}
+
+
+def _create_store(client, **changes):
+    response = client.post("/stores/", json={**STORE, **changes})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def _list_etag(client, **params):
+    response = client.get("/stores/", params=params)
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def test_resource_etag_answers_304_until_updated(client):
+    store_id = _create_store(client)
+    etag = client.get(f"/stores/{store_id}").headers["ETag"]
+    assert etag == '"v1"'
+    assert client.get(f"/stores/{store_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    response = client.put(f"/stores/{store_id}", json={"phone": "2"}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"v2"'
+
+    response = client.get(f"/stores/{store_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["phone"] == "2"
+
+
+def test_stale_if_match_is_rejected(client):
+    store_id = _create_store(client)
+    client.put(f"/stores/{store_id}", json={"phone": "2"})
+
+    response = client.put(f"/stores/{store_id}", json={"phone": "3"}, headers={"If-Match": '"v1"'})
+    assert response.status_code == 412
+    assert client.get(f"/stores/{store_id}").json()["phone"] == "2"
+
+
+def test_if_match_on_missing_document_is_404(client):
+    response = client.put("/stores/0123456789abcdef01234567", json={"phone": "3"}, headers={"If-Match": '"v1"'})
+    assert response.status_code == 404
+
+
+def test_list_etag_answers_304_while_unchanged(client):
+    _create_store(client)
+    etag = _list_etag(client)
+    assert _list_etag(client) == etag
+    assert client.get("/stores/", headers={"If-None-Match": etag}).status_code == 304
+    # The query string is part of the tag
+    assert _list_etag(client, limit=1) != etag
+
+
+@pytest.mark.parametrize("change", ["insert", "update", "delete"])
+def test_list_etag_changes_with_the_collection(client, change):
+    first = _create_store(client, name="a")
+    second = _create_store(client, name="b")
+    etag = _list_etag(client)
+
+    if change == "insert":
+        _create_store(client, name="c")
+    elif change == "update":
+        # Not the most recently written store
+        assert client.put(f"/stores/{first}", json={"phone": "2"}).status_code == 200
+    else:
+        assert client.delete(f"/stores/{second}").status_code == 200
+
+    assert client.get("/stores/", headers={"If-None-Match": etag}).status_code == 200
+    assert _list_etag(client) != etag
+
+
+def test_no_op_writes_keep_the_list_etag(client):
+    store_id = _create_store(client)
+    etag = _list_etag(client)
+
+    assert client.put(f"/stores/{store_id}", json={}).status_code == 200
+    assert client.delete("/stores/0123456789abcdef01234567").status_code == 404
+    assert _list_etag(client) == etag
+    assert client.portal.call(Store.count_documents, {}) == 1
+
+
+def test_password_rehash_on_login_refreshes_cached_etag(client):
+    worker_id = ObjectId()
+    legacy_hash = pwd_context.handler("bcrypt").using(rounds=4).hash("secret")
+    client.portal.call(Worker.insert_one, {
+        "_id": worker_id, "full_name": "Ada", "phone": "1", "email": "ada@example.com", "password": legacy_hash,
+        "profile_image": None, "version": 1,
+    })
+    client.portal.call(Identity.insert_one, {
+        "email": "ada@example.com", "role": "worker", "user_id": str(worker_id), "password": legacy_hash,
+    })
+    etag = client.get(f"/workers/{worker_id}").headers["ETag"]
+
+    assert client.post("/auth/login", params={"email": "ada@example.com", "password": "secret"}).status_code == 200
+    fresh = client.get(f"/workers/{worker_id}").headers["ETag"]
+    assert fresh != etag
+    response = client.put(f"/workers/{worker_id}", json={"phone": "2"}, headers={"If-Match": fresh})
+    assert response.status_code == 200
+
+
+def test_offer_qr_is_revalidated_and_follows_offer_edits(client):
+    offer_id = client.post("/offers/", json={"points_required": 10, "description": "coffee"}).json()["id"]
+    response = client.get(f"/offers/{offer_id}/qr", params={"format": "png"})
+    assert response.headers["Cache-Control"] == "no-cache"
+    etag = response.headers["ETag"]
+    assert client.get(f"/offers/{offer_id}/qr", params={"format": "png"}, headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.put(f"/offers/{offer_id}", json={"points_required": 20}).status_code == 200
+    response = client.get(f"/offers/{offer_id}/qr", params={"format": "png"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_inserts_are_stamped_with_the_database_clock(monkeypatch):
+    ahead = timedelta(hours=1)
+
+    async def hello(name):
+        return {"localTime": datetime.utcnow() + ahead}
+
+    monkeypatch.setattr(db, "get_client", lambda: SimpleNamespace(admin=SimpleNamespace(command=hello)))
+    monkeypatch.setattr(db, "_clock_offset", timedelta(0))
+    asyncio.run(db.sync_clock())
+
+    stamped = stamp_new({})[UPDATED_AT]
+    assert abs(stamped - (datetime.utcnow() + ahead)) < timedelta(seconds=5)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.core.config import BLUR_THRESHOLD
+from app.utils.image_quality import edge_variance, is_image_blurry
+
+
+def baseline_variance(path) -> float:
+    """The original check: variance of PIL's FIND_EDGES on the full-size grayscale image."""
+    with Image.open(path) as img:
+        return float(np.var(np.array(img.convert("L").filter(ImageFilter.FIND_EDGES))))
+
+
+def _sharp(size=(1600, 1200)) -> Image.Image:
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for x in range(0, size[0], 40):
+        draw.rectangle([x, 0, x + 19, size[1]], fill="black")
+    for y in range(0, size[1], 60):
+        draw.line([0, y, size[0], y], fill=(200, 30, 30), width=3)
+    return img
+
+
+def _gradient(size=(1600, 1200)) -> Image.Image:
+    row = np.linspace(0, 255, size[0], dtype=np.uint8)
+    return Image.fromarray(np.tile(row, (size[1], 1)), "L").convert("RGB")
+
+
+IMAGES = {
+    "sharp": _sharp,
+    "blurred": lambda: _sharp().filter(ImageFilter.GaussianBlur(6)),
+    "gradient": _gradient,
+}
+
+
+@pytest.mark.parametrize("name", sorted(IMAGES))
+@pytest.mark.parametrize("fmt", ["png", "jpeg"])
+def test_edge_variance_matches_baseline(tmp_path, name, fmt):
+    path = tmp_path / f"{name}.{fmt}"
+    IMAGES[name]().save(path, **({"quality": 90} if fmt == "jpeg" else {}))
+
+    expected = baseline_variance(path)
+    assert edge_variance(str(path)) == pytest.approx(expected, rel=1e-9)
+    assert is_image_blurry(str(path)) == (expected < BLUR_THRESHOLD)
+
+
+def test_blurred_and_flat_images_are_rejected(tmp_path):
+    for name, expected in (("sharp", False), ("blurred", True), ("gradient", True)):
+        path = tmp_path / f"{name}.jpg"
+        IMAGES[name]().save(path, quality=90)
+        assert is_image_blurry(str(path)) is expected, name
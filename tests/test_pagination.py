@@ -0,0 +1,72 @@
+import base64
+
+import pytest
+from bson import ObjectId, json_util
+
+from app.db.db import Store
+
+
+def _insert_stores(client, count=7):
+    docs = [
+        {
+            "_id": ObjectId(),
+            "name": f"store {index % 3}",
+            # Some stores have no location at all, some have it set to null
+            "location": None if index % 4 == 0 else f"city {index % 2}",
+            "phone": "1",
+        }
+        for index in range(count)
+    ]
+    for doc in docs[::3]:
+        doc.pop("location")
+    client.portal.call(Store.insert_many, docs)
+    return docs
+
+
+def _walk(client, sort, limit=2):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": limit, "sort": sort}
+        if cursor:
+            params["next"] = cursor
+        page = client.get("/stores/", params=params).json()
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next"]
+        if not cursor:
+            return seen
+
+
+def _expected(docs, field, descending):
+    def key(doc):
+        value = doc.get(field)
+        # nulls and missing values sort before everything else
+        return (value is not None, value or "", doc["_id"])
+    return [str(doc["_id"]) for doc in sorted(docs, key=key, reverse=descending)]
+
+
+@pytest.mark.parametrize("sort", ["name", "-name", "location", "-location", None])
+def test_pages_cover_every_document_once_in_order(client, sort):
+    docs = _insert_stores(client)
+    field = (sort or "_id").lstrip("-")
+    assert _walk(client, sort) == _expected(docs, field, bool(sort) and sort.startswith("-"))
+
+
+def test_cursor_from_another_sort_is_rejected(client):
+    _insert_stores(client)
+    cursor = client.get("/stores/", params={"limit": 2, "sort": "name"}).json()["next"]
+    for sort in ("location", "-name"):
+        response = client.get("/stores/", params={"limit": 2, "sort": sort, "next": cursor})
+        assert response.status_code == 400
+
+
+@pytest.mark.parametrize("position", [
+    {"sort": "name", "dir": 1, "id": ObjectId()},
+    {"sort": "name", "dir": 1, "value": "x"},
+    ["not", "a", "position"],
+])
+def test_malformed_cursor_is_rejected(client, position):
+    _insert_stores(client)
+    token = base64.urlsafe_b64encode(json_util.dumps(position).encode()).decode()
+    for cursor in (token, "%%%not-base64"):
+        response = client.get("/stores/", params={"limit": 2, "sort": "name", "next": cursor})
+        assert response.status_code == 400
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from bson import ObjectId
+
+from app.db.db import Consumer, Identity
+from app.services import password_service
+from app.services.password_service import hash_password, hash_passwords, pwd_context, verify_password
+
+
+def test_legacy_bcrypt_login_is_rehashed_to_argon2(client):
+    consumer_id = ObjectId()
+    legacy_hash = pwd_context.handler("bcrypt").using(rounds=4).hash("secret")
+    client.portal.call(Consumer.insert_one, {
+        "_id": consumer_id, "full_name": "Ada", "phone": "1", "email": "ada@example.com", "password": legacy_hash,
+        "points": 0, "version": 1,
+    })
+    client.portal.call(Identity.insert_one, {
+        "email": "ada@example.com", "role": "consumer", "user_id": str(consumer_id), "password": legacy_hash,
+    })
+    login = {"email": "ada@example.com", "password": "secret"}
+
+    assert client.post("/auth/login", params=login).status_code == 200
+    identity = client.portal.call(Identity.find_one, {"email": "ada@example.com"})
+    profile = client.portal.call(Consumer.find_one, {"_id": consumer_id})
+    assert identity["password"].startswith("$argon2")
+    assert profile["password"] == identity["password"]
+
+    assert client.post("/auth/login", params=login).status_code == 200
+    assert client.post("/auth/login", params={**login, "password": "wrong"}).status_code == 401
+
+
+def test_hashing_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def record(func):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(pwd_context, "hash", record(pwd_context.hash))
+    monkeypatch.setattr(pwd_context, "verify_and_update", record(pwd_context.verify_and_update))
+
+    async def main():
+        hashed = await hash_password("secret")
+        assert len(await hash_passwords(["a", "b", "c"])) == 3
+        assert (await verify_password("secret", hashed))[0]
+        return threading.current_thread().name
+
+    loop_thread = asyncio.run(main())
+    password_service.shutdown_password_pool()
+
+    assert len(threads) == 5
+    assert all(name.startswith("password") and name != loop_thread for name in threads)
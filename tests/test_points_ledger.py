@@ -0,0 +1,99 @@
+from bson import ObjectId
+
+from app.db.db import Consumer, Offer, PointsLedger
+from app.services import points_ledger
+from app.services.points_ledger import APPLIED, REJECTED, record_entries, record_entry
+
+
+def _consumer(client, total_points=0):
+    consumer_id = ObjectId()
+    client.portal.call(Consumer.insert_one, {"_id": consumer_id, "total_points": total_points})
+    return str(consumer_id)
+
+
+def _balance(client, consumer_id):
+    return client.portal.call(Consumer.find_one, {"_id": ObjectId(consumer_id)})["total_points"]
+
+
+def test_replayed_key_is_applied_once(client):
+    consumer_id = _consumer(client)
+    first = client.portal.call(record_entry, consumer_id, 10, "visit:1", "visit")
+    again = client.portal.call(record_entry, consumer_id, 10, "visit:1", "visit")
+    assert first["status"] == again["status"] == APPLIED
+    assert first["_id"] == again["_id"]
+    assert _balance(client, consumer_id) == 10
+
+
+def test_redemption_never_overdraws(client):
+    consumer_id = _consumer(client, total_points=15)
+    assert client.portal.call(record_entry, consumer_id, -10, "offer:1", "redeem")["status"] == APPLIED
+    assert client.portal.call(record_entry, consumer_id, -10, "offer:2", "redeem")["status"] == REJECTED
+    assert _balance(client, consumer_id) == 5
+
+
+def test_batch_skips_recorded_keys(client):
+    consumer_id = _consumer(client)
+    client.portal.call(record_entry, consumer_id, 10, "job:1", "activity")
+    credits = [
+        {"consumer": consumer_id, "amount": 10, "key": f"job:{index}", "reason": "activity"}
+        for index in (1, 2, 3)
+    ]
+    assert client.portal.call(record_entries, credits) == 2
+    assert _balance(client, consumer_id) == 30
+
+
+def test_reconcile_finishes_interrupted_entries_once(client, monkeypatch):
+    consumer_id = _consumer(client)
+    monkeypatch.setattr(points_ledger, "LEDGER_PENDING_TIMEOUT", 0)
+    entry = points_ledger._new_entry(consumer_id, 10, "visit:1", "visit", None)
+    client.portal.call(PointsLedger.insert_one, entry)
+
+    assert client.portal.call(points_ledger.reconcile) == {}
+    assert client.portal.call(points_ledger.reconcile) == {}
+    stored = client.portal.call(PointsLedger.find_one, {"_id": entry["_id"]})
+    assert stored["status"] == APPLIED
+    assert _balance(client, consumer_id) == 10
+
+
+def test_reconcile_reports_balances_that_differ_from_the_ledger(client):
+    consumer_id = _consumer(client, total_points=40)
+    client.portal.call(record_entry, consumer_id, 10, "visit:1", "visit")
+    assert client.portal.call(points_ledger.reconcile) == {consumer_id: 40}
+    assert client.portal.call(points_ledger.reconcile, True) == {consumer_id: 40}
+    assert client.portal.call(points_ledger.reconcile) == {}
+
+
+def test_one_reconciliation_turn_per_interval(client):
+    take = points_ledger.take_reconcile_turn
+    assert client.portal.call(take, "worker-a", 300)
+    assert not client.portal.call(take, "worker-b", 300)
+    assert not client.portal.call(take, "worker-a", 300)
+
+
+def test_expired_turn_passes_to_the_next_worker(client):
+    take = points_ledger.take_reconcile_turn
+    assert client.portal.call(take, "worker-a", 0)
+    assert client.portal.call(take, "worker-b", 300)
+
+
+def test_redemption_charges_the_current_price(client):
+    consumer_id = _consumer(client, total_points=50)
+    offer_id = client.post("/offers/", json={"points_required": 10, "description": "coffee"}).json()["id"]
+    assert client.get(f"/offers/{offer_id}").status_code == 200  # now in this process's catalog cache
+    # Repriced by another process, whose invalidation this one never sees
+    client.portal.call(Offer.update_one, {"_id": ObjectId(offer_id)}, {"$set": {"points_required": 30}})
+
+    response = client.post(f"/consumers/{consumer_id}/redeem", params={"offer_id": offer_id})
+    assert response.status_code == 200
+    assert response.json()["amount"] == -30
+    assert _balance(client, consumer_id) == 20
+
+
+def test_offers_without_a_positive_price_cannot_be_redeemed(client):
+    consumer_id = _consumer(client, total_points=50)
+    offer_id = ObjectId()
+    client.portal.call(Offer.insert_one, {"_id": offer_id, "points_required": -10, "description": "free points"})
+
+    response = client.post(f"/consumers/{consumer_id}/redeem", params={"offer_id": str(offer_id)})
+    assert response.status_code == 400
+    assert _balance(client, consumer_id) == 50
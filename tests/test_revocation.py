@@ -0,0 +1,38 @@
+from app.services import auth_service
+
+SIGNUP = {"full_name": "Ada", "phone": "1", "email": "ada@example.com", "password": "secret"}
+
+
+def _login(client):
+    response = client.post("/auth/login", params={"email": SIGNUP["email"], "password": SIGNUP["password"]})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def _forget_local_revocations():
+    """Make this process look like one that did not handle the revocation itself."""
+    auth_service._revoked_tokens.clear()
+    auth_service._revoked_subjects.clear()
+
+
+def test_logout_reaches_other_processes(client):
+    assert client.post("/auth/signup", params={"role": "consumer", **SIGNUP}).status_code == 200
+    headers = _login(client)
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    assert client.post("/auth/logout", headers=headers).status_code == 401
+
+    _forget_local_revocations()
+    client.portal.call(auth_service.sync_revocations)
+    assert client.post("/auth/logout", headers=headers).status_code == 401
+    assert client.post("/auth/logout", headers=_login(client)).status_code == 200
+
+
+def test_account_deletion_reaches_other_processes(client):
+    assert client.post("/auth/signup", params={"role": "worker", **SIGNUP}).status_code == 200
+    headers = _login(client)
+    worker_id = client.get("/workers/", params={"fields": "id"}).json()["items"][0]["id"]
+    assert client.delete(f"/workers/{worker_id}").status_code == 200
+
+    _forget_local_revocations()
+    client.portal.call(auth_service.sync_revocations)
+    assert client.post("/auth/logout", headers=headers).status_code == 401
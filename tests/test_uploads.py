@@ -0,0 +1,46 @@
+import io
+import os
+
+import pytest
+from bson import ObjectId
+from PIL import Image, ImageDraw
+
+from app.core.config import UPLOAD_DIR
+
+
+@pytest.mark.parametrize("resource", ["visits", "activities"])
+def test_non_image_upload_is_rejected_and_cleaned_up(client, resource):
+    before = set(os.listdir(UPLOAD_DIR))
+    response = client.post(
+        f"/{resource}/{ObjectId()}/upload-image",
+        files={"file": ("notes.jpg", b"this is not an image", "image/jpeg")},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "File is not a readable image"
+    assert set(os.listdir(UPLOAD_DIR)) == before
+
+
+def _striped_png(spacing: int) -> bytes:
+    image = Image.new("L", (256, 256), 255)
+    draw = ImageDraw.Draw(image)
+    for x in range(0, 256, spacing):
+        draw.line([(x, 0), (x, 255)], fill=0)
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def test_batch_photos_with_the_same_name_are_all_kept(client):
+    photos = [_striped_png(8), _striped_png(12)]
+    response = client.post(
+        f"/visits/{ObjectId()}/upload-images",
+        files=[("files", ("image.jpg", photo, "image/jpeg")) for photo in photos],
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["accepted"] for result in results] == [True, True]
+    paths = [result["file_path"] for result in results]
+    assert len(set(paths)) == 2
+    for path, photo in zip(paths, photos):
+        with open(path, "rb") as stored:
+            assert stored.read() == photo
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.db.db import Visit
+
+WORKER_A, WORKER_B = str(ObjectId()), str(ObjectId())
+
+
+def _insert_visits(client, store, count=2):
+    docs = [
+        {
+            "_id": ObjectId(), "name": f"visit {index}", "time": datetime(2024, 1, 1, 9 + index),
+            "day": datetime(2024, 1, 1), "total_pics": 0, "worker": "", "store": store,
+            "brand_detected": {}, "is_complete": False,
+        }
+        for index in range(count)
+    ]
+    client.portal.call(Visit.insert_many, docs)
+    return [str(doc["_id"]) for doc in docs]
+
+
+def _claim(client, worker, store):
+    return client.post("/visits/1/claim", params={"worker": worker, "store": store})
+
+
+def test_each_visit_goes_to_one_worker_oldest_first(client):
+    store = str(ObjectId())
+    first, second = _insert_visits(client, store)
+
+    assert _claim(client, WORKER_A, store).json()["id"] == first
+    assert _claim(client, WORKER_B, store).json()["id"] == second
+    assert _claim(client, WORKER_A, store).status_code == 404
+
+
+def test_released_and_expired_claims_become_available(client):
+    store = str(ObjectId())
+    (visit_id,) = _insert_visits(client, store, count=1)
+    assert _claim(client, WORKER_A, store).status_code == 200
+
+    # Only the holder can release it
+    assert client.post(f"/visits/{visit_id}/release", params={"worker": WORKER_B}).status_code == 404
+    assert client.post(f"/visits/{visit_id}/release", params={"worker": WORKER_A}).status_code == 200
+    assert _claim(client, WORKER_B, store).json()["worker"] == WORKER_B
+
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    client.portal.call(Visit.update_one, {"_id": ObjectId(visit_id)}, {"$set": {"claim_expires": expired}})
+    assert _claim(client, WORKER_A, store).json()["worker"] == WORKER_A
+
+
+def test_claiming_bumps_the_version(client):
+    store = str(ObjectId())
+    (visit_id,) = _insert_visits(client, store, count=1)
+    before = client.get(f"/visits/{visit_id}").headers.get("ETag")
+    _claim(client, WORKER_A, store)
+    after = client.get(f"/visits/{visit_id}").headers["ETag"]
+    assert before != after